@@ -35,6 +35,7 @@ from sagents.tool.tool_manager import ToolManager
 from sagents.professional_agents.code_agents import CodeAgent
 from sagents.utils.logger import logger
 from sagents.config import get_settings
+from sagents.utils.failover_client import wrap_with_failover
 from openai import OpenAI
 
 # 导入新的配置加载器
@@ -55,6 +56,7 @@ class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     use_deepthink: bool = True
     use_multi_agent: bool = True
+    use_auto_route: bool = False  # 按问题复杂度自动选择执行方式，开启时忽略use_deepthink/use_multi_agent
     session_id: Optional[str] = None
     system_context: Optional[Dict[str, Any]] = None
 
@@ -198,10 +200,11 @@ async def initialize_system():
         # 优先使用配置文件中的模型配置
         if app_config.model.api_key:
             # 使用配置文件的设置
-            model = OpenAI(
+            # 配置了备用端点时包装为多端点容灾客户端
+            model = wrap_with_failover(OpenAI(
                 api_key=app_config.model.api_key,
                 base_url=app_config.model.base_url
-            )
+            ))
             
             model_config = {
                 "model": app_config.model.model_name,
@@ -231,10 +234,10 @@ async def initialize_system():
             # 如果配置文件没有API密钥，尝试从Sage框架配置加载
             settings = get_settings()
             if settings.model.api_key:
-                model = OpenAI(
+                model = wrap_with_failover(OpenAI(
                     api_key=settings.model.api_key,
                     base_url=settings.model.base_url
-                )
+                ))
                 
                 model_config = {
                     "model": settings.model.model_name,
@@ -358,10 +361,10 @@ async def configure_system(config: ConfigRequest, response: Response):
         save_app_config(app_config)
         
         # 重新初始化模型和控制器
-        model = OpenAI(
+        model = wrap_with_failover(OpenAI(
             api_key=config.api_key,
             base_url=config.base_url
-        )
+        ))
         
         model_config = {
             "model": config.model_name,
@@ -506,6 +509,7 @@ async def chat_stream(request: ChatRequest):
                 system_context=system_context,
                 available_workflows=available_workflows,
                 max_loop_count=20,
+                auto_route=request.use_auto_route,
             ):
                 # 处理消息块
                 for msg in chunk:
@@ -536,44 +540,43 @@ async def chat_stream(request: ChatRequest):
                             import re
                             show_content = re.sub(r'data:image/[^;]+;base64,[A-Za-z0-9+/=]+', 'null', show_content)
                     
-                    # 特殊处理工具调用结果，避免JSON嵌套问题
+                    # 特殊处理工具调用结果：工具结果只序列化一次，解析一次即可得到结构化数据
                     if msg.get('role') == 'tool' and isinstance(content, str):
                         try:
                             # 尝试解析content中的JSON数据
                             if content.strip().startswith('{'):
                                 parsed_content = json.loads(content)
                                 
-                                # 检查是否是嵌套的JSON结构
+                                # 检查是否是 {"content": ...} 结构
                                 if isinstance(parsed_content, dict) and 'content' in parsed_content:
                                     inner_content = parsed_content['content']
+                                    # MCP工具可能仍返回JSON文本，需要再解析一次
                                     if isinstance(inner_content, str) and inner_content.strip().startswith('{'):
                                         try:
-                                            # 解析内层JSON，这通常是实际的工具结果
-                                            search_data = json.loads(inner_content)
-                                            
-                                            # 清理搜索结果中的大数据，避免JSON过大
-                                            if isinstance(search_data, dict) and 'results' in search_data:
-                                                if isinstance(search_data['results'], list):
-                                                    for result in search_data['results']:
-                                                        if isinstance(result, dict):
-                                                            # 移除base64图片数据，避免JSON过大
-                                                            if 'image' in result and result['image']:
-                                                                if isinstance(result['image'], str) and result['image'].startswith('data:image'):
-                                                                    result['image'] = None
-                                                            # 限制文本字段长度
-                                                            for field in ['snippet', 'description', 'content']:
-                                                                if field in result and isinstance(result[field], str):
-                                                                    if len(result[field]) > 500:
-                                                                        result[field] = result[field][:500] + '...'
-                                            
-                                            # 直接使用解析后的数据，避免再次嵌套
-                                            content = search_data
-                                            print(f"🔍 [SEARCH RESULT] 成功解析嵌套JSON结果")
+                                            inner_content = json.loads(inner_content)
                                         except json.JSONDecodeError:
-                                            # 内层解析失败，使用外层数据
-                                            content = parsed_content
+                                            pass
+                                    if isinstance(inner_content, (dict, list)):
+                                        search_data = inner_content
+                                        # 清理搜索结果中的大数据，避免JSON过大
+                                        if isinstance(search_data, dict) and 'results' in search_data:
+                                            if isinstance(search_data['results'], list):
+                                                for result in search_data['results']:
+                                                    if isinstance(result, dict):
+                                                        # 移除base64图片数据，避免JSON过大
+                                                        if 'image' in result and result['image']:
+                                                            if isinstance(result['image'], str) and result['image'].startswith('data:image'):
+                                                                result['image'] = None
+                                                        # 限制文本字段长度
+                                                        for field in ['snippet', 'description', 'content']:
+                                                            if field in result and isinstance(result[field], str):
+                                                                if len(result[field]) > 500:
+                                                                    result[field] = result[field][:500] + '...'
+                                        
+                                        # 直接使用内层数据，避免再次嵌套
+                                        content = search_data
                                     else:
-                                        # 内层不是JSON字符串，直接使用
+                                        # 内层不是结构化数据，直接使用
                                         content = parsed_content
                                 else:
                                     # 不是嵌套结构，直接使用
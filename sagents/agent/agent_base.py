@@ -16,6 +16,12 @@ import time
 from sagents.utils.logger import logger
 from sagents.tool.tool_base import AgentToolSpec
 from sagents.utils.llm_request_logger import get_llm_logger
+from sagents.utils.llm_cache import get_llm_cache, is_llm_cache_enabled, serialize_llm_object, to_namespace
+from sagents.utils.llm_scheduler import get_llm_scheduler, estimate_prompt_tokens, estimate_text_tokens
+from sagents.utils.session_budget import get_session_budget
+from sagents.utils.llm_stream import StreamResumeDeduplicator, StructuredOutputTerminator
+from sagents.utils.exceptions import RetryConfig, is_retryable_llm_error
+from sagents.config.settings import get_settings
 import traceback
 
 
@@ -27,6 +33,14 @@ class AgentBase(ABC):
     流式处理和内容解析等核心功能。
     """
 
+    # LLM调度优先级（LLMPriority），为None时使用会话优先级
+    llm_priority: Optional[int] = None
+
+    # 结构化输出声明，用于提前停止生成和推导max_tokens上限
+    # 格式: {'format': 'xml'|'json', 'tags': {标签名: 该标签的token预算}, 'repeat': 重复标签的最大个数}
+    # tags按输出顺序排列，最后一个标签闭合即视为输出结束；预算为None表示不限制
+    OUTPUT_SCHEMA: Optional[Dict[str, Any]] = None
+
     def __init__(self, model: Any, model_config: Dict[str, Any], system_prefix: str = ""):
         """
         初始化智能体基类
@@ -48,9 +62,29 @@ class AgentBase(ABC):
             'total_output_tokens': 0,
             'total_cached_tokens': 0,
             'total_reasoning_tokens': 0,
+            'model_breakdown': {},  # 按模型拆分的统计
+            'total_retries': 0,  # LLM调用重试次数
+            'retry_overhead_time': 0.0,  # 失败尝试与退避等待耗费的时间
+            'retry_discarded_chars': 0,  # 重试流中被去重丢弃的字符数
             'step_details': []  # 详细的每步记录
         }
         
+        # LLM调用重试配置（连接错误、429、5xx，带抖动的指数退避）
+        model_settings = get_settings().model
+        self.llm_retry_config = RetryConfig(
+            max_attempts=model_settings.max_retries + 1,
+            base_delay=model_settings.retry_base_delay,
+            max_delay=model_settings.retry_max_delay,
+            jitter=0.5
+        )
+        
+        # LLM响应缓存开关（默认关闭，按配置中的智能体列表启用）
+        self.enable_llm_cache = is_llm_cache_enabled(self.__class__.__name__)
+        
+        # 模型路由器（由AgentController注入，为None时使用self.model/self.model_config）
+        self.model_router = None
+        self._last_model_name = model_config.get('model')
+        
         logger.debug(f"AgentBase: 初始化 {self.__class__.__name__}，模型配置: {model_config}")
     
     def _track_token_usage(self, response, step_name: str, start_time: float = None):
@@ -97,11 +131,27 @@ class AgentBase(ABC):
             self.token_stats['total_cached_tokens'] += cached_tokens
             self.token_stats['total_reasoning_tokens'] += reasoning_tokens
             
+            # 按模型累计
+            model_name = self._last_model_name or getattr(response, 'model', None) or 'unknown'
+            model_stats = self.token_stats['model_breakdown'].setdefault(model_name, {
+                'calls': 0,
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'cached_tokens': 0,
+                'reasoning_tokens': 0
+            })
+            model_stats['calls'] += 1
+            model_stats['input_tokens'] += input_tokens
+            model_stats['output_tokens'] += output_tokens
+            model_stats['cached_tokens'] += cached_tokens
+            model_stats['reasoning_tokens'] += reasoning_tokens
+            
             # 记录详细步骤
             execution_time = time.time() - start_time if start_time else 0
             step_detail = {
                 'step': step_name,
                 'agent': self.__class__.__name__,
+                'model': model_name,
                 'input_tokens': input_tokens,
                 'output_tokens': output_tokens,
                 'cached_tokens': cached_tokens,
@@ -140,6 +190,7 @@ class AgentBase(ABC):
             step_detail = {
                 'step': step_name,
                 'agent': self.__class__.__name__,
+                'model': self._last_model_name or 'unknown',
                 'input_tokens': 0,
                 'output_tokens': 0,
                 'cached_tokens': 0,
@@ -172,6 +223,10 @@ class AgentBase(ABC):
             'total_output_tokens': 0,
             'total_cached_tokens': 0,
             'total_reasoning_tokens': 0,
+            'model_breakdown': {},
+            'total_retries': 0,
+            'retry_overhead_time': 0.0,
+            'retry_discarded_chars': 0,
             'step_details': []
         }
         logger.debug(f"{self.__class__.__name__}: Token统计已重置")
@@ -181,6 +236,94 @@ class AgentBase(ABC):
         stats = self.get_token_stats()
         logger.info(f"{stats['agent_name']} Token统计: 调用{stats['total_calls']}次, 总计{stats['total_input_tokens'] + stats['total_output_tokens']}tokens")
 
+    def set_model_router(self, model_router: Any):
+        """
+        设置模型路由器
+        
+        Args:
+            model_router: ModelRouter实例，为None时恢复使用默认模型
+        """
+        self.model_router = model_router
+
+    def _resolve_model(self, step_name: Optional[str] = None) -> tuple:
+        """
+        解析当前调用应使用的模型客户端和配置
+        
+        Args:
+            step_name: 步骤名称
+            
+        Returns:
+            tuple: (模型客户端, 模型配置副本)
+        """
+        if self.model_router is not None:
+            return self.model_router.resolve(self.__class__.__name__, step_name)
+        return self.model, {**self.model_config}
+
+    @staticmethod
+    def _close_llm_stream(stream: Any):
+        """
+        关闭底层的流式响应连接
+        
+        Args:
+            stream: 模型客户端返回的流对象
+        """
+        close = getattr(stream, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.debug(f"AgentBase: 关闭LLM流失败: {e}")
+
+    def _record_llm_retry(self, overhead_time: float):
+        """
+        记录一次LLM调用重试的开销
+        
+        Args:
+            overhead_time: 失败尝试加退避等待的耗时（秒）
+        """
+        self.token_stats['total_retries'] += 1
+        self.token_stats['retry_overhead_time'] += overhead_time
+
+    @staticmethod
+    def _get_endpoint_key(client: Any, model_config: Dict[str, Any]) -> str:
+        """
+        获取用于调度限流的端点标识
+        
+        Args:
+            client: 模型客户端
+            model_config: 模型配置
+            
+        Returns:
+            str: 端点标识，优先使用客户端的base_url
+        """
+        base_url = getattr(client, 'base_url', None)
+        return str(base_url) if base_url else str(model_config.get('model', 'default'))
+
+    def set_llm_cache_enabled(self, enabled: bool):
+        """
+        设置当前智能体是否启用LLM响应缓存
+        
+        Args:
+            enabled: 是否启用
+        """
+        self.enable_llm_cache = enabled
+        logger.debug(f"{self.__class__.__name__}: LLM响应缓存已{'启用' if enabled else '关闭'}")
+
+    def _replay_cached_stream(self, payload: List[Dict[str, Any]]) -> Generator[Any, None, None]:
+        """
+        将缓存的chunk列表回放为合成chunk对象
+        
+        缓存命中没有产生实际的token消耗，因此回放时去掉usage信息。
+        
+        Args:
+            payload: 缓存的chunk字典列表
+            
+        Yields:
+            合成的chunk对象，结构与OpenAI流式chunk一致
+        """
+        for chunk_data in payload:
+            yield to_namespace({**chunk_data, 'usage': None})
+
     def _call_llm_streaming(self, messages: List[Dict[str, Any]], session_id: Optional[str] = None, step_name: str = "llm_call", model_config_override: Optional[Dict[str, Any]] = None):
         """
         通用的流式模型调用方法
@@ -196,10 +339,11 @@ class AgentBase(ABC):
         """
         logger.debug(f"{self.__class__.__name__}: 调用语言模型进行流式生成")
         
-        # 确定最终的模型配置
-        final_config = {**self.model_config}
+        # 确定最终的模型客户端和配置
+        client, final_config = self._resolve_model(step_name)
         if model_config_override:
             final_config.update(model_config_override)
+        self._last_model_name = final_config.get('model')
         
         try:
             # 在发起请求前记录
@@ -223,35 +367,290 @@ class AgentBase(ABC):
             
             # 发起LLM请求
             # 检查是否需要添加 chat_template_kwargs（用于 vLLM 禁用思考模式）
-            if hasattr(self.model, '_default_extra_body'):
-                final_config['extra_body'] = self.model._default_extra_body
-                logger.debug(f"{self.__class__.__name__}: 添加 extra_body 参数: {self.model._default_extra_body}")
+            if hasattr(client, '_default_extra_body'):
+                final_config['extra_body'] = client._default_extra_body
+                logger.debug(f"{self.__class__.__name__}: 添加 extra_body 参数: {client._default_extra_body}")
             
-            stream = self.model.chat.completions.create(
-                messages=messages,
-                stream=True,
-                stream_options={"include_usage": True},
-                **final_config
-            )
+            # 会话剩余预算传递为本次调用的超时与max_tokens上限
+            budget = get_session_budget(session_id)
+            if budget:
+                # 调用方指定的max_tokens（如结构化输出上限）是完整输出所需的量，预算不再压低
+                budget.apply_to_llm_config(final_config, estimate_prompt_tokens(messages),
+                                           (model_config_override or {}).get('max_tokens'))
             
-            # 直接yield chunks，确保每个chunk都是正确的对象类型
-            for chunk in stream:
-                # 检查chunk是否为tuple，如果是则解包
-                if isinstance(chunk, tuple):
-                    logger.warning(f"{self.__class__.__name__}: 检测到tuple类型的chunk，尝试解包")
-                    # 通常tuple的第一个元素是实际的chunk对象
-                    if len(chunk) > 0:
-                        yield chunk[0]
-                    else:
-                        logger.warning(f"{self.__class__.__name__}: 空tuple chunk，跳过")
-                        continue
-                else:
-                    yield chunk
+            # 检查LLM响应缓存（在预算改写max_tokens之后计算缓存键，不同上限的响应互不复用）
+            cache_key = None
+            if self.enable_llm_cache:
+                cache_key = get_llm_cache().make_key(messages, final_config, stream=True)
+                cached = get_llm_cache().get(cache_key)
+                if cached is not None and cached.get('kind') == 'stream':
+                    logger.info(f"{self.__class__.__name__}: {step_name} 命中LLM响应缓存，回放 {len(cached['payload'])} 个chunk")
+                    yield from self._replay_cached_stream(cached['payload'])
+                    return
+            
+            # 通过共享调度器排队（限流 + 优先级 + 会话公平）
+            scheduler = get_llm_scheduler()
+            ticket = scheduler.acquire(
+                self._get_endpoint_key(client, final_config), session_id, self.llm_priority, estimate_prompt_tokens(messages)
+            ) if scheduler else None
+            usage = None
+            usage_tokens = None
+            # 已收到的输出，流在usage chunk之前结束（提前中止）时据此估算用量
+            output_parts = []
+            
+            # 流中断重试时，校验并跳过已输出的内容，使下游看到连续的流；
+            # 重试生成的内容与已输出的不一致时抛出 LLMStreamDivergedError（不可重试）
+            deduplicator = StreamResumeDeduplicator()
+            cached_chunks = [] if cache_key else None
+            attempt = 0
+            try:
+                while True:
+                    attempt_start = time.time()
+                    try:
+                        stream = client.chat.completions.create(
+                            messages=messages,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                            **final_config
+                        )
+                        
+                        # 直接yield chunks，确保每个chunk都是正确的对象类型
+                        try:
+                            for chunk in stream:
+                                # 检查chunk是否为tuple，如果是则解包
+                                if isinstance(chunk, tuple):
+                                    logger.warning(f"{self.__class__.__name__}: 检测到tuple类型的chunk，尝试解包")
+                                    # 通常tuple的第一个元素是实际的chunk对象
+                                    if len(chunk) > 0:
+                                        chunk = chunk[0]
+                                    else:
+                                        logger.warning(f"{self.__class__.__name__}: 空tuple chunk，跳过")
+                                        continue
+                                
+                                if attempt > 0:
+                                    chunk = deduplicator.filter(chunk)
+                                    if chunk is None:
+                                        continue
+                                else:
+                                    deduplicator.filter(chunk)
+                                
+                                if getattr(chunk, 'usage', None):
+                                    usage = chunk.usage
+                                    usage_tokens = getattr(chunk.usage, 'total_tokens', None)
+                                output_parts.append(self._get_chunk_output_text(chunk))
+                                if cached_chunks is not None and self._is_length_truncated(chunk):
+                                    # 因max_tokens截断的输出不写入缓存
+                                    cached_chunks = None
+                                if cached_chunks is not None:
+                                    chunk_data = serialize_llm_object(chunk)
+                                    if chunk_data is None:
+                                        cached_chunks = None
+                                    else:
+                                        cached_chunks.append(chunk_data)
+                                yield chunk
+                        finally:
+                            # 提前中止（消费方关闭生成器）或出错时及时释放底层连接
+                            self._close_llm_stream(stream)
+                        break
+                    except Exception as e:
+                        if attempt + 1 >= self.llm_retry_config.max_attempts or not is_retryable_llm_error(e):
+                            raise
+                        delay = self.llm_retry_config.compute_delay(attempt)
+                        resume_note = "，重试流需与已输出内容一致才能续接" if deduplicator.has_emitted else ""
+                        logger.warning(f"{self.__class__.__name__}: {step_name} 流式调用第 {attempt + 1} 次失败（{type(e).__name__}: {e}），{delay:.2f}s 后重试{resume_note}")
+                        time.sleep(delay)
+                        self._record_llm_retry(time.time() - attempt_start)
+                        deduplicator.start_new_attempt()
+                        attempt += 1
+                
+                if attempt:
+                    self.token_stats['retry_discarded_chars'] += deduplicator.discarded_chars
+                    deduplicator.log_summary(self.__class__.__name__)
+                
+                # 只有完整消费且未被max_tokens截断的流才写入缓存
+                if cached_chunks:
+                    get_llm_cache().set(cache_key, 'stream', cached_chunks)
+            finally:
+                if usage is None and output_parts:
+                    usage = self._estimate_usage(messages, ''.join(output_parts))
+                    usage_tokens = usage.total_tokens
+                    logger.debug(f"{self.__class__.__name__}: {step_name} 流未返回usage，按估算用量 {usage_tokens} tokens 计入预算与限流")
+                if ticket is not None:
+                    scheduler.release(ticket, usage_tokens)
+                if budget and usage is not None:
+                    budget.consume(getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0, final_config.get('model'))
                 
         except Exception as e:
             logger.error(f"{self.__class__.__name__}: LLM流式调用失败: {e}")
             raise
     
+    @staticmethod
+    def _get_chunk_output_text(chunk: Any) -> str:
+        """提取流式chunk中计入输出token的文本（内容、思考内容和工具调用参数）"""
+        parts = []
+        for choice in getattr(chunk, 'choices', None) or []:
+            delta = getattr(choice, 'delta', None)
+            if delta is None:
+                continue
+            parts.append(getattr(delta, 'content', None) or '')
+            parts.append(getattr(delta, 'reasoning_content', None) or '')
+            for tool_call in getattr(delta, 'tool_calls', None) or []:
+                function = getattr(tool_call, 'function', None)
+                parts.append(getattr(function, 'arguments', None) or '')
+        return ''.join(parts)
+
+    @staticmethod
+    def _is_length_truncated(response: Any) -> bool:
+        """判断响应或流式chunk中是否有因max_tokens截断（finish_reason为length）的choice"""
+        return any(getattr(choice, 'finish_reason', None) == 'length'
+                   for choice in getattr(response, 'choices', None) or [])
+
+    @staticmethod
+    def _estimate_usage(messages: List[Dict[str, Any]], output_text: str) -> Any:
+        """
+        估算一次调用的token用量，用于服务端没有返回usage的情况（如客户端提前中止流）
+        
+        Args:
+            messages: 输入消息列表
+            output_text: 已生成的输出文本
+            
+        Returns:
+            Any: 与OpenAI usage结构一致的对象，estimated 字段为True
+        """
+        prompt_tokens = estimate_prompt_tokens(messages)
+        completion_tokens = estimate_text_tokens(output_text)
+        return to_namespace({
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'estimated': True
+        })
+
+    def _get_output_schema_config(self) -> Dict[str, Any]:
+        """
+        根据OUTPUT_SCHEMA推导模型调用的覆盖配置
+        
+        - max_tokens: 各标签预算之和（重复标签乘以重复次数）加20%余量，且不超过原有配置
+        - stop: 非重复的XML结构使用最后一个闭合标签作为停止序列
+        
+        Returns:
+            Dict[str, Any]: 模型配置覆盖项
+        """
+        schema = self.OUTPUT_SCHEMA
+        if not schema:
+            return {}
+        agent_settings = get_settings().agent
+        override = {}
+        
+        budgets = list(schema.get('tags', {}).values())
+        if agent_settings.structured_output_token_caps and budgets and all(b is not None for b in budgets):
+            derived = int(sum(budgets) * (schema.get('repeat') or 1) * 1.2) + 64
+            configured = self.model_config.get('max_tokens')
+            override['max_tokens'] = min(configured, derived) if configured else derived
+        
+        tags = list(schema.get('tags', {}).keys())
+        if agent_settings.structured_output_early_stop and schema.get('format', 'xml') == 'xml' and tags and not schema.get('repeat'):
+            override['stop'] = [f"</{tags[-1]}>"]
+        return override
+
+    def _call_llm_structured_streaming(self, messages: List[Dict[str, Any]], session_id: Optional[str] = None, step_name: str = "llm_call"):
+        """
+        按OUTPUT_SCHEMA进行结构化输出的流式调用
+        
+        在_call_llm_streaming基础上：
+        1. 使用由输出结构推导的max_tokens上限和停止序列
+        2. 服务端因停止序列结束时补回被截掉的闭合标签，保证下游解析不受影响
+        3. 服务端不支持停止序列时，客户端检测到输出结构完整后立即中止流；
+           此时收不到服务端的usage chunk，改为输出一个按提示词和已生成内容估算用量的usage chunk
+        
+        Args:
+            messages: 输入消息列表
+            session_id: 会话ID
+            step_name: 步骤名称
+            
+        Yields:
+            语言模型的流式chunk
+        """
+        schema = self.OUTPUT_SCHEMA
+        if not schema or not get_settings().agent.structured_output_early_stop:
+            yield from self._call_llm_streaming(messages, session_id=session_id, step_name=step_name,
+                                                model_config_override=self._get_output_schema_config() or None)
+            return
+        
+        override = self._get_output_schema_config()
+        stop_sequences = override.get('stop') or []
+        terminator = StructuredOutputTerminator(schema)
+        all_content = ''
+        stream = self._call_llm_streaming(messages, session_id=session_id, step_name=step_name, model_config_override=override)
+        try:
+            for chunk in stream:
+                choices = getattr(chunk, 'choices', None)
+                if choices:
+                    content = choices[0].delta.content
+                    if content:
+                        all_content += content
+                        end = terminator.feed(content)
+                        if end is not None:
+                            # 不修改上游的chunk对象，输出截断后的副本
+                            yield self._create_synthetic_content_chunk(chunk, content[:end])
+                            yield self._create_usage_chunk(chunk, self._estimate_usage(messages, all_content))
+                            logger.info(f"{self.__class__.__name__}: {step_name} 输出结构已完整，提前结束生成")
+                            return
+                    
+                    # 停止序列命中时服务端不会返回停止序列本身，补回闭合标签
+                    if choices[0].finish_reason == 'stop' and stop_sequences and not terminator.finished:
+                        opening_tag = stop_sequences[0].replace('</', '<', 1)
+                        if opening_tag in all_content:
+                            yield self._create_synthetic_content_chunk(chunk, stop_sequences[0])
+                            terminator.finished = True
+                yield chunk
+        finally:
+            stream.close()
+
+    @staticmethod
+    def _create_synthetic_content_chunk(reference_chunk: Any, content: str) -> Any:
+        """
+        创建一个只包含文本内容的合成chunk
+        
+        Args:
+            reference_chunk: 参考chunk（复用id/model等字段）
+            content: 文本内容
+            
+        Returns:
+            Any: 与OpenAI流式chunk结构一致的对象
+        """
+        return to_namespace({
+            'id': getattr(reference_chunk, 'id', None),
+            'model': getattr(reference_chunk, 'model', None),
+            'object': 'chat.completion.chunk',
+            'usage': None,
+            'choices': [{
+                'index': 0,
+                'delta': {'role': None, 'content': content, 'tool_calls': None},
+                'finish_reason': None
+            }]
+        })
+
+    @staticmethod
+    def _create_usage_chunk(reference_chunk: Any, usage: Any) -> Any:
+        """
+        创建一个只包含usage的合成chunk（与服务端在流末尾返回的usage chunk结构一致）
+        
+        Args:
+            reference_chunk: 参考chunk（复用id/model等字段）
+            usage: usage对象
+            
+        Returns:
+            Any: 与OpenAI流式chunk结构一致的对象
+        """
+        return to_namespace({
+            'id': getattr(reference_chunk, 'id', None),
+            'model': getattr(reference_chunk, 'model', None),
+            'object': 'chat.completion.chunk',
+            'usage': vars(usage),
+            'choices': []
+        })
+
     def _call_llm_non_streaming(self, messages: List[Dict[str, Any]], session_id: Optional[str] = None, step_name: str = "llm_call", model_config_override: Optional[Dict[str, Any]] = None):
         """
         通用的非流式模型调用方法
@@ -267,10 +666,11 @@ class AgentBase(ABC):
         """
         logger.debug(f"{self.__class__.__name__}: 调用语言模型进行非流式生成")
         
-        # 确定最终的模型配置
-        final_config = {**self.model_config}
+        # 确定最终的模型客户端和配置
+        client, final_config = self._resolve_model(step_name)
         if model_config_override:
             final_config.update(model_config_override)
+        self._last_model_name = final_config.get('model')
         
         try:
             # 在发起请求前记录
@@ -294,15 +694,66 @@ class AgentBase(ABC):
             
             # 发起LLM请求
             # 检查是否需要添加 chat_template_kwargs（用于 vLLM 禁用思考模式）
-            if hasattr(self.model, '_default_extra_body'):
-                final_config['extra_body'] = self.model._default_extra_body
-                logger.debug(f"{self.__class__.__name__}: 添加 extra_body 参数: {self.model._default_extra_body}")
+            if hasattr(client, '_default_extra_body'):
+                final_config['extra_body'] = client._default_extra_body
+                logger.debug(f"{self.__class__.__name__}: 添加 extra_body 参数: {client._default_extra_body}")
+            
+            # 会话剩余预算传递为本次调用的超时与max_tokens上限
+            budget = get_session_budget(session_id)
+            if budget:
+                # 调用方指定的max_tokens（如结构化输出上限）是完整输出所需的量，预算不再压低
+                budget.apply_to_llm_config(final_config, estimate_prompt_tokens(messages),
+                                           (model_config_override or {}).get('max_tokens'))
+            
+            # 检查LLM响应缓存（在预算改写max_tokens之后计算缓存键，不同上限的响应互不复用）
+            cache_key = None
+            if self.enable_llm_cache:
+                cache_key = get_llm_cache().make_key(messages, final_config, stream=False)
+                cached = get_llm_cache().get(cache_key)
+                if cached is not None and cached.get('kind') == 'response':
+                    logger.info(f"{self.__class__.__name__}: {step_name} 命中LLM响应缓存")
+                    return to_namespace({**cached['payload'], 'usage': None})
+            
+            # 通过共享调度器排队（限流 + 优先级 + 会话公平）
+            scheduler = get_llm_scheduler()
+            ticket = scheduler.acquire(
+                self._get_endpoint_key(client, final_config), session_id, self.llm_priority, estimate_prompt_tokens(messages)
+            ) if scheduler else None
+            usage = None
+            usage_tokens = None
+            try:
+                attempt = 0
+                while True:
+                    attempt_start = time.time()
+                    try:
+                        response = client.chat.completions.create(
+                            messages=messages,
+                            stream=False,
+                            **final_config
+                        )
+                        break
+                    except Exception as e:
+                        if attempt + 1 >= self.llm_retry_config.max_attempts or not is_retryable_llm_error(e):
+                            raise
+                        delay = self.llm_retry_config.compute_delay(attempt)
+                        logger.warning(f"{self.__class__.__name__}: {step_name} 非流式调用第 {attempt + 1} 次失败（{type(e).__name__}: {e}），{delay:.2f}s 后重试")
+                        time.sleep(delay)
+                        self._record_llm_retry(time.time() - attempt_start)
+                        attempt += 1
+                if getattr(response, 'usage', None):
+                    usage = response.usage
+                    usage_tokens = getattr(response.usage, 'total_tokens', None)
+            finally:
+                if ticket is not None:
+                    scheduler.release(ticket, usage_tokens)
+                if budget and usage is not None:
+                    budget.consume(getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0, final_config.get('model'))
             
-            response = self.model.chat.completions.create(
-                messages=messages,
-                stream=False,
-                **final_config
-            )
+            # 因max_tokens截断的响应不写入缓存
+            if cache_key and not self._is_length_truncated(response):
+                response_data = serialize_llm_object(response)
+                if response_data is not None:
+                    get_llm_cache().set(cache_key, 'response', response_data)
             return response
         except Exception as e:
             logger.error(f"{self.__class__.__name__}: LLM非流式调用失败: {e}")
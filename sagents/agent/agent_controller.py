@@ -17,7 +17,7 @@ import datetime
 import traceback
 import time
 import threading
-from typing import List, Dict, Any, Optional, Generator
+from typing import List, Dict, Any, Optional, Generator, Tuple
 from enum import Enum
 
 from .agent_base import AgentBase
@@ -26,12 +26,22 @@ from .executor_agent.executor_agent import ExecutorAgent
 from .task_summary_agent.task_summary_agent import TaskSummaryAgent
 from .planning_agent.planning_agent import PlanningAgent
 from .observation_agent.observation_agent import ObservationAgent
+from .observe_plan_agent.observe_plan_agent import ObservePlanAgent
 from .direct_executor_agent.direct_executor_agent import DirectExecutorAgent
 from .task_decompose_agent.task_decompose_agent import TaskDecomposeAgent
 from .stage_summary_agent.stage_summary_agent import StageSummaryAgent
 from .workflow_selector import select_workflow_with_llm, create_workflow_guidance, WorkflowFormat
+from .complexity_classifier import ComplexityClassifierAgent, classify_conversation_complexity, DEEP_RESEARCH
 from .session_manager import SessionManager, SessionStatus
+from .model_router import ModelRouter
+from .loop_guard import create_loop_guard, get_loop_guard, clear_loop_guard
+from sagents.utils.background_stream import BackgroundStream
+from sagents.utils.session_budget import create_session_budget, get_session_budget, clear_session_budget
+from sagents.utils.tool_result_store import register_tool_result_workspace, clear_tool_result_workspace
+from ..task.task_base import TaskStatus
 from sagents.utils.logger import logger
+from sagents.config.settings import get_settings
+from sagents.utils.llm_scheduler import get_llm_scheduler, LLMPriority
 
 
 
@@ -47,7 +57,8 @@ class AgentController:
     DEFAULT_MAX_LOOP_COUNT = 10
     DEFAULT_MESSAGE_LIMIT = 10000
 
-    def __init__(self, model: Any, model_config: Dict[str, Any], system_prefix: str = "", workspace: str = "/tmp/sage"):
+    def __init__(self, model: Any, model_config: Dict[str, Any], system_prefix: str = "", workspace: str = "/tmp/sage",
+                 model_routes: Optional[Dict[str, Dict[str, Any]]] = None):
         """
         初始化智能体控制器
         
@@ -56,11 +67,16 @@ class AgentController:
             model_config: 模型配置参数
             system_prefix: 系统前缀提示
             workspace: 工作空间根目录，默认为 /tmp/sage
+            model_routes: 模型路由表（智能体类名或step_name -> 模型配置），为None时使用Settings中的配置
         """
         self.model = model
         self.model_config = model_config
         self.system_prefix = system_prefix
         self.workspace = workspace
+        self.model_router = ModelRouter(
+            model, model_config,
+            routes=model_routes if model_routes is not None else get_settings().routing.model_routes
+        )
         self._init_agents()
         
         # 会话状态管理器
@@ -84,6 +100,9 @@ class AgentController:
         # 任务状态跟踪（用于检测任务完成状态变化）
         self._task_status_tracking = {}
         
+        # 后台运行中的阶段总结（每个会话最多一个）：{会话ID: (后台任务, 启动时准备的总结上下文)}
+        self._stage_summary_jobs: Dict[str, Tuple[BackgroundStream, Dict[str, Any]]] = {}
+        
         logger.info("AgentController: 智能体控制器初始化完成")
 
     def _init_agents(self) -> None:
@@ -118,9 +137,39 @@ class AgentController:
         self.stage_summary_agent = StageSummaryAgent(
             self.model, self.model_config, system_prefix=self.system_prefix
         )
+        self.observe_plan_agent = ObservePlanAgent(
+            self.model, self.model_config, system_prefix=self.system_prefix
+        )
+        self.complexity_classifier_agent = ComplexityClassifierAgent(
+            self.model, self.model_config, system_prefix=self.system_prefix
+        )
+        
+        # 注入模型路由器，轻量阶段可路由到更快的模型
+        for agent in self._get_all_agents():
+            agent.set_model_router(self.model_router)
         
         logger.info("AgentController: 所有智能体初始化完成")
 
+    def _get_all_agents(self) -> List[AgentBase]:
+        """
+        获取控制器管理的所有智能体
+        
+        Returns:
+            List[AgentBase]: 智能体列表
+        """
+        return [
+            self.task_analysis_agent,
+            self.executor_agent,
+            self.task_summary_agent,
+            self.planning_agent,
+            self.observation_agent,
+            self.direct_executor_agent,
+            self.task_decompose_agent,
+            self.stage_summary_agent,
+            self.observe_plan_agent,
+            self.complexity_classifier_agent
+        ]
+
     def _get_session_managers(self, session_id: str) -> tuple:
         """
         获取或创建会话的MessageManager和TaskManager
@@ -161,7 +210,11 @@ class AgentController:
                    max_loop_count: int = DEFAULT_MAX_LOOP_COUNT,
                    deep_research: bool = True,
                    system_context: Optional[Dict[str, Any]] = None,
-                   available_workflows: Optional[WorkflowFormat] = None) -> Generator[List[Dict[str, Any]], None, None]:
+                   available_workflows: Optional[WorkflowFormat] = None,
+                   deadline: Optional[float] = None,
+                   token_budget: Optional[int] = None,
+                   cost_budget: Optional[float] = None,
+                   auto_route: Optional[bool] = None) -> Generator[List[Dict[str, Any]], None, None]:
         """
         执行智能体工作流并流式输出结果
         
@@ -175,6 +228,10 @@ class AgentController:
             deep_research: 是否进行深度研究（完整流程）
             system_context: 运行时系统上下文字典，用于自定义推理时的变化信息
             available_workflows: 可用的工作流模板字典 (支持新旧格式)
+            deadline: 墙钟截止时间（time.time() 时间戳），剩余时间会传递给LLM与工具超时
+            token_budget: 本次工作流的总token预算
+            cost_budget: 本次工作流的费用预算（按Settings中的模型单价计算）
+            auto_route: 是否按问题复杂度自动选择deep_research/deep_thinking，为None时使用Settings配置
             
         Yields:
             List[Dict[str, Any]]: 自上次yield以来的新消息字典列表，每个消息包含：
@@ -203,6 +260,18 @@ class AgentController:
             self.session_manager.create_session(session_id)
             self.session_manager.update_session_status(session_id, SessionStatus.RUNNING, "初始化")
             
+            # 设置会话的时间/token/费用预算（复杂度分类的模型调用也计入预算）
+            create_session_budget(session_id, deadline=deadline, token_budget=token_budget, cost_budget=cost_budget)
+            
+            # 按问题复杂度自动选择执行方式
+            if auto_route if auto_route is not None else get_settings().agent.enable_auto_routing:
+                deep_research, deep_thinking = self._auto_select_execution_mode(initial_messages, deep_research, deep_thinking, session_id)
+            
+            # 设置会话的LLM调度优先级：快速模式优先于深度研究
+            scheduler = get_llm_scheduler()
+            if scheduler:
+                scheduler.set_session_priority(session_id, LLMPriority.DEEP_RESEARCH if deep_research else LLMPriority.RAPID)
+            
             # 设置执行上下文
             system_context = self._setup_system_context(session_id, system_context)
             
@@ -270,6 +339,12 @@ class AgentController:
             self.overall_token_stats['workflow_end_time'] = time.time()
             self.print_comprehensive_token_stats(self.overall_token_stats['workflow_end_time'] - self.overall_token_stats['workflow_start_time'])
             
+            # 等待后台阶段总结写完任务的execution_summary，再保存会话状态
+            try:
+                self._join_stage_summary(session_id, timeout=get_settings().agent.task_timeout)
+            except Exception as join_error:
+                logger.warning(f"AgentController: 等待会话 {session_id} 的阶段总结时出错: {join_error}")
+            
             # 保存会话状态到文件
             try:
                 self._save_session_state(session_id, system_context)
@@ -285,6 +360,12 @@ class AgentController:
             # 清理会话，防止内存泄漏
             try:
                 self.session_manager.remove_session(session_id)
+                scheduler = get_llm_scheduler()
+                if scheduler:
+                    scheduler.clear_session(session_id)
+                clear_loop_guard(session_id)
+                clear_session_budget(session_id)
+                clear_tool_result_workspace(session_id)
                 # 清理MessageManager和TaskManager
                 if session_id in self._session_managers:
                     del self._session_managers[session_id]
@@ -404,9 +485,40 @@ class AgentController:
             system_context.update(user_system_context)
             logger.info(f"AgentController: 合并用户系统上下文: {list(user_system_context.keys())}")
         
+        # 超过阈值的工具结果写入会话工作目录
+        register_tool_result_workspace(session_id, system_context['file_workspace'])
+        
         logger.info(f"AgentController: 系统上下文设置完成，包含 {len(system_context)} 个字段")
         return system_context
 
+    def _auto_select_execution_mode(self, messages: List[Dict[str, Any]], deep_research: bool, deep_thinking: bool,
+                                    session_id: Optional[str] = None) -> tuple:
+        """
+        使用复杂度分类器选择最经济且足够的执行方式（简短跟进沿用上一轮的执行方式）
+        
+        Args:
+            messages: 输入消息
+            deep_research: 调用方指定的是否多智能体协作（分类失败时沿用）
+            deep_thinking: 调用方指定的是否任务分析（分类失败时沿用）
+            session_id: 会话ID，小模型判断计入该会话的预算和调度
+            
+        Returns:
+            tuple: (deep_research, deep_thinking)
+        """
+        try:
+            llm_classifier = None
+            if get_settings().agent.auto_routing_use_llm:
+                llm_classifier = lambda query: self.complexity_classifier_agent.classify(query, session_id)
+            result = classify_conversation_complexity(messages, llm_classifier=llm_classifier)
+        except Exception as e:
+            logger.warning(f"AgentController: 复杂度分类失败，沿用调用方设置: {e}")
+            return deep_research, deep_thinking
+        if result is None:
+            return deep_research, deep_thinking
+        
+        logger.info(f"AgentController: 自动选择执行方式 {result['mode']}（原设置 deep_research={deep_research}, deep_thinking={deep_thinking}）")
+        return result['mode'] == DEEP_RESEARCH, result['deep_thinking']
+
     def _select_and_apply_workflow(self, 
                                    message_manager: Any, 
                                    available_workflows: WorkflowFormat, 
@@ -429,9 +541,10 @@ class AgentController:
             all_messages = message_manager.get_all_messages()
             
             # 使用LLM选择工作流，传入完整的消息历史
+            workflow_model, workflow_model_config = self.model_router.resolve("WorkflowSelector", "workflow_selection")
             workflow_name, workflow_steps = select_workflow_with_llm(
-                model=self.model,
-                model_config=self.model_config,
+                model=workflow_model,
+                model_config=workflow_model_config,
                 messages=all_messages,
                 available_workflows=available_workflows
             )
@@ -492,13 +605,20 @@ class AgentController:
             message_manager, task_manager, tool_manager, system_context, session_id
         )
         
-        # 3. 规划-执行-观察循环
-        yield from self._execute_main_loop(
-            message_manager, task_manager, tool_manager, system_context, session_id, max_loop_count
-        )
+        # 3. 规划-执行-观察循环（预算即将耗尽时直接进入总结）
+        if not self._is_budget_nearly_exhausted(session_id):
+            yield from self._execute_main_loop(
+                message_manager, task_manager, tool_manager, system_context, session_id, max_loop_count
+            )
         
-        # 4. 任务总结阶段
-        if summary:
+        # 汇合点：任务总结依赖各子任务的execution_summary，等待后台阶段总结完成
+        for chunk in self._join_stage_summary(session_id):
+            yield chunk
+        
+        # 4. 任务总结阶段（重复循环被终止时跳过）
+        loop_guard = get_loop_guard(session_id)
+        terminated = bool(loop_guard and loop_guard.escalation_reason) and get_settings().agent.loop_escalation_action == 'terminate'
+        if summary and not terminated:
             yield from self._execute_task_summary_phase(
                 message_manager, task_manager, tool_manager, system_context, session_id
             )
@@ -616,6 +736,13 @@ class AgentController:
         """
         logger.info("AgentController: 开始规划-执行-观察循环")
         
+        # 融合模式下观察阶段同时给出下一步计划，下一轮可跳过规划阶段
+        fused_observe_plan = get_settings().agent.enable_fused_observe_plan
+        plan_ready = False
+        
+        # 记录规划与工具调用指纹，检测重复循环
+        loop_guard = create_loop_guard(session_id)
+        
         loop_count = 0
         while True:
             loop_count += 1
@@ -629,26 +756,52 @@ class AgentController:
             if loop_count > max_loop_count:
                 logger.warning(f"AgentController: 达到最大循环次数 {max_loop_count}，停止工作流")
                 break
+            
+            if self._is_budget_nearly_exhausted(session_id):
+                break
 
-            # 规划阶段
-            yield from self._execute_planning_phase(
-                message_manager, task_manager, tool_manager, system_context, session_id
-            )
+            # 规划阶段（上一轮融合观察已给出计划时跳过）
+            if plan_ready:
+                logger.info("AgentController: 使用观察阶段给出的计划，跳过规划阶段")
+            else:
+                yield from self._execute_planning_phase(
+                    message_manager, task_manager, tool_manager, system_context, session_id
+                )
+            # 汇合点：执行阶段会读取依赖任务的execution_summary，规划阶段与后台阶段总结并行到此为止
+            for chunk in self._join_stage_summary(session_id):
+                yield chunk
+            
+            self._record_latest_plan(message_manager, loop_guard)
+            if loop_guard.escalation_reason:
+                yield from self._escalate_repeated_loop(message_manager, loop_guard, session_id)
+                break
             
             # 执行阶段
             yield from self._execute_execution_phase(
                 message_manager, task_manager, tool_manager, system_context, session_id
             )
             
+            if loop_guard.escalation_reason:
+                yield from self._escalate_repeated_loop(message_manager, loop_guard, session_id)
+                break
+            
+            if self._is_budget_nearly_exhausted(session_id):
+                break
+            
             # 观察阶段
             should_break = yield from self._execute_observation_phase(
-                message_manager, task_manager, tool_manager, system_context, session_id
+                message_manager, task_manager, tool_manager, system_context, session_id,
+                observation_agent=self.observe_plan_agent if fused_observe_plan else None
             )
             
             if should_break:
                 break
+            
+            plan_ready = fused_observe_plan and self._has_pending_plan(message_manager)
+            self.session_manager.update_session_metadata(session_id, {'loop_guard': loop_guard.get_stats()})
         
-        logger.info("AgentController: 规划-执行-观察循环完成")
+        self.session_manager.update_session_metadata(session_id, {'loop_guard': loop_guard.get_stats()})
+        logger.info(f"AgentController: 规划-执行-观察循环完成，重复检测统计: {loop_guard.get_stats()}")
 
     def _execute_planning_phase(self, 
                               message_manager: Any,
@@ -765,7 +918,8 @@ class AgentController:
                                  task_manager: Any,
                                  tool_manager: Optional[Any],
                                  system_context: Dict[str, Any],
-                                 session_id: str) -> Generator[List[Dict[str, Any]], None, bool]:
+                                 session_id: str,
+                                 observation_agent: Optional[AgentBase] = None) -> Generator[List[Dict[str, Any]], None, bool]:
         """
         执行观察阶段
         
@@ -775,6 +929,7 @@ class AgentController:
             tool_manager: 工具管理器
             system_context: 执行上下文
             session_id: 会话ID
+            observation_agent: 执行观察的智能体，默认为ObservationAgent
             
         Yields:
             List[Dict[str, Any]]: 观察输出的消息块
@@ -791,20 +946,30 @@ class AgentController:
             return True  # 中断时也返回should_break=True
         
         obs_chunks = []
-        for chunk in self.observation_agent.run_stream(
-            message_manager=message_manager,
-            task_manager=task_manager,
-            tool_manager=tool_manager,
-            session_id=session_id,
-            system_context=system_context
-        ):
-            # 在每个块之间检查中断
-            if self.session_manager.is_interrupted(session_id):
-                logger.info(f"AgentController: 观察阶段在块处理中被中断，会话ID: {session_id}")
-                return True  # 中断时也返回should_break=True
-            
-            obs_chunks.append(chunk)
-            yield chunk
+        fast_path_reason = self._detect_completion_fast_path(message_manager, task_manager)
+        if fast_path_reason:
+            # 规则信号已经确定任务完成，跳过观察智能体的LLM调用
+            logger.info(f"AgentController: 命中完成快速路径（{fast_path_reason}），跳过观察智能体")
+            obs_chunk = [self._create_fast_path_observation(fast_path_reason, task_manager)]
+            message_manager.add_messages(obs_chunk, agent_name="AgentController")
+            obs_chunks.append(obs_chunk)
+            yield obs_chunk
+        else:
+            observation_agent = observation_agent or self.observation_agent
+            for chunk in observation_agent.run_stream(
+                message_manager=message_manager,
+                task_manager=task_manager,
+                tool_manager=tool_manager,
+                session_id=session_id,
+                system_context=system_context
+            ):
+                # 在每个块之间检查中断
+                if self.session_manager.is_interrupted(session_id):
+                    logger.info(f"AgentController: 观察阶段在块处理中被中断，会话ID: {session_id}")
+                    return True  # 中断时也返回should_break=True
+                
+                obs_chunks.append(chunk)
+                yield chunk
         
         logger.info(f"AgentController: 观察阶段完成，生成 {len(obs_chunks)} 个块")
         
@@ -1035,6 +1200,175 @@ class AgentController:
             
         return False
 
+    def _is_budget_nearly_exhausted(self, session_id: str) -> bool:
+        """
+        检查会话预算是否即将耗尽，耗尽时记录降级原因，由调用方提前结束循环进入总结
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            bool: 是否应该停止循环
+        """
+        budget = get_session_budget(session_id)
+        if not budget:
+            return False
+        reason = budget.is_nearly_exhausted()
+        if reason:
+            budget.degraded_reason = reason
+            logger.warning(f"AgentController: 会话预算即将耗尽（{reason}），提前进入任务总结")
+        self.session_manager.update_session_metadata(session_id, {'budget': budget.get_stats()})
+        return bool(reason)
+
+    def _record_latest_plan(self, message_manager: Any, loop_guard: Any) -> None:
+        """
+        将最新的规划结果记录到循环重复检测器
+        
+        Args:
+            message_manager: MessageManager实例
+            loop_guard: 会话的LoopGuard
+        """
+        for msg in reversed(message_manager.get_all_messages()):
+            if msg.get('type') != 'planning_result':
+                continue
+            try:
+                plan = json.loads(msg['content'].replace('Planning: ', '', 1))
+            except (json.JSONDecodeError, KeyError, AttributeError):
+                return
+            if isinstance(plan, dict):
+                # 本轮没有产生新规划时（如融合观察规划已记录过）不重复计数
+                loop_guard.record_plan(plan, plan_id=msg.get('message_id'))
+            return
+
+    def _escalate_repeated_loop(self, message_manager: Any, loop_guard: Any, session_id: str) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        重复次数达到阈值后升级：结束循环进入总结，或直接终止并告知用户
+        
+        Args:
+            message_manager: MessageManager实例
+            loop_guard: 会话的LoopGuard
+            session_id: 会话ID
+            
+        Yields:
+            List[Dict[str, Any]]: 终止时输出的说明消息
+        """
+        action = get_settings().agent.loop_escalation_action
+        logger.warning(f"AgentController: 检测到重复循环（{loop_guard.escalation_reason}），升级方式: {action}")
+        self.session_manager.update_session_metadata(session_id, {'loop_guard': loop_guard.get_stats()})
+        if action != 'terminate':
+            return
+        
+        content = f"检测到任务执行陷入重复（{loop_guard.escalation_reason}），已停止继续执行。"
+        terminate_msg = {
+            'role': 'assistant',
+            'content': content,
+            'type': 'final_answer',
+            'message_id': str(uuid.uuid4()),
+            'show_content': content + '\n'
+        }
+        message_manager.add_messages([terminate_msg], agent_name="AgentController")
+        yield [terminate_msg]
+
+    def _detect_completion_fast_path(self, message_manager: Any, task_manager: Any) -> Optional[str]:
+        """
+        基于规则检测本轮执行后任务是否已经完成，命中时无需再调用观察智能体
+        
+        启用的信号由 AgentConfig.completion_fast_path_signals 配置：
+        - completion_tool: 本轮执行调用了complete_task工具，且除本轮规划的子任务外没有未完成的子任务
+          （子任务状态只在观察阶段更新，此时本轮子任务仍是未完成状态；命中后由这里将其标记为完成。
+          执行智能体也会用complete_task结束单个子任务，仍有其他待办任务时交给观察智能体判断）
+        - all_tasks_terminal: TaskManager中所有子任务都已完成/失败/跳过
+        
+        Args:
+            message_manager: MessageManager实例
+            task_manager: TaskManager实例
+            
+        Returns:
+            Optional[str]: 命中的信号名称，未命中返回None
+        """
+        signals = get_settings().agent.completion_fast_path_signals
+        if not signals:
+            return None
+        
+        # 本轮执行产生的消息：最近一次规划结果之后的消息
+        round_messages = []
+        planned_task_id = None
+        for msg in reversed(message_manager.get_all_messages()):
+            if msg.get('type') == 'planning_result':
+                planned_task_id = ExecutorAgent._get_planned_task_id(msg)
+                break
+            round_messages.append(msg)
+        
+        tasks = task_manager.get_all_tasks() if task_manager else []
+        terminal = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.SKIPPED)
+        remaining = [task for task in tasks if task.status not in terminal]
+        
+        if 'completion_tool' in signals:
+            called = any(tool_call.get('function', {}).get('name') == 'complete_task'
+                         for msg in round_messages for tool_call in msg.get('tool_calls') or [])
+            others = [task for task in remaining if task.task_id != planned_task_id]
+            if called and not others:
+                if planned_task_id and len(others) < len(remaining):
+                    # 观察阶段被跳过，由这里完成本轮子任务的状态更新
+                    task_manager.update_task_status(planned_task_id, TaskStatus.COMPLETED)
+                    logger.info(f"AgentController: 本轮调用了complete_task，已将子任务 {planned_task_id} 标记为完成")
+                return 'completion_tool'
+            if called:
+                logger.info(f"AgentController: 本轮调用了complete_task，但仍有 {len(others)} 个未完成的子任务，交给观察阶段判断")
+        
+        if 'all_tasks_terminal' in signals and tasks and not remaining:
+            return 'all_tasks_terminal'
+        
+        return None
+
+    def _create_fast_path_observation(self, reason: str, task_manager: Any) -> Dict[str, Any]:
+        """
+        为完成快速路径构造与ObservationAgent格式一致的观察结果消息
+        
+        Args:
+            reason: 命中的完成信号
+            task_manager: TaskManager实例
+            
+        Returns:
+            Dict[str, Any]: observation_result消息
+        """
+        tasks = task_manager.get_all_tasks() if task_manager else []
+        obs_result = {
+            "finish_percent": 100,
+            "completion_status": "completed",
+            "analysis": f"规则判定任务已完成（{reason}），跳过观察分析",
+            "completed_task_ids": [t.task_id for t in tasks if t.status == TaskStatus.COMPLETED],
+            "pending_task_ids": [t.task_id for t in tasks if t.status in (TaskStatus.PENDING, TaskStatus.IN_PROGRESS)],
+            "failed_task_ids": [t.task_id for t in tasks if t.status == TaskStatus.FAILED],
+            "needs_more_input": False,
+            "is_completed": True,
+            "fast_path": reason
+        }
+        return {
+            'role': 'assistant',
+            'content': 'Observation: ' + json.dumps(obs_result, ensure_ascii=False),
+            'type': 'observation_result',
+            'message_id': str(uuid.uuid4()),
+            'show_content': ''
+        }
+
+    def _has_pending_plan(self, message_manager: Any) -> bool:
+        """
+        检查最近一次观察之后是否已经有待执行的计划（融合观察规划的输出）
+        
+        Args:
+            message_manager: MessageManager实例
+            
+        Returns:
+            bool: 最新的规划结果是否出现在最新的观察结果之后
+        """
+        for msg in reversed(message_manager.get_all_messages()):
+            if msg.get('type') == 'planning_result':
+                return True
+            if msg.get('type') == 'observation_result':
+                return False
+        return False
+
     def _check_task_completion_and_summarize(self, 
                                            session_id: str,
                                            message_manager: Any,
@@ -1071,14 +1405,23 @@ class AgentController:
             # 更新跟踪状态
             self._task_status_tracking[session_id] = current_completed_count
             
-            # 调用StageSummaryAgent生成任务执行总结
-            yield from self._execute_stage_summary_phase(
-                message_manager=message_manager,
-                task_manager=task_manager,
-                tool_manager=tool_manager,
-                system_context=system_context,
-                session_id=session_id
-            )
+            # 调用StageSummaryAgent生成任务执行总结，默认在后台运行，不阻塞下一轮规划
+            if get_settings().agent.background_stage_summary:
+                yield from self._start_background_stage_summary(
+                    message_manager=message_manager,
+                    task_manager=task_manager,
+                    tool_manager=tool_manager,
+                    system_context=system_context,
+                    session_id=session_id
+                )
+            else:
+                yield from self._execute_stage_summary_phase(
+                    message_manager=message_manager,
+                    task_manager=task_manager,
+                    tool_manager=tool_manager,
+                    system_context=system_context,
+                    session_id=session_id
+                )
         else:
             # 初始化跟踪状态
             if session_id not in self._task_status_tracking:
@@ -1111,14 +1454,6 @@ class AgentController:
             logger.info(f"AgentController: 阶段总结阶段被中断，会话ID: {session_id}")
             return
         
-        # 准备阶段信息
-        stage_info = {
-            "stage_type": "task_completion",
-            "completed_tasks_count": len([task for task in task_manager.get_all_tasks() if task.status.value == "completed"]),
-            "total_tasks_count": len(task_manager.get_all_tasks()),
-            "session_id": session_id
-        }
-        
         summary_chunks = []
         for chunk in self.stage_summary_agent.run_stream(
             message_manager=message_manager,
@@ -1126,7 +1461,7 @@ class AgentController:
             tool_manager=tool_manager,
             session_id=session_id,
             system_context=system_context,
-            stage_info=stage_info
+            stage_info=self._build_stage_info(task_manager, session_id)
         ):
             # 在每个块之间检查中断
             if self.session_manager.is_interrupted(session_id):
@@ -1138,6 +1473,119 @@ class AgentController:
         
         logger.info(f"AgentController: 阶段总结阶段完成，生成 {len(summary_chunks)} 个块")
 
+    def _build_stage_info(self, task_manager: Any, session_id: str) -> Dict[str, Any]:
+        """
+        准备阶段总结的阶段信息
+        
+        Args:
+            task_manager: TaskManager实例
+            session_id: 会话ID
+            
+        Returns:
+            Dict[str, Any]: 阶段信息
+        """
+        all_tasks = task_manager.get_all_tasks()
+        return {
+            "stage_type": "task_completion",
+            "completed_tasks_count": len([task for task in all_tasks if task.status.value == "completed"]),
+            "total_tasks_count": len(all_tasks),
+            "session_id": session_id
+        }
+
+    def _start_background_stage_summary(self, 
+                                        message_manager: Any,
+                                        task_manager: Any,
+                                        tool_manager: Optional[Any],
+                                        system_context: Dict[str, Any],
+                                        session_id: str) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        在后台启动阶段总结，与下一轮规划并行执行
+        
+        同一会话上一次的阶段总结会先被汇合，避免两次总结重复处理同一批任务。
+        
+        Args:
+            message_manager: MessageManager实例
+            task_manager: TaskManager实例
+            tool_manager: 工具管理器
+            system_context: 执行上下文
+            session_id: 会话ID
+            
+        Yields:
+            List[Dict[str, Any]]: 上一次阶段总结尚未输出的消息块
+        """
+        for chunk in self._join_stage_summary(session_id):
+            yield chunk
+        
+        if self.session_manager.is_interrupted(session_id):
+            logger.info(f"AgentController: 会话已中断，不再启动阶段总结，会话ID: {session_id}")
+            return
+        
+        stage_info = self._build_stage_info(task_manager, session_id)
+        # 在主线程准备上下文快照；后台线程只调用LLM，总结结果回到主线程后再写入任务
+        summary_context = self.stage_summary_agent.prepare_summary_context(
+            message_manager, task_manager, session_id, system_context
+        )
+        logger.info(f"AgentController: 在后台启动阶段总结，会话ID: {session_id}")
+        job = BackgroundStream(
+            name=f"stage-summary-{session_id}",
+            stream_factory=lambda: self.stage_summary_agent.run_stream(
+                message_manager=message_manager,
+                task_manager=task_manager,
+                tool_manager=tool_manager,
+                session_id=session_id,
+                system_context=system_context,
+                stage_info=stage_info,
+                summary_context=summary_context,
+                apply_updates=False
+            ),
+            should_stop=lambda: self.session_manager.is_interrupted(session_id)
+        )
+        self._stage_summary_jobs[session_id] = (job, summary_context)
+
+    def _apply_stage_summary_chunks(self, chunks: List[List[Dict[str, Any]]], summary_context: Dict[str, Any]) -> None:
+        """
+        在主线程中把后台阶段总结的结果写入任务
+        
+        Args:
+            chunks: 后台阶段总结产出的消息块
+            summary_context: 启动该阶段总结时准备的上下文
+        """
+        for chunk in chunks:
+            for msg in chunk or []:
+                if msg.get('type') != 'stage_summary':
+                    continue
+                try:
+                    summary_result = json.loads(msg.get('content') or '{}')
+                except json.JSONDecodeError:
+                    logger.warning("AgentController: 无法解析阶段总结结果，跳过任务更新")
+                    continue
+                if isinstance(summary_result, dict):
+                    self.stage_summary_agent.apply_summary_result(summary_result, summary_context)
+
+    def _join_stage_summary(self, session_id: str, timeout: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+        """
+        汇合点：等待后台阶段总结完成并在当前线程写入execution_summary，读取execution_summary之前调用
+        
+        超时未完成时不写入任务，后台线程的结果被丢弃。
+        
+        Args:
+            session_id: 会话ID
+            timeout: 最长等待时间（秒），为None时一直等待
+            
+        Returns:
+            List[List[Dict[str, Any]]]: 阶段总结尚未输出的消息块
+        """
+        pending = self._stage_summary_jobs.pop(session_id, None)
+        if not pending:
+            return []
+        job, summary_context = pending
+        if not job.done:
+            logger.info(f"AgentController: 等待后台阶段总结完成，会话ID: {session_id}")
+        chunks = job.join(timeout)
+        if job.done:
+            self._apply_stage_summary_chunks(chunks, summary_context)
+        return chunks
+
     def _handle_workflow_error(self, error: Exception) -> Generator[List[Dict[str, Any]], None, None]:
         """
         处理工作流执行错误
@@ -1529,21 +1977,14 @@ class AgentController:
             'total_cached_tokens': 0,
             'total_reasoning_tokens': 0,
             'total_calls': 0,
-            'agents': {}
+            'total_retries': 0,
+            'retry_overhead_time': 0.0,
+            'agents': {},
+            'models': {}
         }
         
         # 收集各个agent的统计
-        agents = [
-            self.task_analysis_agent,
-            self.executor_agent,
-            self.task_summary_agent,
-            self.planning_agent,
-            self.observation_agent,
-            self.direct_executor_agent,
-            self.task_decompose_agent
-        ]
-        
-        for agent in agents:
+        for agent in self._get_all_agents():
             if hasattr(agent, 'get_token_stats'):
                 stats = agent.get_token_stats()
                 all_stats[stats['agent_name']] = stats
@@ -1554,7 +1995,21 @@ class AgentController:
                 total_stats['total_cached_tokens'] += stats['total_cached_tokens']
                 total_stats['total_reasoning_tokens'] += stats['total_reasoning_tokens']
                 total_stats['total_calls'] += stats['total_calls']
+                total_stats['total_retries'] += stats.get('total_retries', 0)
+                total_stats['retry_overhead_time'] += stats.get('retry_overhead_time', 0.0)
                 total_stats['agents'][stats['agent_name']] = stats
+                
+                # 按模型汇总
+                for model_name, model_stats in stats.get('model_breakdown', {}).items():
+                    merged = total_stats['models'].setdefault(model_name, {
+                        'calls': 0,
+                        'input_tokens': 0,
+                        'output_tokens': 0,
+                        'cached_tokens': 0,
+                        'reasoning_tokens': 0
+                    })
+                    for key, value in model_stats.items():
+                        merged[key] = merged.get(key, 0) + value
         
         return {
             'individual_stats': all_stats,
@@ -1572,7 +2027,7 @@ class AgentController:
         
         # 收集所有agent的统计信息
         all_stats = []
-        for agent in [self.task_analysis_agent, self.planning_agent, self.executor_agent, self.observation_agent, self.task_summary_agent]:
+        for agent in self._get_all_agents():
             if agent:
                 stats = agent.get_token_stats()
                 all_stats.append(stats)
@@ -1593,22 +2048,28 @@ class AgentController:
             if stats['total_calls'] > 0:
                 agent_total = stats['total_input_tokens'] + stats['total_output_tokens']
                 logger.info(f"  {stats['agent_name']}: {stats['total_calls']}次, {agent_total:,}tokens")
+        
+        # 按模型统计
+        collected_totals = self._collect_agent_stats()['total_stats']
+        for model_name, model_stats in collected_totals['models'].items():
+            model_total = model_stats['input_tokens'] + model_stats['output_tokens']
+            logger.info(f"  [模型] {model_name}: {model_stats['calls']}次, {model_total:,}tokens")
+        
+        # LLM重试开销
+        if collected_totals['total_retries']:
+            logger.info(f"LLM重试: {collected_totals['total_retries']}次, 额外耗时{collected_totals['retry_overhead_time']:.1f}s")
+        
+        # LLM调度排队统计
+        scheduler = get_llm_scheduler()
+        if scheduler:
+            metrics = scheduler.get_metrics()
+            logger.info(f"LLM调度: {metrics['total_acquired']}次, 平均排队{metrics['avg_wait_time']:.2f}s, 最大排队{metrics['max_wait_time']:.2f}s")
 
     def reset_all_token_stats(self):
         """
         重置所有agent的token统计
         """
-        agents = [
-            self.task_analysis_agent,
-            self.executor_agent,
-            self.task_summary_agent,
-            self.planning_agent,
-            self.observation_agent,
-            self.direct_executor_agent,
-            self.task_decompose_agent
-        ]
-        
-        for agent in agents:
+        for agent in self._get_all_agents():
             if hasattr(agent, 'reset_token_stats'):
                 agent.reset_token_stats()
         
@@ -1771,6 +2232,20 @@ class AgentController:
                 json.dump(task_data, f, ensure_ascii=False, indent=2)
             logger.info(f"AgentController: 已保存TaskManager状态到 {task_file}")
             
+            # 保存循环重复检测统计
+            loop_guard = get_loop_guard(session_id)
+            if loop_guard:
+                stats_file = os.path.join(workspace_dir, "loop_guard_stats.json")
+                with open(stats_file, 'w', encoding='utf-8') as f:
+                    json.dump(loop_guard.get_stats(), f, ensure_ascii=False, indent=2)
+            
+            # 保存会话预算使用情况
+            budget = get_session_budget(session_id)
+            if budget:
+                budget_file = os.path.join(workspace_dir, "budget_stats.json")
+                with open(budget_file, 'w', encoding='utf-8') as f:
+                    json.dump(budget.get_stats(), f, ensure_ascii=False, indent=2)
+            
         except Exception as e:
             logger.error(f"AgentController: 保存会话状态失败: {str(e)}")
             raise
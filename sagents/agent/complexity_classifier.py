@@ -0,0 +1,408 @@
+"""
+查询复杂度分类器
+
+根据用户问题的复杂度自动选择最经济且足够的执行方式：
+- direct: 直接执行（DirectExecutorAgent），适合问候、事实问答、单步计算/翻译等
+- deep_research: 多智能体协作（分析、分解、规划、执行、观察、总结）
+
+先使用本地启发式规则打分，分数落在模糊区间时可选地调用小模型做二次判断
+（ComplexityClassifierAgent，经由AgentBase的重试、调度、会话预算和响应缓存）。
+“继续”“好的，按这个方案执行”这类简短跟进沿用上一轮的执行方式。
+附带两份带标注的本地语料：complexity_corpus.jsonl 用于调整规则，
+complexity_corpus_holdout.jsonl 只用于评估、不参与调整，可通过
+``python -m sagents.agent.complexity_classifier`` 分别评估分类效果。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import json
+import os
+import re
+import uuid
+from typing import Dict, List, Any, Optional, Callable, Generator
+
+from sagents.utils.logger import logger
+from .agent_base import AgentBase
+
+DIRECT = "direct"
+DEEP_RESEARCH = "deep_research"
+
+DEFAULT_CORPUS_PATH = os.path.join(os.path.dirname(__file__), "complexity_corpus.jsonl")
+DEFAULT_HOLDOUT_PATH = os.path.join(os.path.dirname(__file__), "complexity_corpus_holdout.jsonl")
+
+# 简短跟进的最大长度（中文字符按两个计）
+_FOLLOW_UP_MAX_LENGTH = 30
+
+# 需要多步骤完成的任务特征词
+_COMPLEX_KEYWORDS = [
+    '调研', '研究', '报告', '分析', '对比', '比较', '规划', '计划', '方案', '设计', '撰写',
+    '整理', '汇总', '综述', '批量', '爬取', '抓取', '开发', '实现', '搭建', '部署', '优化',
+    '评估', '深入', '详细', '全面', '系统地', '多个', '每个', '所有', '分别', '包括', '编写', '行程',
+    '每(天|周|月)', r'写一(篇|份)', r'\d+\s*字', '生成.{0,6}(文件|文档|表格|ppt|PPT|网页)',
+    'research', 'report', 'analy[sz]e', 'compare', 'comparison', 'plan', 'design', 'implement',
+    'build', 'investigate', 'survey', 'summari[sz]e', 'in[- ]depth', 'step by step', 'write an? '
+]
+
+# 多步骤的顺序/并列标记
+_SEQUENCE_MARKERS = [
+    '首先', '然后', '接着', '之后', '最后', '并且', '同时', '另外', r'(^|\s)\d+[\.、)]',
+    r'\bfirst\b', r'\bthen\b', r'\bfinally\b', r'\band also\b'
+]
+
+# 附件、链接、文件路径
+_RESOURCE_PATTERNS = [
+    r'https?://', r'\.(pdf|docx?|xlsx?|csv|pptx?|md|txt|json)\b', '附件', '文件', '数据集', r'\bfile\b'
+]
+
+# 简单问题特征
+_SIMPLE_PATTERNS = [
+    r'^(你好|您好|hi|hello|hey|早上好|晚上好|谢谢|感谢|thanks|thank you)',
+    '是什么', '什么是', '是谁', '多少', '几点', '哪一年', '哪天', '翻译', '的意思',
+    r'^(what|who|when|where|which) (is|are|was|were)\b', r'\bdefine\b', r'\bhow many\b',
+    r'\btranslate\b', r'^(计算|算一下)', r'^calculate\b', r'\bin (one|two|three|five|a few|\d+) (sentences?|words)\b'
+]
+
+
+# 承接上一轮的简短跟进（确认、继续执行），本身不包含新的任务信息
+_FOLLOW_UP_PATTERNS = [
+    r'^(好的?|好吧|行|可以|没问题|嗯|对|是的|ok|okay|yes|sure)([\s,，。.!！~]|$)',
+    '继续', '接着', r'按(这个|此|上面|你的|该)', '就这样', '照做', r'^(执行|开始)', '开始(吧|执行)',
+    r'\bgo ahead\b', r'\bcontinue\b', r'\bproceed\b', r'\bdo it\b', r'\bsounds good\b'
+]
+
+# 只在多智能体协作中产生的消息类型
+_DEEP_RESEARCH_MESSAGE_TYPES = {
+    'task_decomposition', 'planning_result', 'observation_result', 'do_subtask', 'do_subtask_result', 'stage_summary'
+}
+
+
+def _count_matches(patterns: List[str], text: str) -> int:
+    return sum(1 for pattern in patterns if re.search(pattern, text, re.IGNORECASE | re.MULTILINE))
+
+
+def _weighted_length(text: str) -> int:
+    # 中文字符信息密度更高，按两个字符计
+    return len(text) + len(re.findall(r'[\u4e00-\u9fff]', text))
+
+
+def score_query_complexity(query: str) -> Dict[str, Any]:
+    """
+    使用启发式规则为问题的复杂度打分
+
+    Args:
+        query: 用户问题
+
+    Returns:
+        Dict[str, Any]: 包含 score（分数越高越复杂）和 reasons（各项得分说明）
+    """
+    text = (query or '').strip()
+    score = 0
+    reasons = []
+
+    length = _weighted_length(text)
+    if length > 160:
+        score += 2
+        reasons.append(f"长度{length}(+2)")
+    elif length > 60:
+        score += 1
+        reasons.append(f"长度{length}(+1)")
+    elif length < 12:
+        score -= 1
+        reasons.append(f"长度{length}(-1)")
+
+    complex_hits = min(_count_matches(_COMPLEX_KEYWORDS, text), 3)
+    if complex_hits:
+        score += complex_hits
+        reasons.append(f"复杂任务特征词(+{complex_hits})")
+
+    sequence_hits = min(_count_matches(_SEQUENCE_MARKERS, text), 2)
+    if sequence_hits:
+        score += sequence_hits
+        reasons.append(f"多步骤标记(+{sequence_hits})")
+
+    if _count_matches(_RESOURCE_PATTERNS, text):
+        score += 1
+        reasons.append("涉及文件/链接(+1)")
+
+    if len(re.findall(r'[?？]', text)) >= 2:
+        score += 1
+        reasons.append("多个问题(+1)")
+
+    simple_hits = min(_count_matches(_SIMPLE_PATTERNS, text), 2)
+    if simple_hits:
+        score -= simple_hits
+        reasons.append(f"简单问题特征(-{simple_hits})")
+
+    return {'score': score, 'reasons': reasons}
+
+
+def parse_complexity_mode(content: str) -> Optional[str]:
+    """
+    从模型输出中解析执行方式，取最后一个 {"mode": ...}，忽略推理过程中提到的其他取值
+
+    Args:
+        content: 模型输出
+
+    Returns:
+        Optional[str]: DIRECT 或 DEEP_RESEARCH，无法解析时返回None
+    """
+    modes = re.findall(r'"mode"\s*:\s*"(direct|deep_research)"', content or '')
+    return modes[-1] if modes else None
+
+
+class ComplexityClassifierAgent(AgentBase):
+    """
+    复杂度二次判断智能体
+
+    通过AgentBase的非流式调用访问模型，与其他智能体一样经过重试、调度限流、会话预算和LLM响应缓存。
+    不限制max_tokens，推理模型的思考过程不会挤掉最终的JSON输出。
+    """
+
+    def __init__(self, model: Any, model_config: Dict[str, Any], system_prefix: str = ""):
+        super().__init__(model, model_config, system_prefix)
+        self.agent_description = "查询复杂度分类智能体，判断问题需要直接执行还是多智能体协作"
+
+    def classify(self, query: str, session_id: Optional[str] = None) -> Optional[str]:
+        """
+        判断问题是否需要多步骤协作完成
+
+        Args:
+            query: 用户问题
+            session_id: 会话ID（用于预算、调度和请求记录）
+
+        Returns:
+            Optional[str]: DIRECT 或 DEEP_RESEARCH，调用失败或无法解析时返回None
+        """
+        prompt = f"""判断下面的用户请求需要哪种执行方式，只输出JSON，不要输出其他内容：
+- direct：一次回答或一两次工具调用即可完成（问候、事实问答、简单计算、翻译、单个文件的简单操作）
+- deep_research：需要拆分为多个子任务、多轮检索或生成长篇/多个产出物
+
+用户请求：
+{query}
+
+输出格式：{{"mode": "direct"}} 或 {{"mode": "deep_research"}}"""
+        try:
+            response = self._call_llm_non_streaming(
+                [{"role": "user", "content": prompt}],
+                session_id=session_id,
+                step_name="complexity_classification",
+                model_config_override={'temperature': 0}
+            )
+            content = response.choices[0].message.content or ''
+        except Exception as e:
+            logger.warning(f"ComplexityClassifierAgent: 小模型判断失败: {e}")
+            return None
+        mode = parse_complexity_mode(content)
+        if mode is None:
+            logger.warning(f"ComplexityClassifierAgent: 无法解析小模型输出: {content[-100:]}")
+        return mode
+
+    def run_stream(self,
+                   messages: List[Dict[str, Any]],
+                   tool_manager: Optional[Any] = None,
+                   session_id: str = None,
+                   system_context: Optional[Dict[str, Any]] = None) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        对最新的用户问题做二次判断，输出一条分类结果消息
+
+        Args:
+            messages: 对话消息列表
+            tool_manager: 未使用
+            session_id: 会话ID
+            system_context: 未使用
+
+        Yields:
+            List[Dict[str, Any]]: 分类结果消息块
+        """
+        mode = self.classify(extract_latest_user_query(messages), session_id)
+        content = json.dumps({'mode': mode}, ensure_ascii=False)
+        yield self._create_message_chunk(content, str(uuid.uuid4()), content, message_type='complexity_classification')
+
+
+def classify_query_complexity(query: str,
+                              llm_classifier: Optional[Callable[[str], Optional[str]]] = None,
+                              direct_max_score: int = 0,
+                              deep_min_score: int = 2,
+                              deep_thinking_min_score: int = 4) -> Dict[str, Any]:
+    """
+    判断问题应使用直接执行还是多智能体协作
+
+    分数 <= direct_max_score 判为直接执行，>= deep_min_score 判为多智能体协作，
+    介于两者之间时，提供了小模型判断函数则调用它，否则选择更经济的直接执行。
+
+    Args:
+        query: 用户问题
+        llm_classifier: 可选的小模型判断函数（如 ComplexityClassifierAgent.classify），
+            输入问题，返回 DIRECT/DEEP_RESEARCH，失败时返回None
+        direct_max_score: 直接执行的最高分
+        deep_min_score: 多智能体协作的最低分
+        deep_thinking_min_score: 同时开启任务分析（深度思考）的最低分
+
+    Returns:
+        Dict[str, Any]: mode（direct/deep_research）、deep_thinking、score、reasons、source（heuristic/llm/history）
+    """
+    scored = score_query_complexity(query)
+    score = scored['score']
+    source = 'heuristic'
+
+    if score <= direct_max_score:
+        mode = DIRECT
+    elif score >= deep_min_score:
+        mode = DEEP_RESEARCH
+    else:
+        mode = None
+        if llm_classifier is not None:
+            mode = llm_classifier(query)
+            source = 'llm' if mode else source
+        mode = mode or DIRECT
+
+    result = {
+        'mode': mode,
+        'deep_thinking': mode == DEEP_RESEARCH and score >= deep_thinking_min_score,
+        'score': score,
+        'reasons': scored['reasons'],
+        'source': source
+    }
+    logger.info(f"ComplexityClassifier: 分类结果 {mode}（score={score}, source={source}, reasons={scored['reasons']}）")
+    return result
+
+
+def extract_latest_user_query(messages: List[Dict[str, Any]]) -> str:
+    """
+    提取最近一条用户消息的文本
+
+    Args:
+        messages: 消息列表
+
+    Returns:
+        str: 用户问题，没有用户消息时返回空字符串
+    """
+    for msg in reversed(messages):
+        if msg.get('role') == 'user' and isinstance(msg.get('content'), str):
+            return msg['content']
+    return ''
+
+
+def is_follow_up_query(query: str) -> bool:
+    """
+    判断问题是否为承接上一轮的简短跟进（如“继续”“好的，按这个方案执行”）
+
+    Args:
+        query: 用户问题
+
+    Returns:
+        bool: 是否为简短跟进
+    """
+    text = (query or '').strip()
+    return bool(text) and _weighted_length(text) <= _FOLLOW_UP_MAX_LENGTH and _count_matches(_FOLLOW_UP_PATTERNS, text) > 0
+
+
+def _turn_mode(turn_messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """根据一轮对话中智能体产生的消息类型推断该轮的执行方式，消息没有类型信息时返回None"""
+    types = {msg.get('type') for msg in turn_messages if msg.get('role') != 'user' and msg.get('type')}
+    if not types:
+        return None
+    return {
+        'mode': DEEP_RESEARCH if types & _DEEP_RESEARCH_MESSAGE_TYPES else DIRECT,
+        'deep_thinking': 'task_analysis_result' in types
+    }
+
+
+def classify_conversation_complexity(messages: List[Dict[str, Any]],
+                                     llm_classifier: Optional[Callable[[str], Optional[str]]] = None,
+                                     **thresholds) -> Optional[Dict[str, Any]]:
+    """
+    判断对话的最新问题应使用的执行方式
+
+    最新问题是简短跟进时沿用上一轮的执行方式：优先根据上一轮智能体产生的消息类型判断，
+    没有类型信息时对上一轮的问题重新分类；否则只对最新问题分类。
+
+    Args:
+        messages: 消息列表
+        llm_classifier: 可选的小模型判断函数
+        **thresholds: 传给 classify_query_complexity 的分数阈值
+
+    Returns:
+        Optional[Dict[str, Any]]: 同 classify_query_complexity，没有用户消息时返回None
+    """
+    user_indexes = [index for index, msg in enumerate(messages)
+                    if msg.get('role') == 'user' and isinstance(msg.get('content'), str)]
+    if not user_indexes:
+        return None
+    query = messages[user_indexes[-1]]['content']
+    if len(user_indexes) < 2 or not is_follow_up_query(query):
+        return classify_query_complexity(query, llm_classifier=llm_classifier, **thresholds)
+
+    previous = _turn_mode(messages[user_indexes[-2] + 1:user_indexes[-1]])
+    if previous is None:
+        previous = classify_conversation_complexity(messages[:user_indexes[-1]], llm_classifier, **thresholds)
+    result = {
+        'mode': previous['mode'],
+        'deep_thinking': previous['deep_thinking'],
+        'score': score_query_complexity(query)['score'],
+        'reasons': ["简短跟进，沿用上一轮的执行方式"],
+        'source': 'history'
+    }
+    logger.info(f"ComplexityClassifier: 最新问题为简短跟进，沿用上一轮的执行方式 {result['mode']}")
+    return result
+
+
+def load_complexity_corpus(path: str = DEFAULT_CORPUS_PATH) -> List[Dict[str, Any]]:
+    """
+    加载带标注的语料，每行一个 {"query": ..., "label": "direct" | "deep_research"}，
+    可选的 history 为该问题之前的对话消息
+
+    Args:
+        path: 语料文件路径
+
+    Returns:
+        List[Dict[str, Any]]: 语料条目
+    """
+    items = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                items.append(json.loads(line))
+    return items
+
+
+def evaluate_complexity_classifier(corpus: Optional[List[Dict[str, Any]]] = None,
+                                   llm_classifier: Optional[Callable[[str], Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    在标注语料上评估分类器
+
+    Args:
+        corpus: 语料条目，为None时加载默认语料
+        llm_classifier: 可选的小模型判断函数
+
+    Returns:
+        Dict[str, Any]: 准确率、混淆矩阵（标注 -> 预测 -> 数量）和错误样本
+    """
+    corpus = corpus if corpus is not None else load_complexity_corpus()
+    confusion = {label: {DIRECT: 0, DEEP_RESEARCH: 0} for label in (DIRECT, DEEP_RESEARCH)}
+    errors = []
+    for item in corpus:
+        messages = item.get('history', []) + [{'role': 'user', 'content': item['query']}]
+        result = classify_conversation_complexity(messages, llm_classifier=llm_classifier)
+        confusion[item['label']][result['mode']] += 1
+        if result['mode'] != item['label']:
+            errors.append({'query': item['query'], 'label': item['label'], 'predicted': result['mode'], 'score': result['score']})
+
+    correct = sum(confusion[label][label] for label in confusion)
+    return {
+        'total': len(corpus),
+        'accuracy': round(correct / len(corpus), 4) if corpus else 0.0,
+        'confusion': confusion,
+        'errors': errors
+    }
+
+
+if __name__ == "__main__":
+    # 规则按调整语料编写，留出语料的结果才反映对新问题的效果
+    report = {
+        'tuning': evaluate_complexity_classifier(load_complexity_corpus(DEFAULT_CORPUS_PATH)),
+        'holdout': evaluate_complexity_classifier(load_complexity_corpus(DEFAULT_HOLDOUT_PATH))
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
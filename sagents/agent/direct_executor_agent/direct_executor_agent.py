@@ -18,7 +18,7 @@ from typing import List, Dict, Any, Optional, Generator
 
 from sagents.agent.agent_base import AgentBase
 from sagents.tool.tool_manager import ToolManager
-from sagents.tool.tool_base import AgentToolSpec
+from sagents.tool.tool_base import AgentToolSpec, ToolResult
 from sagents.utils.logger import logger
 
 
@@ -845,12 +845,12 @@ class DirectExecutorAgent(AgentBase):
             "show_content": "工具调用失败\n\n"
         }]
 
-    def process_tool_response(self, tool_response: str, tool_call_id: str) -> List[Dict[str, Any]]:
+    def process_tool_response(self, tool_response: Any, tool_call_id: str) -> List[Dict[str, Any]]:
         """
         处理工具执行响应
         
         Args:
-            tool_response: 工具执行响应
+            tool_response: 工具执行响应（ToolResult或JSON字符串）
             tool_call_id: 工具调用ID
             
         Returns:
@@ -859,7 +859,12 @@ class DirectExecutorAgent(AgentBase):
         logger.debug(f"DirectExecutorAgent: 处理工具响应，工具调用ID: {tool_call_id}")
         
         try:
-            tool_response_dict = json.loads(tool_response)
+            if isinstance(tool_response, ToolResult):
+                # 结构化结果无需再解析，交给LLM的内容只序列化一次
+                tool_response_dict = tool_response.to_dict()
+                tool_response = tool_response.to_llm_content()
+            else:
+                tool_response_dict = json.loads(tool_response)
             
             if "content" in tool_response_dict:
                 result = [{
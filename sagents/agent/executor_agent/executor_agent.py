@@ -18,7 +18,9 @@ from typing import List, Dict, Any, Optional, Generator
 
 from ..agent_base import AgentBase
 from ...tool.tool_manager import ToolManager
-from ...tool.tool_base import AgentToolSpec
+from ...tool.tool_base import AgentToolSpec, ToolResult
+from ..loop_guard import get_loop_guard
+from sagents.config.settings import get_settings
 from sagents.utils.logger import logger
 
 
@@ -37,6 +39,17 @@ class ExecutorAgent(AgentBase):
 
 请直接开始执行任务，观察历史对话，不要做重复性的工作。"""
 
+    # 前置任务上下文模板常量
+    DEPENDENCY_CONTEXT_TEMPLATE = """当前子任务（任务ID: {task_id}）依赖的前置任务执行结果：
+
+{dependency_summaries}"""
+
+    # 按子任务构建上下文时保留的执行过程消息类型
+    EXECUTION_TRACE_TYPES = {
+        'do_subtask', 'do_subtask_result', 'tool_call', 'tool_call_result',
+        'tool_error', 'tool_response', 'handoff_agent'
+    }
+
     # 系统提示模板常量
     SYSTEM_PREFIX_DEFAULT = """你是个任务执行助手，你需要根据最新的任务描述和要求，来执行任务。
     
@@ -133,7 +146,8 @@ class ExecutorAgent(AgentBase):
             execution_messages = self._prepare_execution_messages(
                 messages=messages,
                 subtask_info=subtask_info,
-                execution_context=execution_context
+                execution_context=execution_context,
+                task_manager=task_manager
             )
             # logger.info(f"ExecutorAgent: 执行消息: {execution_messages}")
             # 发送任务执行提示
@@ -230,7 +244,8 @@ class ExecutorAgent(AgentBase):
             subtask_info = {
                 'description': subtask_dict['next_step']['description'],
                 'expected_output': subtask_dict['next_step']['expected_output'],
-                'required_tools': subtask_dict['next_step'].get('required_tools', [])
+                'required_tools': subtask_dict['next_step'].get('required_tools', []),
+                'task_id': subtask_dict['next_step'].get('task_id')
             }
             
             logger.info(f"ExecutorAgent: 解析子任务成功 - {subtask_info['description']}")
@@ -244,7 +259,8 @@ class ExecutorAgent(AgentBase):
     def _prepare_execution_messages(self, 
                                   messages: List[Dict[str, Any]],
                                   subtask_info: Dict[str, Any],
-                                  execution_context: Dict[str, Any]) -> List[Dict[str, Any]]:
+                                  execution_context: Dict[str, Any],
+                                  task_manager: Optional[Any] = None) -> List[Dict[str, Any]]:
         """
         准备执行消息列表
         
@@ -252,6 +268,7 @@ class ExecutorAgent(AgentBase):
             messages: 原始消息列表
             subtask_info: 子任务信息
             execution_context: 执行上下文
+            task_manager: 任务管理器，用于按子任务依赖构建上下文
             
         Returns:
             List[Dict[str, Any]]: 准备好的执行消息列表
@@ -262,8 +279,12 @@ class ExecutorAgent(AgentBase):
             system_context=execution_context.get('system_context')
         )
         
-        # 使用新的方法提取最近消息
-        recent_messages = self._extract_recent_messages(messages)
+        # 优先按子任务的依赖构建上下文，无法确定当前子任务或依赖关系时使用最近消息
+        recent_messages = None
+        if get_settings().agent.executor_context_mode == 'dependencies':
+            recent_messages = self._extract_dependency_messages(messages, subtask_info.get('task_id'), task_manager)
+        if recent_messages is None:
+            recent_messages = self._extract_recent_messages(messages)
         
         # 深拷贝消息
         messages_input = deepcopy(recent_messages)
@@ -398,8 +419,8 @@ class ExecutorAgent(AgentBase):
         Returns:
             Generator: LLM流式响应
         """
-        # 准备模型配置，包含工具
-        model_config_with_tools = {**self.model_config}
+        # 准备模型配置覆盖项（基础配置由路由解析决定）
+        model_config_with_tools = {}
         if tools_json:
             model_config_with_tools["tools"] = tools_json
         
@@ -605,12 +626,17 @@ class ExecutorAgent(AgentBase):
                 else:
                     # 7. 执行普通工具
                     arguments = json.loads(tool_call['function']['arguments'])
-                    tool_response = tool_manager.run_tool(
-                        tool_name,
-                        messages=execution_messages,
-                        session_id=session_id,
-                        **arguments
-                    )
+                    loop_guard = get_loop_guard(session_id)
+                    tool_response = loop_guard.before_tool_call(tool_name, arguments) if loop_guard else None
+                    if tool_response is None:
+                        tool_response = tool_manager.run_tool(
+                            tool_name,
+                            messages=execution_messages,
+                            session_id=session_id,
+                            **arguments
+                        )
+                        if loop_guard:
+                            loop_guard.after_tool_call(tool_name, arguments, tool_response)
                     
                     # 8. 处理工具响应
                     if hasattr(tool_response, '__iter__') and not isinstance(tool_response, (str, bytes)):
@@ -755,19 +781,24 @@ class ExecutorAgent(AgentBase):
             'show_content': f"工具调用失败\n\n"
         }]
 
-    def process_tool_response(self, tool_response: str, tool_call_id: str) -> List[Dict[str, Any]]:
+    def process_tool_response(self, tool_response: Any, tool_call_id: str) -> List[Dict[str, Any]]:
         """
         处理工具执行响应
         
         Args:
-            tool_response: 工具执行响应
+            tool_response: 工具执行响应（ToolResult或JSON字符串）
             tool_call_id: 工具调用ID
             
         Returns:
             List[Dict[str, Any]]: 处理后的结果消息
         """
         try:
-            tool_response_dict = json.loads(tool_response)
+            if isinstance(tool_response, ToolResult):
+                # 结构化结果无需再解析，交给LLM的内容只序列化一次
+                tool_response_dict = tool_response.to_dict()
+                tool_response = tool_response.to_llm_content()
+            else:
+                tool_response_dict = json.loads(tool_response)
             
             if "content" in tool_response_dict:
                 result = [{
@@ -909,6 +940,100 @@ class ExecutorAgent(AgentBase):
             logger.warning(f"ExecutorAgent: 格式化工具参数时发生错误: {str(e)}")
             return "📝 **参数**: 解析失败"
 
+    def _extract_dependency_messages(self, 
+                                     messages: List[Dict[str, Any]],
+                                     task_id: Optional[str],
+                                     task_manager: Optional[Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        按当前子任务的依赖闭包构建执行上下文
+        
+        上下文包括：user消息、全部前置任务的执行总结、直接前置任务和当前子任务之前尝试的执行过程。
+        与当前子任务无关的其他子任务的工具输出不再进入执行提示。
+        
+        Args:
+            messages: 消息列表
+            task_id: 当前子任务ID（由规划给出）
+            task_manager: 任务管理器
+            
+        Returns:
+            Optional[List[Dict[str, Any]]]: 上下文消息列表；无法确定当前子任务或任务没有声明依赖关系时返回None
+        """
+        if not task_manager or not task_id or not task_manager.get_task(task_id):
+            return None
+        if not any(task_manager.get_task_dependencies_graph().values()):
+            # 分解时没有声明任何依赖关系，无法判断哪些历史与当前子任务相关
+            return None
+        
+        task = task_manager.get_task(task_id)
+        closure = task_manager.get_dependency_closure(task_id)
+        direct_parents = set(task.dependencies)
+        trace_task_ids = direct_parents | {task_id}
+        
+        context_messages = [msg for msg in messages if msg.get('role') == 'user']
+        
+        if closure:
+            context_messages.append({
+                'role': 'assistant',
+                'content': self.DEPENDENCY_CONTEXT_TEMPLATE.format(
+                    task_id=task_id,
+                    dependency_summaries=self._format_dependency_summaries(closure, task_manager)
+                ),
+                'type': 'do_subtask_result',
+                'message_id': str(uuid.uuid4()),
+                'show_content': ''
+            })
+        
+        # 按planning_result将执行过程划分到各子任务，只保留直接前置任务和当前子任务的原始输出
+        current_task_id = None
+        trace_count = 0
+        for msg in messages:
+            if msg.get('type') == 'planning_result':
+                current_task_id = self._get_planned_task_id(msg)
+                continue
+            if current_task_id in trace_task_ids and msg.get('type') in self.EXECUTION_TRACE_TYPES:
+                context_messages.append(msg)
+                trace_count += 1
+        
+        logger.info(f"ExecutorAgent: 按依赖构建子任务 {task_id} 的上下文：{len(closure)} 个前置任务总结，"
+                    f"{trace_count} 条执行过程消息（原 {len(messages)} 条消息）")
+        return context_messages
+
+    def _format_dependency_summaries(self, task_ids: List[str], task_manager: Any) -> str:
+        """
+        格式化前置任务的执行总结
+        
+        Args:
+            task_ids: 前置任务ID列表
+            task_manager: 任务管理器
+            
+        Returns:
+            str: 每个前置任务一段的总结文本
+        """
+        sections = []
+        for dependency_id in task_ids:
+            dependency = task_manager.get_task(dependency_id)
+            summary = dependency.execution_summary if isinstance(dependency.execution_summary, dict) else {}
+            section = f"- 任务ID: {dependency_id}, 描述: {dependency.description}, 状态: {dependency.status.value}"
+            if summary.get('result_summary'):
+                section += f"\n  执行总结: {summary['result_summary']}"
+            elif dependency.result:
+                section += f"\n  执行结果: {dependency.result}"
+            if summary.get('result_documents'):
+                section += f"\n  生成文档: {', '.join(str(doc) for doc in summary['result_documents'])}"
+            sections.append(section)
+        return "\n".join(sections)
+
+    @staticmethod
+    def _get_planned_task_id(planning_message: Dict[str, Any]) -> Optional[str]:
+        """从planning_result消息中读取规划对应的子任务ID"""
+        content = planning_message.get('content') or ''
+        if content.startswith('Planning: '):
+            content = content[len('Planning: '):]
+        try:
+            return json.loads(content).get('next_step', {}).get('task_id')
+        except (json.JSONDecodeError, AttributeError):
+            return None
+
     def _extract_recent_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         提取最近一次stage_summary之后的所有消息，并保留user消息
@@ -0,0 +1,221 @@
+"""
+循环重复检测
+
+在规划-执行-观察循环中按会话记录规划与工具调用的指纹：
+1. 检测重复的规划步骤和相同参数的工具调用
+2. 对无副作用的工具，重复调用直接返回会话内记忆的结果
+3. 重复次数达到阈值后触发升级（提前总结或终止），避免耗尽最大循环次数
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import hashlib
+import inspect
+import json
+import re
+import threading
+from typing import Dict, Any, List, Optional
+
+from sagents.utils.logger import logger
+
+
+class LoopGuard:
+    """单个会话的循环重复检测器"""
+
+    def __init__(self,
+                 session_id: str,
+                 repeat_threshold: int = 3,
+                 memo_tools: Optional[List[str]] = None):
+        """
+        初始化循环重复检测器
+
+        Args:
+            session_id: 会话ID
+            repeat_threshold: 同一规划或工具调用重复多少次后触发升级，<=0 表示不升级
+            memo_tools: 可以复用结果的无副作用工具名称列表
+        """
+        self.session_id = session_id
+        self.repeat_threshold = repeat_threshold
+        self.memo_tools = set(memo_tools or [])
+        self._plan_counts: Dict[str, int] = {}
+        self._tool_counts: Dict[str, int] = {}
+        self._memo: Dict[str, Any] = {}
+        # 最近一次记录的规划消息ID，同一条规划不重复计数
+        self._last_plan_id: Optional[str] = None
+        self._lock = threading.Lock()
+        self.escalation_reason: Optional[str] = None
+        self.stats = {
+            'plans': 0,
+            'repeated_plans': 0,
+            'tool_calls': 0,
+            'repeated_tool_calls': 0,
+            'memo_hits': 0,
+            'max_plan_repeat': 0,
+            'max_tool_repeat': 0
+        }
+
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        """
+        计算负载的稳定指纹
+
+        Args:
+            payload: 可JSON序列化的内容
+
+        Returns:
+            str: sha1 十六进制摘要
+        """
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """去掉空白与标点，使措辞上的细微差异不影响规划指纹"""
+        return re.sub(r'[\s\W_]+', '', str(text)).lower()
+
+    def record_plan(self, plan: Dict[str, Any], plan_id: Optional[str] = None) -> int:
+        """
+        记录一次规划结果
+
+        Args:
+            plan: PlanningAgent输出的规划JSON（包含next_step）
+            plan_id: 规划消息的ID，与上一次记录的相同时不重复计数
+
+        Returns:
+            int: 该规划在本会话中出现的次数
+        """
+        next_step = plan.get('next_step', plan)
+        key = self.fingerprint(self._normalize_text(next_step.get('description', '')))
+        with self._lock:
+            if plan_id is not None and plan_id == self._last_plan_id:
+                return self._plan_counts.get(key, 0)
+            self._last_plan_id = plan_id
+            count = self._plan_counts.get(key, 0) + 1
+            self._plan_counts[key] = count
+            self.stats['plans'] += 1
+            if count > 1:
+                self.stats['repeated_plans'] += 1
+                logger.warning(f"LoopGuard: 会话 {self.session_id} 第 {count} 次规划相同的步骤")
+            self.stats['max_plan_repeat'] = max(self.stats['max_plan_repeat'], count)
+            self._check_escalation('plan', count)
+        return count
+
+    def before_tool_call(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        """
+        记录一次工具调用，命中记忆时返回之前的结果
+
+        调用有副作用的工具（不在memo_tools中）会清空已记忆的结果和其他调用的重复计数，
+        因为它可能改变了后续读取类工具的返回值（如 读取→写入→再次读取 不算重复）。
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+
+        Returns:
+            Optional[Any]: 记忆的工具结果，未命中返回None
+        """
+        key = self.fingerprint({'tool': tool_name, 'arguments': arguments})
+        with self._lock:
+            count = self._tool_counts.get(key, 0) + 1
+            self._tool_counts[key] = count
+            self.stats['tool_calls'] += 1
+            if count > 1:
+                self.stats['repeated_tool_calls'] += 1
+                logger.warning(f"LoopGuard: 会话 {self.session_id} 第 {count} 次以相同参数调用工具 {tool_name}")
+            self.stats['max_tool_repeat'] = max(self.stats['max_tool_repeat'], count)
+            self._check_escalation(f'tool:{tool_name}', count)
+
+            if tool_name not in self.memo_tools:
+                self._memo.clear()
+                self._tool_counts = {key: count}
+                return None
+            if key in self._memo:
+                self.stats['memo_hits'] += 1
+                logger.info(f"LoopGuard: 工具 {tool_name} 重复调用，复用会话内记忆的结果")
+                return self._memo[key]
+        return None
+
+    def after_tool_call(self, tool_name: str, arguments: Dict[str, Any], result: Any):
+        """
+        记忆无副作用工具的结果
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            result: 工具返回结果（流式结果不记忆）
+        """
+        if tool_name not in self.memo_tools or inspect.isgenerator(result):
+            return
+        with self._lock:
+            self._memo[self.fingerprint({'tool': tool_name, 'arguments': arguments})] = result
+
+    def _check_escalation(self, source: str, count: int):
+        if self.escalation_reason or self.repeat_threshold <= 0 or count < self.repeat_threshold:
+            return
+        self.escalation_reason = f"{source} 重复 {count} 次"
+        logger.warning(f"LoopGuard: 会话 {self.session_id} 触发循环升级: {self.escalation_reason}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取重复检测统计
+
+        Returns:
+            Dict[str, Any]: 规划/工具调用次数、重复次数、记忆命中次数及升级原因
+        """
+        with self._lock:
+            return {**self.stats, 'escalation_reason': self.escalation_reason}
+
+
+# 会话级检测器注册表
+_loop_guards: Dict[str, LoopGuard] = {}
+_loop_guards_lock = threading.Lock()
+
+
+def create_loop_guard(session_id: str) -> LoopGuard:
+    """
+    为会话创建循环重复检测器（按当前配置），已存在时直接返回
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        LoopGuard: 会话的检测器
+    """
+    from sagents.config.settings import get_settings
+    agent_config = get_settings().agent
+    with _loop_guards_lock:
+        if session_id not in _loop_guards:
+            _loop_guards[session_id] = LoopGuard(
+                session_id,
+                repeat_threshold=agent_config.loop_repeat_threshold,
+                memo_tools=agent_config.loop_memo_tools
+            )
+        return _loop_guards[session_id]
+
+
+def get_loop_guard(session_id: Optional[str]) -> Optional[LoopGuard]:
+    """
+    获取会话的循环重复检测器
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        Optional[LoopGuard]: 检测器，会话未启用时返回None
+    """
+    if not session_id:
+        return None
+    with _loop_guards_lock:
+        return _loop_guards.get(session_id)
+
+
+def clear_loop_guard(session_id: str):
+    """
+    清理会话的循环重复检测器
+
+    Args:
+        session_id: 会话ID
+    """
+    with _loop_guards_lock:
+        _loop_guards.pop(session_id, None)
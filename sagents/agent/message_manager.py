@@ -289,7 +289,7 @@ class MessageManager:
             return self._filter_for_planning_agent()
         elif agent_name == "ExecutorAgent":
             return self._filter_for_executor_agent()
-        elif agent_name == "ObservationAgent":
+        elif agent_name in ("ObservationAgent", "ObservePlanAgent"):
             return self._filter_for_observation_agent()
         elif agent_name == "TaskSummaryAgent":
             return self._filter_for_task_summary_agent()
@@ -0,0 +1,109 @@
+"""
+模型路由器
+
+根据智能体类名或步骤名称（step_name），将LLM调用路由到不同的模型客户端、
+模型名称和生成参数。轻量阶段（工作流选择、工具推荐、阶段总结、观察等）
+只输出简短的结构化内容，可以路由到更快的小模型。
+
+路由表格式::
+
+    {
+        "ObservationAgent": {"model": "qwen-turbo", "max_tokens": 1024},
+        "workflow_selection": {"model": "qwen-turbo", "base_url": "...", "api_key": "..."}
+    }
+
+匹配优先级：step_name > 智能体类名 > 默认配置。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from sagents.utils.logger import logger
+
+
+class ModelRouter:
+    """模型路由器 - 按智能体/步骤选择模型客户端与配置"""
+
+    # 路由项中用于构造客户端的字段，其余字段作为模型调用参数合并到配置中
+    CLIENT_KEYS = ('client', 'base_url', 'api_key')
+
+    def __init__(self, default_model: Any, default_config: Dict[str, Any], routes: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        初始化模型路由器
+
+        Args:
+            default_model: 默认的模型客户端
+            default_config: 默认的模型配置
+            routes: 路由表，键为智能体类名或step_name
+        """
+        self.default_model = default_model
+        self.default_config = default_config
+        self.routes: Dict[str, Dict[str, Any]] = dict(routes or {})
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+        if self.routes:
+            logger.info(f"ModelRouter: 已加载 {len(self.routes)} 条模型路由: {list(self.routes.keys())}")
+
+    def add_route(self, key: str, route: Dict[str, Any]):
+        """
+        添加或覆盖一条路由
+
+        Args:
+            key: 智能体类名或step_name
+            route: 路由配置（model、max_tokens、temperature、base_url、api_key、client等）
+        """
+        self.routes[key] = route
+        logger.info(f"ModelRouter: 添加路由 {key} -> {route.get('model', self.default_config.get('model'))}")
+
+    def resolve(self, agent_name: str, step_name: Optional[str] = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        解析指定智能体/步骤应使用的模型客户端和配置
+
+        Args:
+            agent_name: 智能体类名
+            step_name: 步骤名称
+
+        Returns:
+            Tuple[Any, Dict[str, Any]]: (模型客户端, 合并后的模型配置)
+        """
+        route = None
+        if step_name and step_name in self.routes:
+            route = self.routes[step_name]
+        elif agent_name in self.routes:
+            route = self.routes[agent_name]
+
+        if not route:
+            return self.default_model, {**self.default_config}
+
+        config = {**self.default_config}
+        config.update({k: v for k, v in route.items() if k not in self.CLIENT_KEYS})
+        return self._get_client(route), config
+
+    def _get_client(self, route: Dict[str, Any]) -> Any:
+        """
+        获取路由对应的模型客户端，相同 base_url + api_key 的客户端只创建一次
+
+        Args:
+            route: 路由配置
+
+        Returns:
+            Any: 模型客户端
+        """
+        if route.get('client') is not None:
+            return route['client']
+        base_url = route.get('base_url')
+        if not base_url:
+            return self.default_model
+
+        api_key = route.get('api_key') or getattr(self.default_model, 'api_key', None) or ''
+        cache_key = (base_url, api_key)
+        with self._lock:
+            if cache_key not in self._clients:
+                from openai import OpenAI
+                self._clients[cache_key] = OpenAI(base_url=base_url, api_key=api_key)
+                logger.info(f"ModelRouter: 创建模型客户端 {base_url}")
+            return self._clients[cache_key]
@@ -86,6 +86,19 @@ class ObservationAgent(AgentBase):
 </failed_task_ids>
 ```"""
 
+    # 输出结构声明（标签顺序与token预算），</failed_task_ids>闭合即结束
+    OUTPUT_SCHEMA = {
+        'format': 'xml',
+        'tags': {
+            'finish_percent': 10,
+            'completion_status': 10,
+            'analysis': 800,
+            'completed_task_ids': 100,
+            'pending_task_ids': 100,
+            'failed_task_ids': 100
+        }
+    }
+
     # 系统提示模板常量
     SYSTEM_PREFIX_DEFAULT = """你是一个智能AI助手，你的任务是分析任务的执行情况，并提供后续建议。"""
     
@@ -274,7 +287,7 @@ class ObservationAgent(AgentBase):
         
         # 收集所有chunks以便跟踪token使用
         chunks = []
-        for chunk in self._call_llm_streaming(messages, session_id=observation_context.get('session_id'), step_name="observation"):
+        for chunk in self._call_llm_structured_streaming(messages, session_id=observation_context.get('session_id'), step_name="observation"):
             chunks.append(chunk)
             if len(chunk.choices) == 0:
                 continue
@@ -516,7 +529,11 @@ class ObservationAgent(AgentBase):
             return "无任务管理器"
         
         try:
-            # 优先使用TaskManager的内置状态描述方法
+            # 优先使用TaskManager的版本化状态渲染（紧凑快照+变化），其次使用内置状态描述方法
+            if hasattr(task_manager, 'render_status'):
+                result = task_manager.render_status(self.__class__.__name__)
+                logger.debug(f"ObservationAgent: 使用TaskManager版本化渲染生成状态描述")
+                return result
             if hasattr(task_manager, 'get_status_description'):
                 result = task_manager.get_status_description()
                 logger.debug(f"ObservationAgent: 使用TaskManager内置方法生成状态描述")
@@ -0,0 +1,339 @@
+"""
+ObservePlanAgent 观察规划融合智能体
+
+在一次LLM调用中同时完成观察（评估完成状态、更新任务状态）与下一步规划，
+任务仍在进行中时直接给出下一步计划，控制器据此跳过下一轮的规划阶段，
+每轮循环少一次LLM调用。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import json
+import uuid
+import time
+import traceback
+from typing import List, Dict, Any, Optional, Generator
+
+from ..observation_agent.observation_agent import ObservationAgent
+from ..planning_agent.planning_agent import PlanningAgent
+from sagents.utils.logger import logger
+
+
+class ObservePlanAgent(ObservationAgent):
+    """
+    观察规划融合智能体
+
+    输出与ObservationAgent相同的observation_result消息（并更新TaskManager），
+    任务未结束时额外输出与PlanningAgent格式一致的planning_result消息。
+    """
+
+    # 融合提示模板：观察部分与ObservationAgent一致，追加下一步规划
+    ANALYSIS_PROMPT_TEMPLATE = """# 任务执行分析与规划指南
+
+## 当前用户任务
+{task_description}
+
+## 任务管理器状态（未更新的状态，需要本次分析去更新）
+{task_manager_status}
+
+## 近期完成动作详情
+{execution_results}
+
+## 可用工具
+{available_tools_str}
+
+## 分析要求
+1. 评估当前执行是否满足任务要求
+2. 确定任务完成状态：
+   - in_progress: 任务正在进行中，需要继续执行
+   - completed: 任务已完成，无需进一步操作
+   - need_user_input: 需要用户输入才能继续
+   - failed: 任务执行失败，无法继续
+3. 评估任务整体完成百分比，范围0-100
+4. 根据近期完成动作详情，判断哪些任务已经完成，不要仅仅依赖任务管理器状态
+
+## 子任务完成判断规则
+1. **基于执行结果判断**：仔细分析近期完成动作详情，如果某个子任务的核心要求已经通过执行动作完成，即使任务管理器状态显示为pending，也应该标记为已完成
+2. **子任务内容匹配**：将执行结果与子任务描述进行匹配，如果执行结果已经覆盖了子任务的核心要求，则认为子任务完成
+3. **数据完整性**：如果子任务要求收集特定信息，且执行结果显示已经收集到这些信息，则认为子任务完成
+4. **不要过度保守**：如果执行结果显示已经完成了子任务的核心目标，不要因为任务管理器状态而犹豫标记为完成
+
+## 规划规则（仅当completion_status为in_progress时输出规划部分）
+1. 根据分析结果，为了逐步完成未完成的子任务或者完整的任务，清晰描述接下来要执行的具体的任务名称
+2. 确保接下来的任务可执行且可衡量，优先使用现有工具，设定明确的成功标准
+3. description中不要包含工具的真实名称
+4. required_tools至少包含5个可能需要的工具的名称，最多10个
+5. related_task_id为下一步对应的任务管理器中的子任务ID，只填写一个；不对应具体子任务时填写“无”
+
+## 特殊规则
+1. 上一步完成了数据搜索，后续还需要对搜索结果进行进一步的理解和处理，不能认为是任务完成
+2. analysis中不要带有工具的真实名称，以及任务的序号
+3. 只输出以下格式的XML，不要输出其他内容，不要输出```，<tag>标志位必须在单独一行
+4. 任务状态更新基于实际执行结果，不要随意标记为完成
+5. 尽可能减少用户输入，不要打扰用户，按照你对事情的完整理解，尽可能全面的完成事情
+6. 针对确定了无法完成的子任务，不要再次尝试
+
+## 输出格式
+```
+<finish_percent>
+任务完成百分比，范围0-100，100表示任务彻底完成
+</finish_percent>
+<completion_status>
+任务完成状态：in_progress（进行中）、completed（已完成）、need_user_input（需要用户输入）、failed（失败）
+</completion_status>
+<analysis>
+分析近期完成动作详情的执行情况进行总结，指导接下来的方向要详细一些，一段话不要有换行
+</analysis>
+<completed_task_ids>
+已完成的子任务ID列表，格式：["1", "2"]
+</completed_task_ids>
+<pending_task_ids>
+未完成的子任务ID列表，格式：["3", "4"]
+</pending_task_ids>
+<failed_task_ids>
+经过3次尝试执行后，判定无法完成的子任务ID列表，格式：["5"]
+</failed_task_ids>
+<related_task_id>
+（仅in_progress时输出）下一步对应的子任务ID
+</related_task_id>
+<next_step_description>
+（仅in_progress时输出）下一步子任务的清晰描述，一段话不要有换行
+</next_step_description>
+<required_tools>
+["tool1_name","tool2_name"]
+</required_tools>
+<expected_output>
+预期结果描述，一段话不要有换行
+</expected_output>
+<success_criteria>
+如何验证完成，一段话不要有换行
+</success_criteria>
+```"""
+
+    OBSERVATION_TAGS = ['finish_percent', 'completion_status', 'analysis',
+                        'completed_task_ids', 'pending_task_ids', 'failed_task_ids']
+    PLANNING_TAGS = ['next_step_description', 'required_tools', 'expected_output', 'success_criteria']
+
+    # 输出结构声明：任务未结束时</success_criteria>闭合即结束，否则在观察部分后自然结束
+    OUTPUT_SCHEMA = {
+        'format': 'xml',
+        'tags': {
+            **ObservationAgent.OUTPUT_SCHEMA['tags'],
+            'related_task_id': 20,
+            'next_step_description': 400,
+            'required_tools': 150,
+            'expected_output': 300,
+            'success_criteria': 300
+        }
+    }
+
+    SYSTEM_PREFIX_DEFAULT = """你是一个智能AI助手，你的任务是分析任务的执行情况，并给出下一步要执行的计划。"""
+
+    def __init__(self, model: Any, model_config: Dict[str, Any], system_prefix: str = ""):
+        """
+        初始化观察规划融合智能体
+
+        Args:
+            model: 语言模型实例
+            model_config: 模型配置参数
+            system_prefix: 系统前缀提示
+        """
+        super().__init__(model, model_config, system_prefix)
+        self.agent_description = "观察规划融合智能体，在一次调用中完成执行观察与下一步规划"
+        logger.info("ObservePlanAgent 初始化完成")
+
+    def run_stream(self,
+                   message_manager: Any,
+                   task_manager: Optional[Any] = None,
+                   tool_manager: Optional[Any] = None,
+                   session_id: Optional[str] = None,
+                   system_context: Optional[Dict[str, Any]] = None) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        流式执行观察与规划
+
+        Args:
+            message_manager: 消息管理器（必需）
+            task_manager: 任务管理器
+            tool_manager: 工具管理器，用于列出规划可用的工具
+            session_id: 会话ID
+            system_context: 系统上下文
+
+        Yields:
+            List[Dict[str, Any]]: observation_result 与 planning_result 消息块
+        """
+        if not message_manager:
+            raise ValueError("ObservePlanAgent: message_manager 是必需参数")
+
+        optimized_messages = message_manager.filter_messages_for_agent(self.__class__.__name__)
+        logger.info(f"ObservePlanAgent: 开始流式观察规划，获取到 {len(optimized_messages)} 条优化消息")
+
+        for chunk_batch in self._collect_and_log_stream_output(
+            self._execute_observation_stream_internal(optimized_messages, tool_manager, session_id, system_context, task_manager)
+        ):
+            message_manager.add_messages(chunk_batch, agent_name="ObservePlanAgent")
+            yield chunk_batch
+
+    def _execute_observation_stream_internal(self,
+                                           messages: List[Dict[str, Any]],
+                                           tool_manager: Optional[Any],
+                                           session_id: str,
+                                           system_context: Optional[Dict[str, Any]],
+                                           task_manager: Optional[Any] = None) -> Generator[List[Dict[str, Any]], None, None]:
+        try:
+            context = self._prepare_observation_context(
+                messages=messages,
+                session_id=session_id,
+                system_context=system_context,
+                task_manager=task_manager
+            )
+            available_tools = tool_manager.list_tools_simplified() if tool_manager else []
+            context['available_tools_str'] = json.dumps([tool['name'] for tool in available_tools], ensure_ascii=False, indent=2) if available_tools else '无可用工具'
+
+            yield from self._execute_streaming_observation(context)
+
+        except Exception as e:
+            logger.error(f"ObservePlanAgent: 观察规划过程中发生异常: {str(e)}")
+            logger.error(f"异常详情: {traceback.format_exc()}")
+            yield from self._handle_observation_error(e)
+
+    def _generate_observation_prompt(self, context: Dict[str, Any]) -> str:
+        return self.ANALYSIS_PROMPT_TEMPLATE.format(
+            task_description=context['task_description'],
+            task_manager_status=context['task_manager_status'],
+            execution_results=context['execution_results'],
+            available_tools_str=context['available_tools_str']
+        )
+
+    def _execute_streaming_observation(self,
+                                     observation_context: Dict[str, Any]) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        执行流式观察规划，analysis展示为观察结果，规划描述展示为规划结果
+
+        Args:
+            observation_context: 观察上下文
+
+        Yields:
+            List[Dict[str, Any]]: 流式输出的消息块
+        """
+        system_message = self.prepare_unified_system_message(
+            session_id=observation_context.get('session_id'),
+            system_context=observation_context.get('system_context')
+        )
+        prompt = self._generate_observation_prompt(observation_context)
+        messages = [system_message, {"role": "user", "content": prompt}]
+
+        observation_message_id = str(uuid.uuid4())
+        planning_message_id = str(uuid.uuid4())
+        start_time = time.time()
+        all_content = ""
+        unknown_content = ""
+        last_tag_type = None
+        all_tags = self.OBSERVATION_TAGS + ['related_task_id'] + self.PLANNING_TAGS
+
+        chunks = []
+        for chunk in self._call_llm_structured_streaming(messages, session_id=observation_context.get('session_id'), step_name="observe_plan"):
+            chunks.append(chunk)
+            if len(chunk.choices) == 0:
+                continue
+            if chunk.choices[0].delta.content:
+                for delta_content_char in chunk.choices[0].delta.content:
+                    delta_content_all = unknown_content + delta_content_char
+                    tag_type = self._judge_delta_content_type(delta_content_all, all_content, tag_type=all_tags)
+                    all_content += delta_content_char
+
+                    if tag_type == 'unknown':
+                        unknown_content = delta_content_all
+                        continue
+                    unknown_content = ''
+                    if tag_type in ['analysis', 'next_step_description', 'expected_output']:
+                        if tag_type == 'analysis':
+                            message_id, message_type = observation_message_id, 'observation_result'
+                        else:
+                            message_id, message_type = planning_message_id, 'planning_result'
+                        if tag_type != last_tag_type:
+                            yield self._create_message_chunk(
+                                content='',
+                                message_id=message_id,
+                                show_content='\n\n',
+                                message_type=message_type
+                            )
+                        yield self._create_message_chunk(
+                            content='',
+                            message_id=message_id,
+                            show_content=delta_content_all,
+                            message_type=message_type
+                        )
+                    last_tag_type = tag_type
+
+        self._track_streaming_token_usage(chunks, "observe_plan", start_time)
+        logger.info(f"ObservePlanAgent: 流式观察规划完成，输出长度: {len(all_content)}")
+
+        yield from self._finalize_observation_result(
+            all_content=all_content,
+            message_id=observation_message_id,
+            task_manager=observation_context.get('task_manager')
+        )
+        yield from self._finalize_plan_result(all_content, planning_message_id)
+
+    def _finalize_plan_result(self, all_content: str, message_id: str) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        任务仍在进行中且规划部分完整时，输出planning_result消息
+
+        Args:
+            all_content: 完整的输出内容
+            message_id: 规划消息ID
+
+        Yields:
+            List[Dict[str, Any]]: 规划结果消息块
+        """
+        try:
+            observation = self.convert_xlm_to_json(all_content)
+        except Exception:
+            return
+        if observation.get('completion_status') != 'in_progress':
+            return
+
+        plan = self.convert_plan_to_json(all_content)
+        if plan is None:
+            logger.warning("ObservePlanAgent: 任务进行中但未输出完整规划，将由PlanningAgent重新规划")
+            return
+
+        yield [{
+            'role': 'assistant',
+            'content': 'Planning: ' + json.dumps(plan, ensure_ascii=False),
+            'type': 'planning_result',
+            'message_id': message_id,
+            'show_content': ''
+        }]
+
+    def convert_plan_to_json(self, xlm_content: str) -> Optional[Dict[str, Any]]:
+        """
+        解析规划部分，格式与PlanningAgent.convert_xlm_to_json一致
+
+        Args:
+            xlm_content: XML格式的内容字符串
+
+        Returns:
+            Optional[Dict[str, Any]]: 规划JSON，规划部分不完整时返回None
+        """
+        values = {}
+        for tag in self.PLANNING_TAGS:
+            if f'<{tag}>' not in xlm_content or f'</{tag}>' not in xlm_content:
+                return None
+            values[tag] = xlm_content.split(f'<{tag}>')[1].split(f'</{tag}>')[0].strip()
+        if not values['next_step_description']:
+            return None
+
+        plan = {
+            "next_step": {
+                "description": values['next_step_description'],
+                "required_tools": values['required_tools'],
+                "expected_output": values['expected_output'],
+                "success_criteria": values['success_criteria']
+            }
+        }
+        task_id = PlanningAgent.parse_related_task_id(xlm_content)
+        if task_id:
+            plan["next_step"]["task_id"] = task_id
+        return plan
@@ -9,6 +9,7 @@ PlanningAgent 重构版本
 """
 
 import json
+import re
 import uuid
 import datetime
 import traceback
@@ -51,9 +52,13 @@ class PlanningAgent(AgentBase):
 5. 只输出以下格式的XLM，不要输出其他内容,不要输出```, <tag>标志位必须在单独一行
 6. description中不要包含工具的真实名称
 7. required_tools至少包含5个可能需要的工具的名称，最多10个。
+8. related_task_id为下一步对应的任务管理器中的子任务ID，只填写一个；不对应具体子任务时填写“无”。
 
 ## 输出格式
 ```
+<related_task_id>
+子任务ID
+</related_task_id>
 <next_step_description>
 子任务的清晰描述，一段话不要有换行
 </next_step_description>
@@ -69,6 +74,18 @@ class PlanningAgent(AgentBase):
 ```
 """
 
+    # 输出结构声明（标签顺序与token预算），</success_criteria>闭合即结束
+    OUTPUT_SCHEMA = {
+        'format': 'xml',
+        'tags': {
+            'related_task_id': 20,
+            'next_step_description': 400,
+            'required_tools': 150,
+            'expected_output': 300,
+            'success_criteria': 300
+        }
+    }
+
     # 系统提示模板常量
     SYSTEM_PREFIX_DEFAULT = """你是一个任务执行计划指定者，你需要根据当前任务和已完成的动作，生成下一个要执行的动作。"""
 
@@ -193,7 +210,7 @@ class PlanningAgent(AgentBase):
         available_tools_str = json.dumps([tool['name'] for tool in available_tools], ensure_ascii=False, indent=2) if available_tools else '无可用工具'
         
         # 获取任务管理器状态
-        task_manager_status = task_manager.get_status_description() if task_manager else '无任务管理器'
+        task_manager_status = task_manager.render_status(self.__class__.__name__) if task_manager else '无任务管理器'
         logger.debug(f"PlanningAgent: 任务管理器状态: {task_manager_status}")
         
         # 获取上下文信息
@@ -273,7 +290,7 @@ class PlanningAgent(AgentBase):
         
         # 收集所有chunks以便跟踪token使用
         chunks = []
-        for chunk in self._call_llm_streaming(messages, session_id=planning_context.get('session_id'), step_name="planning"):
+        for chunk in self._call_llm_structured_streaming(messages, session_id=planning_context.get('session_id'), step_name="planning"):
             chunks.append(chunk)
             if len(chunk.choices) == 0:
                 continue
@@ -283,7 +300,7 @@ class PlanningAgent(AgentBase):
                 for delta_content_char in delta_content:
                     delta_content_all = unknown_content + delta_content_char
                     # 判断delta_content的类型
-                    tag_type = self._judge_delta_content_type(delta_content_all, all_content, ['next_step_description','required_tools','expected_output','success_criteria'])
+                    tag_type = self._judge_delta_content_type(delta_content_all, all_content, ['related_task_id','next_step_description','required_tools','expected_output','success_criteria'])
                     all_content += delta_content_char
                     chunk_count += 1
                     
@@ -413,6 +430,9 @@ class PlanningAgent(AgentBase):
                     "success_criteria": success_criteria
                 }
             }
+            task_id = self.parse_related_task_id(xlm_content)
+            if task_id:
+                result["next_step"]["task_id"] = task_id
             
             logger.debug(f"PlanningAgent: XML转JSON完成: {result}")
             return result
@@ -421,6 +441,23 @@ class PlanningAgent(AgentBase):
             logger.error(f"PlanningAgent: XML转JSON失败: {str(e)}")
             raise
 
+    @staticmethod
+    def parse_related_task_id(xlm_content: str) -> Optional[str]:
+        """
+        解析规划对应的子任务ID（可选标签）
+        
+        Args:
+            xlm_content: XML格式的内容字符串
+            
+        Returns:
+            Optional[str]: 子任务ID，未输出或不对应具体子任务时返回None
+        """
+        if '<related_task_id>' not in xlm_content or '</related_task_id>' not in xlm_content:
+            return None
+        value = xlm_content.split('<related_task_id>')[1].split('</related_task_id>')[0]
+        match = re.search(r'\d+', value)
+        return match.group(0) if match else None
+
     def _extract_task_description(self, messages: List[Dict[str, Any]]) -> str:
         """
         从消息中提取原始任务描述
@@ -17,6 +17,7 @@ from typing import List, Dict, Any, Optional, Generator
 
 from sagents.agent.agent_base import AgentBase
 from sagents.utils.logger import logger
+from sagents.utils.llm_scheduler import LLMPriority
 
 class StageSummaryAgent(AgentBase):
     """
@@ -26,6 +27,9 @@ class StageSummaryAgent(AgentBase):
     支持流式输出，实时返回总结结果。
     """
 
+    # 阶段总结属于后台任务，调度时让位于交互请求
+    llm_priority = LLMPriority.BACKGROUND
+
     # 总结提示模板常量
     SUMMARY_PROMPT_TEMPLATE = """# 任务执行总结生成指南
 
@@ -84,6 +88,12 @@ class StageSummaryAgent(AgentBase):
 8. result_summary的重点是对子任务的详细回答和关键成果，为后续整体任务总结提供丰富的基础信息
 """
 
+    # 输出结构声明：顶层JSON对象闭合即结束；总结内容要求详尽，不限制token预算
+    OUTPUT_SCHEMA = {
+        'format': 'json',
+        'tags': {'task_summaries': None}
+    }
+
     # 系统提示模板常量
     SYSTEM_PREFIX_DEFAULT = """你是一个智能AI助手，专门负责生成任务执行的阶段性总结。你需要客观分析执行情况，总结成果，并为用户提供清晰的进度汇报。"""
     
@@ -106,7 +116,9 @@ class StageSummaryAgent(AgentBase):
                    tool_manager: Optional[Any] = None,
                    session_id: Optional[str] = None,
                    system_context: Optional[Dict[str, Any]] = None,
-                   stage_info: Optional[Dict[str, Any]] = None) -> Generator[List[Dict[str, Any]], None, None]:
+                   stage_info: Optional[Dict[str, Any]] = None,
+                   summary_context: Optional[Dict[str, Any]] = None,
+                   apply_updates: bool = True) -> Generator[List[Dict[str, Any]], None, None]:
         """
         执行阶段总结，返回stage summary类型的消息块
         
@@ -119,10 +131,17 @@ class StageSummaryAgent(AgentBase):
             session_id: 可选的会话标识符
             system_context: 系统上下文
             stage_info: 阶段信息，包含当前阶段的特定信息
+            summary_context: 预先准备好的总结上下文（见 prepare_summary_context），为None时在此准备
+            apply_updates: 是否将总结写入任务；为False时只输出stage summary消息，
+                由调用方通过 apply_summary_result 在自己的线程中写入
             
         Yields:
             List[Dict[str, Any]]: stage summary类型的消息块
         """
+        if summary_context is not None:
+            yield from self._execute_streaming_summary(summary_context, apply_updates)
+            return
+        
         if not message_manager:
             raise ValueError("StageSummaryAgent: message_manager 是必需参数")
         
@@ -131,7 +150,49 @@ class StageSummaryAgent(AgentBase):
         logger.info(f"StageSummaryAgent: 开始阶段总结，获取到 {len(optimized_messages)} 条优化消息")
         
         # 执行阶段总结，并返回消息块
-        yield from self._execute_summary_stream_internal(optimized_messages, tool_manager, session_id, system_context, task_manager, stage_info)
+        yield from self._execute_summary_stream_internal(optimized_messages, tool_manager, session_id, system_context, task_manager, stage_info, apply_updates)
+
+    def prepare_summary_context(self,
+                                message_manager: Any,
+                                task_manager: Optional[Any],
+                                session_id: Optional[str] = None,
+                                system_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        准备阶段总结上下文（读取消息和任务状态的快照）
+        
+        后台运行阶段总结时在主线程调用，后台线程只负责调用LLM，不再读取正在变化的消息和任务。
+        
+        Args:
+            message_manager: 消息管理器
+            task_manager: 任务管理器
+            session_id: 会话ID
+            system_context: 系统上下文
+            
+        Returns:
+            Dict[str, Any]: 总结上下文
+        """
+        optimized_messages = message_manager.filter_messages_for_agent(self.__class__.__name__)
+        summary_context = self._prepare_summary_context(
+            messages=optimized_messages,
+            task_manager=task_manager,
+            session_id=session_id,
+            system_context=system_context
+        )
+        summary_context['task_manager'] = task_manager
+        return summary_context
+
+    def apply_summary_result(self, summary_result: Dict[str, Any], summary_context: Dict[str, Any]) -> None:
+        """
+        将总结结果写入上下文中记录的待总结任务
+        
+        Args:
+            summary_result: stage summary消息中的总结结果
+            summary_context: 生成该总结时使用的上下文
+        """
+        task_manager = summary_context.get('task_manager')
+        tasks_to_summarize = summary_context.get('tasks_to_summarize', [])
+        if task_manager and tasks_to_summarize:
+            self._update_all_tasks_execution_summary(summary_result, tasks_to_summarize, task_manager)
 
     def _execute_summary_stream_internal(self, 
                                        messages: List[Dict[str, Any]],
@@ -139,7 +200,8 @@ class StageSummaryAgent(AgentBase):
                                        session_id: str,
                                        system_context: Optional[Dict[str, Any]],
                                        task_manager: Optional[Any] = None,
-                                       stage_info: Optional[Dict[str, Any]] = None) -> Generator[List[Dict[str, Any]], None, None]:
+                                       stage_info: Optional[Dict[str, Any]] = None,
+                                       apply_updates: bool = True) -> Generator[List[Dict[str, Any]], None, None]:
         """
         内部阶段总结流式执行方法
         
@@ -150,6 +212,7 @@ class StageSummaryAgent(AgentBase):
             system_context: 系统上下文
             task_manager: 任务管理器
             stage_info: 阶段信息
+            apply_updates: 是否将总结写入任务
             
         Yields:
             List[Dict[str, Any]]: 流式输出的总结结果消息块
@@ -167,7 +230,7 @@ class StageSummaryAgent(AgentBase):
             summary_context['task_manager'] = task_manager
             
             # 执行流式总结
-            yield from self._execute_streaming_summary(summary_context)
+            yield from self._execute_streaming_summary(summary_context, apply_updates)
             
         except Exception as e:
             logger.error(f"StageSummaryAgent: 总结过程中发生异常: {str(e)}")
@@ -253,12 +316,14 @@ class StageSummaryAgent(AgentBase):
         )
 
     def _execute_streaming_summary(self, 
-                                 summary_context: Dict[str, Any]) -> Generator[List[Dict[str, Any]], None, None]:
+                                 summary_context: Dict[str, Any],
+                                 apply_updates: bool = True) -> Generator[List[Dict[str, Any]], None, None]:
         """
         执行流式总结，为所有需要总结的任务生成总结
         
         Args:
             summary_context: 总结上下文
+            apply_updates: 是否将总结写入任务
             
         Yields:
             List[Dict[str, Any]]: 流式输出的总结结果消息块
@@ -278,19 +343,27 @@ class StageSummaryAgent(AgentBase):
             summary_prompt = self._generate_summary_prompt(summary_context)
             
             # 调用LLM生成总结
-            response = self.model.chat.completions.create(
+            start_time = time.time()
+            chunks = []
+            summary_response = ''
+            for chunk in self._call_llm_structured_streaming(
                 messages=[{"role": "user", "content": summary_prompt}],
-                **self.model_config
-            )
-            
-            # 获取响应内容
-            summary_response = response.choices[0].message.content
+                session_id=summary_context.get('session_id'),
+                step_name="stage_summary"
+            ):
+                chunks.append(chunk)
+                if len(chunk.choices) == 0:
+                    continue
+                if chunk.choices[0].delta.content:
+                    summary_response += chunk.choices[0].delta.content
+            self._track_streaming_token_usage(chunks, "stage_summary", start_time)
             
             # 解析总结结果
             summary_result = self.convert_xml_to_json(summary_response)
             
             # 更新所有任务的执行总结
-            self._update_all_tasks_execution_summary(summary_result, tasks_to_summarize, task_manager)
+            if apply_updates:
+                self._update_all_tasks_execution_summary(summary_result, tasks_to_summarize, task_manager)
             
             logger.info(f"StageSummaryAgent: 所有任务总结生成完成")
             
@@ -43,6 +43,7 @@ class TaskDecomposeAgent(AgentBase):
 4. 输出格式必须严格遵守以下要求。
 5. 如果有任务Thinking的过程，子任务要与Thinking的处理逻辑一致。
 6. 子任务数量不要超过10个，较简单的子任务可以合并为一个子任务。
+7. 如果子任务需要用到前面子任务的结果，在描述末尾标注依赖的子任务序号（从1开始，只能依赖排在前面的子任务），格式：[依赖: 1, 2]；不依赖其他子任务时不要标注。
 
 ## 输出格式
 ```
@@ -55,6 +56,16 @@ class TaskDecomposeAgent(AgentBase):
 ```
 """
 
+    # 输出结构声明：最多10个<task_item>，每个子任务描述的token预算
+    OUTPUT_SCHEMA = {
+        'format': 'xml',
+        'tags': {'task_item': 200},
+        'repeat': 10
+    }
+
+    # 子任务描述末尾的依赖标注，如 [依赖: 1, 2]
+    DEPENDENCY_PATTERN = re.compile(r'[\[【]\s*依赖\s*[:：]\s*([\d,，、\s]*)[\]】]\s*$')
+
     # 系统提示模板常量
     SYSTEM_PREFIX_DEFAULT = """你是一个任务分解者，你需要根据用户需求，将复杂任务分解为清晰可执行的子任务。"""
     
@@ -255,7 +266,7 @@ class TaskDecomposeAgent(AgentBase):
         unknown_content = ''
         last_tag_type = 'tag'
         
-        for chunk in self._call_llm_streaming(messages, session_id=session_id, step_name="task_decompose"):
+        for chunk in self._call_llm_structured_streaming(messages, session_id=session_id, step_name="task_decompose"):
             chunks.append(chunk)
             if len(chunk.choices) == 0:
                 continue
@@ -363,9 +374,12 @@ class TaskDecomposeAgent(AgentBase):
                 task_ids = task_manager.add_tasks_batch(task_objects)
                 logger.info(f"TaskDecomposeAgent: 成功将 {len(task_ids)} 个子任务添加到TaskManager")
                 
-                # 将任务ID添加到原始任务数据中（用于后续引用）
+                # 将任务ID添加到原始任务数据中（用于后续引用），并将依赖的序号转换为任务ID
                 for task_data, task_id in zip(tasks, task_ids):
                     task_data['task_id'] = task_id
+                    if task_data.get('depends_on'):
+                        task_data['dependencies'] = [task_ids[x - 1] for x in task_data['depends_on']]
+                        task_manager.update_task(task_id, dependencies=task_data['dependencies'])
             
             # 返回最终结果（保持原有流式输出格式）
             result_content = '任务拆解规划：\n' + json.dumps({"tasks": tasks}, ensure_ascii=False)
@@ -428,9 +442,19 @@ class TaskDecomposeAgent(AgentBase):
             task_items = re.findall(r'<task_item>(.*?)</task_item>', content, re.DOTALL)
 
             for item in task_items:
+                description = item.strip()
+                depends_on = []
+                dependency_match = self.DEPENDENCY_PATTERN.search(description)
+                if dependency_match:
+                    depends_on = [int(x) for x in re.findall(r'\d+', dependency_match.group(1))]
+                    description = description[:dependency_match.start()].rstrip()
                 task = {
-                    "description": item.strip(),
+                    "description": description,
                 }
+                # 只保留对排在前面的子任务的依赖
+                depends_on = [x for x in depends_on if 1 <= x <= len(tasks)]
+                if depends_on:
+                    task["depends_on"] = depends_on
                 tasks.append(task)
 
             logger.debug(f"TaskDecomposeAgent: XML转JSON完成，共提取 {len(tasks)} 个任务")
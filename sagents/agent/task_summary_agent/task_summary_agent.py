@@ -9,14 +9,51 @@ TaskSummaryAgent 重构版本
 """
 
 import json
+import os
 import uuid
 import datetime
+import hashlib
+import threading
+import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Generator
 
 from ..agent_base import AgentBase
+from sagents.config.settings import get_settings
+from sagents.utils.cloud_upload_queue import flush_cloud_upload_queues, find_cloud_upload_status
 from sagents.utils.logger import logger
 
+# 文档摘要缓存：内容哈希 -> 摘要结果；文件状态 (path, mtime, size) -> 内容哈希
+_DOCUMENT_DIGEST_CACHE_SIZE = 128
+_document_digests: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_document_hashes: "OrderedDict[tuple, str]" = OrderedDict()
+_document_cache_lock = threading.Lock()
+
+
+def _cache_put(cache: OrderedDict, key: Any, value: Any):
+    with _document_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > _DOCUMENT_DIGEST_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _cache_get(cache: OrderedDict, key: Any) -> Any:
+    with _document_cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def clear_document_digest_cache():
+    """清空文档摘要缓存"""
+    with _document_cache_lock:
+        _document_digests.clear()
+        _document_hashes.clear()
+
 
 class TaskSummaryAgent(AgentBase):
     """
@@ -42,10 +79,25 @@ TaskManager状态及执行结果:
 你的回答应该:
 1. 直接回答原始任务。
 2. 使用清晰详细的语言，但要保证回答的完整性和准确性，保留任务执行过程中的关键结果。
-3. 如果任务执行过程中生成了文档，那么在回答中应该包含文档的地址引用，使用markdown的文件连接格式，方便用户下载。
+3. 如果任务执行过程中生成了文档，那么在回答中应该包含文档的地址引用，使用markdown的文件连接格式，方便用户下载；文档有云端链接（document_cloud_urls）时使用云端链接。
 4. 对于生成的文档，不仅要提供文档地址，还要提供文档内的关键内容摘要。
 5. 图表直接使用markdown进行显示。
 6. 不是为了总结执行过程，而是以TaskManager中的任务执行结果为基础，生成一个针对用户任务的完美回答。
+"""
+
+    # 文档分块摘要（map）提示模板
+    CHUNK_SUMMARY_PROMPT_TEMPLATE = """以下是文档《{doc_name}》的第 {index}/{total} 部分。
+请提取这一部分的关键内容：结论、数据、数字、表格要点和重要细节，保留原文中的专有名词，不要添加文档中没有的信息。
+直接输出摘要，不要输出其他内容。
+
+{chunk}
+"""
+
+    # 文档摘要合并（reduce）提示模板
+    REDUCE_PROMPT_TEMPLATE = """以下是文档《{doc_name}》各部分的摘要，请合并为一份完整、结构清晰的文档摘要，
+保留关键结论和具体数据，去掉重复内容。直接输出摘要，不要输出其他内容。
+
+{summaries}
 """
 
     # 系统提示模板常量
@@ -160,7 +212,7 @@ TaskManager状态及执行结果:
         logger.info(f"TaskSummaryAgent: 提取任务描述，长度: {len(task_description)}")
         
         # 获取TaskManager状态（包含执行结果）
-        task_manager_status_and_results = self._extract_task_manager_status(task_manager)
+        task_manager_status_and_results = self._extract_task_manager_status(task_manager, session_id)
         logger.info(f"TaskSummaryAgent: 提取TaskManager状态及结果，长度: {len(task_manager_status_and_results)}")
         
         # 提取执行结果
@@ -286,12 +338,13 @@ TaskManager状态及执行结果:
         logger.info(f"TaskSummaryAgent: 生成完成操作，长度: {len(result)}")
         return result
 
-    def _extract_task_manager_status(self, task_manager: Optional[Any]) -> str:
+    def _extract_task_manager_status(self, task_manager: Optional[Any], session_id: Optional[str] = None) -> str:
         """
         提取TaskManager状态，包括任务执行结果
         
         Args:
             task_manager: 任务管理器实例
+            session_id: 会话ID（用于文档摘要的LLM调用）
             
         Returns:
             str: TaskManager状态的JSON字符串
@@ -303,6 +356,11 @@ TaskManager状态及执行结果:
         try:
             logger.info(f"TaskSummaryAgent: 开始提取TaskManager状态，task_manager类型: {type(task_manager)}")
             
+            # 后台上传时，汇合点：等待生成文档的上传完成，使总结能引用云端链接
+            tool_config = get_settings().tool
+            if tool_config.async_upload and not flush_cloud_upload_queues(tool_config.upload_flush_timeout):
+                logger.warning(f"TaskSummaryAgent: {tool_config.upload_flush_timeout}s 内仍有文档未上传完成")
+            
             # 获取所有任务的状态
             all_tasks = task_manager.get_all_tasks()
             logger.info(f"TaskSummaryAgent: 获取到 {len(all_tasks)} 个任务")
@@ -366,10 +424,15 @@ TaskManager状态及执行结果:
                     "execution_summary": execution_summary if isinstance(execution_summary, dict) else {}
                 }
                 
+                # 已上传到云端的文档附上链接
+                cloud_urls = self._get_document_cloud_urls(task_status["result_documents"])
+                if cloud_urls:
+                    task_status["document_cloud_urls"] = cloud_urls
+                
                 # 读取文档内容
                 if task_status["result_documents"]:
                     logger.info(f"TaskSummaryAgent: 读取 {len(task_status['result_documents'])} 个文档内容")
-                    task_status["document_contents"] = self._read_document_contents(task_status["result_documents"])
+                    task_status["document_contents"] = self._read_document_contents(task_status["result_documents"], session_id)
                 
                 status_info["tasks"].append(task_status)
                 logger.info(f"TaskSummaryAgent: 第 {i+1} 个任务处理完成")
@@ -384,18 +447,41 @@ TaskManager状态及执行结果:
             logger.error(f"TaskSummaryAgent: 错误详情: {traceback.format_exc()}")
             return f"提取TaskManager状态失败: {str(e)}"
 
-    def _read_document_contents(self, documents: List[Any]) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _get_document_cloud_urls(documents: List[Any]) -> Dict[str, str]:
+        """
+        查找文档在file_write自动上传中得到的云端链接
+        
+        Args:
+            documents: 文档信息列表，可能是文件名列表或字典列表
+            
+        Returns:
+            Dict[str, str]: {文档路径: 云端链接}
+        """
+        cloud_urls = {}
+        for doc in documents:
+            doc_path = doc.get("path", "") if isinstance(doc, dict) else doc
+            if not isinstance(doc_path, str) or not doc_path:
+                continue
+            status = find_cloud_upload_status(doc_path)
+            if status and status.get("url"):
+                cloud_urls[doc_path] = status["url"]
+        return cloud_urls
+
+    def _read_document_contents(self, documents: List[Any], session_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         读取文档内容
         
+        短文档直接放入总结提示；长文档分块读取（有单文档上限），
+        各块并行摘要（map）后合并（reduce）。结果按文档内容哈希缓存，未变化的文档不会重复读取和摘要。
+        
         Args:
             documents: 文档信息列表，可能是文件名列表或字典列表
+            session_id: 会话ID
             
         Returns:
             List[Dict[str, Any]]: 包含文档内容的列表
         """
-        import os
-        
         document_contents = []
         
         for i, doc in enumerate(documents):
@@ -429,10 +515,13 @@ TaskManager状态及执行结果:
             # 尝试读取文档内容
             if doc_path and os.path.exists(doc_path):
                 try:
-                    with open(doc_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        doc_content["content"] = content
-                        logger.info(f"TaskSummaryAgent: 成功读取文档 {doc_path}")
+                    digest = self._digest_document(doc_path, doc_name or os.path.basename(doc_path), session_id)
+                    doc_content["content"] = digest["content"]
+                    if digest["summarized"] or digest["truncated"]:
+                        doc_content["summarized"] = digest["summarized"]
+                        doc_content["truncated"] = digest["truncated"]
+                        doc_content["original_length"] = digest["length"]
+                    logger.info(f"TaskSummaryAgent: 成功读取文档 {doc_path}")
                 except Exception as e:
                     logger.warning(f"TaskSummaryAgent: 读取文档 {doc_path} 失败: {str(e)}")
                     doc_content["content"] = f"文档读取失败: {str(e)}"
@@ -443,6 +532,152 @@ TaskManager状态及执行结果:
         
         return document_contents
 
+    def _digest_document(self, doc_path: str, doc_name: str, session_id: Optional[str]) -> Dict[str, Any]:
+        """
+        获取文档用于总结的内容，优先使用缓存
+        
+        Args:
+            doc_path: 文档路径
+            doc_name: 文档名称
+            session_id: 会话ID
+            
+        Returns:
+            Dict[str, Any]: content（原文或摘要）、length、truncated、summarized
+        """
+        agent_config = get_settings().agent
+        stat = os.stat(doc_path)
+        stat_key = (os.path.abspath(doc_path), stat.st_mtime_ns, stat.st_size)
+        
+        # 文件未变化时不再重新读取
+        content_hash = _cache_get(_document_hashes, stat_key)
+        if content_hash:
+            digest = _cache_get(_document_digests, content_hash)
+            if digest:
+                logger.info(f"TaskSummaryAgent: 文档 {doc_path} 未变化，使用缓存的摘要")
+                return digest
+        
+        chunks, truncated = self._read_document_chunks(doc_path, agent_config.summary_doc_chunk_chars, agent_config.summary_doc_max_chars)
+        content_hash = hashlib.sha256(''.join(chunks).encode('utf-8')).hexdigest()
+        _cache_put(_document_hashes, stat_key, content_hash)
+        
+        # 内容相同的文档（如复制或重写为相同内容）复用摘要
+        digest = _cache_get(_document_digests, content_hash)
+        if digest:
+            logger.info(f"TaskSummaryAgent: 文档 {doc_path} 内容未变化，使用缓存的摘要")
+            return digest
+        
+        length = sum(len(chunk) for chunk in chunks)
+        if length <= agent_config.summary_doc_inline_chars and not truncated:
+            digest = {"content": ''.join(chunks), "length": length, "truncated": False, "summarized": False}
+        else:
+            summary, complete = self._map_reduce_document(chunks, doc_name, session_id, agent_config)
+            if truncated:
+                summary += f"\n\n（文档超过 {agent_config.summary_doc_max_chars} 字符，以上仅为前 {agent_config.summary_doc_max_chars} 字符的摘要）"
+            digest = {"content": summary, "length": length, "truncated": truncated, "summarized": True}
+            if not complete:
+                # 部分分块摘要失败时不缓存，下次重新生成
+                return digest
+        
+        _cache_put(_document_digests, content_hash, digest)
+        return digest
+
+    def _read_document_chunks(self, doc_path: str, chunk_chars: int, max_chars: int) -> tuple:
+        """
+        分块读取文档，最多读取max_chars个字符
+        
+        Args:
+            doc_path: 文档路径
+            chunk_chars: 每块字符数
+            max_chars: 最多读取的字符数
+            
+        Returns:
+            tuple: (分块列表, 是否因超过上限被截断)
+        """
+        chunks = []
+        read_chars = 0
+        with open(doc_path, 'r', encoding='utf-8') as f:
+            while read_chars < max_chars:
+                chunk = f.read(min(chunk_chars, max_chars - read_chars))
+                if not chunk:
+                    return chunks, False
+                chunks.append(chunk)
+                read_chars += len(chunk)
+            truncated = bool(f.read(1))
+        return chunks, truncated
+
+    def _map_reduce_document(self, chunks: List[str], doc_name: str, session_id: Optional[str], agent_config: Any) -> tuple:
+        """
+        并行摘要文档各分块（map），再合并为一份摘要（reduce）
+        
+        Args:
+            chunks: 文档分块
+            doc_name: 文档名称
+            session_id: 会话ID
+            agent_config: 智能体配置
+            
+        Returns:
+            tuple: (文档摘要, 是否所有分块都摘要成功)
+        """
+        logger.info(f"TaskSummaryAgent: 文档《{doc_name}》分为 {len(chunks)} 块并行摘要")
+        
+        def summarize_chunk(index: int) -> Optional[str]:
+            prompt = self.CHUNK_SUMMARY_PROMPT_TEMPLATE.format(
+                doc_name=doc_name, index=index + 1, total=len(chunks), chunk=chunks[index]
+            )
+            return self._summarize_text(prompt, session_id, "document_chunk_summary")
+        
+        workers = max(1, min(agent_config.summary_doc_map_workers, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(summarize_chunk, range(len(chunks))))
+        
+        complete = all(result is not None for result in results)
+        # 摘要失败的分块退化为截取开头部分
+        fallback_chars = max(agent_config.summary_doc_inline_chars // len(chunks), 200)
+        partials = [
+            result if result is not None else chunks[i][:fallback_chars]
+            for i, result in enumerate(results)
+        ]
+        if len(partials) == 1:
+            return partials[0], complete
+        
+        combined = '\n\n'.join(f"## 第 {i + 1} 部分\n{partial}" for i, partial in enumerate(partials))
+        if len(combined) <= agent_config.summary_doc_inline_chars:
+            return combined, complete
+        
+        reduced = self._summarize_text(
+            self.REDUCE_PROMPT_TEMPLATE.format(doc_name=doc_name, summaries=combined),
+            session_id,
+            "document_reduce_summary"
+        )
+        if reduced is None:
+            return combined[:agent_config.summary_doc_inline_chars], False
+        return reduced, complete
+
+    def _summarize_text(self, prompt: str, session_id: Optional[str], step_name: str) -> Optional[str]:
+        """
+        调用LLM生成摘要
+        
+        Args:
+            prompt: 摘要提示
+            session_id: 会话ID
+            step_name: 步骤名称
+            
+        Returns:
+            Optional[str]: 摘要文本，调用失败时返回None
+        """
+        try:
+            start_time = time.time()
+            response = self._call_llm_non_streaming(
+                messages=[{"role": "user", "content": prompt}],
+                session_id=session_id,
+                step_name=step_name
+            )
+            self._track_token_usage(response, step_name, start_time)
+            return (response.choices[0].message.content or '').strip() or None
+        except Exception as e:
+            logger.warning(f"TaskSummaryAgent: {step_name} 摘要失败: {str(e)}")
+            return None
+
     def _extract_generated_documents(self, task_completion_results: str) -> List[Dict[str, Any]]:
         """
         从任务完成结果中提取生成的文档信息
@@ -11,6 +11,7 @@
 import json
 from typing import Dict, List, Any, Optional, Tuple, Union
 from sagents.utils.logger import logger
+from sagents.utils.llm_cache import get_llm_cache, is_llm_cache_enabled, serialize_llm_object, to_namespace
 
 # 嵌套工作流步骤类型定义
 WorkflowStep = Dict[str, Any]  # 包含 id, name, description, order, substeps?
@@ -199,10 +200,7 @@ def select_workflow_with_llm(
             {"role": "user", "content": prompt}
         ]
         
-        response = model.chat.completions.create(
-            messages=llm_messages,
-            **model_config
-        )
+        response = _create_completion(model, model_config, llm_messages)
         response_content = response.choices[0].message.content.strip()
         
         logger.debug(f"WorkflowSelector: LLM响应内容: {response_content[:200]}...")
@@ -246,6 +244,37 @@ def select_workflow_with_llm(
         return None, None
 
 
+def _create_completion(model: Any, model_config: Dict[str, Any], llm_messages: List[Dict[str, Any]]) -> Any:
+    """
+    调用模型，启用LLM响应缓存时相同的对话历史和工作流列表直接复用缓存的响应
+
+    Args:
+        model: 语言模型实例
+        model_config: 模型配置
+        llm_messages: 发送给模型的消息
+
+    Returns:
+        Any: 模型响应对象
+    """
+    cache_key = None
+    if is_llm_cache_enabled("WorkflowSelector"):
+        cache_key = get_llm_cache().make_key(llm_messages, model_config, stream=False)
+        cached = get_llm_cache().get(cache_key)
+        if cached is not None and cached.get('kind') == 'response':
+            logger.info("WorkflowSelector: 命中LLM响应缓存")
+            return to_namespace({**cached['payload'], 'usage': None})
+
+    response = model.chat.completions.create(
+        messages=llm_messages,
+        **model_config
+    )
+    if cache_key:
+        response_data = serialize_llm_object(response)
+        if response_data is not None:
+            get_llm_cache().set(cache_key, 'response', response_data)
+    return response
+
+
 def create_workflow_guidance(workflow_name: str, workflow_steps: List[str]) -> str:
     """
     创建工作流指导文本
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass, field
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from sagents.utils.logger import logger
 
 @dataclass
@@ -11,6 +11,9 @@ class ModelConfig:
     max_tokens: int = 4096
     temperature: float = 0.7
     timeout: int = 60
+    max_retries: int = 3  # LLM调用失败后的最大重试次数（连接错误、429、5xx）
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 20.0
 
 @dataclass  
 class AgentConfig:
@@ -18,17 +21,124 @@ class AgentConfig:
     enable_deep_thinking: bool = True
     enable_summary: bool = True
     task_timeout: int = 300
+    structured_output_early_stop: bool = True  # 结构化输出的闭合标签出现后提前停止生成
+    structured_output_token_caps: bool = True  # 按输出结构推导max_tokens上限
+    enable_fused_observe_plan: bool = False  # 观察与下一步规划合并为一次LLM调用
+    # 跳过观察阶段LLM调用的规则完成信号：completion_tool（调用了complete_task且没有未完成的子任务）、
+    # all_tasks_terminal（所有子任务已完成/失败/跳过）
+    completion_fast_path_signals: List[str] = field(default_factory=lambda: ['completion_tool', 'all_tasks_terminal'])
+    background_stage_summary: bool = True  # 阶段总结在后台运行，与下一轮规划并行
+    summary_doc_inline_chars: int = 8000  # 任务总结时不超过该长度的文档直接放入提示，超过则分块摘要
+    summary_doc_max_chars: int = 200000  # 每个文档最多读取的字符数
+    summary_doc_chunk_chars: int = 12000  # 分块摘要的块大小
+    summary_doc_map_workers: int = 4  # 分块摘要的并行数
+    executor_context_mode: str = "dependencies"  # 执行上下文：dependencies（按子任务依赖构建）、recent（最近消息）
+    task_status_full_every: int = 5  # 规划/观察提示中每隔多少轮给出一次完整任务状态，其余轮次给出紧凑状态和变化
+    enable_auto_routing: bool = False  # 按问题复杂度自动选择直接执行或多智能体协作
+    auto_routing_use_llm: bool = False  # 复杂度处于模糊区间时调用小模型判断
+    loop_repeat_threshold: int = 3  # 同一规划/工具调用重复多少次后升级，0表示不升级
+    loop_escalation_action: str = "summary"  # 升级方式：summary（结束循环并总结）、terminate（直接终止）
+    # 重复调用时可以复用会话内结果的无副作用工具
+    loop_memo_tools: List[str] = field(default_factory=lambda: [
+        'calculate', 'factorial', 'file_read', 'get_file_info', 'extract_text_from_file',
+        'extract_text_from_url', 'get_supported_formats', 'check_command_availability', 'get_system_info'
+    ])
 
 @dataclass
 class ToolConfig:
     tool_timeout: int = 30
     max_concurrent_tools: int = 5
+    # 工具结果超过该字符数时写入会话工作目录，只向LLM返回头尾预览和结果句柄，0表示不启用
+    result_spill_threshold: int = 8000
+    result_preview_head: int = 2000  # 预览保留的开头字符数
+    result_preview_tail: int = 1000  # 预览保留的结尾字符数
+    # 工具发现清单：按模块mtime缓存发现结果和工具schema，目录为None时保存在工具包的__pycache__下
+    enable_discovery_manifest: bool = True
+    discovery_manifest_dir: Optional[str] = None
+    # file_write 自动上传：默认同步上传并在结果中返回cloud_url；开启async_upload后加入后台队列，
+    # 按路径合并写入、内容未变化时跳过上传，链接在任务总结前汇合后提供给总结
+    async_upload: bool = False
+    upload_debounce_seconds: float = 2.0  # 同一路径最后一次写入后等待多久再上传
+    upload_workers: int = 2
+    upload_flush_timeout: float = 60.0  # 任务总结前等待后台上传完成的最长时间（秒）
+    # download_file_from_url：流式下载的大小上限，超过阈值且服务器支持Range时分段并行下载
+    download_max_size_mb: float = 1024
+    download_parallel_threshold_mb: float = 32
+    download_segments: int = 4
+
+@dataclass
+class CacheConfig:
+    enable_llm_cache: bool = False
+    llm_cache_agents: List[str] = field(default_factory=list)  # 为空表示所有智能体
+    llm_cache_ttl: int = 3600
+    llm_cache_max_entries: int = 256
+    llm_cache_dir: Optional[str] = None
+    # 跨会话的工具结果缓存，只对在 tool_cache_policies 中声明的幂等工具生效
+    enable_tool_cache: bool = True
+    tool_cache_default_ttl: int = 600
+    tool_cache_max_entries: int = 512
+    tool_cache_dir: Optional[str] = None
+    # 工具缓存策略：{工具名: {"cacheable": 是否缓存, "ttl": 存活秒数,
+    #                "ignore_args": 不参与缓存键的参数, "case_insensitive_args": 忽略大小写的参数}}
+    tool_cache_policies: Dict[str, Dict[str, Any]] = field(default_factory=lambda: {
+        'search_web_page': {'ttl': 600, 'case_insensitive_args': ['query']},
+        'search_image_from_web': {'ttl': 600, 'case_insensitive_args': ['query']},
+        'extract_text_from_url': {'ttl': 1800, 'ignore_args': ['timeout']},
+        'query_match_list_by_date': {'ttl': 300},
+        'get_match_standings_by_id': {'ttl': 600},
+        'get_match_details_by_id': {'ttl': 300},
+        'get_team_recent_performance_by_match_id': {'ttl': 1800},
+        'get_football_squad_by_match_id': {'ttl': 1800},
+        'get_head_to_head_history_by_match_id': {'ttl': 3600},
+        'get_history_match': {'ttl': 3600},
+        'get_europe_odds_by_match_id': {'ttl': 120},
+        'get_asian_handicap_odds_by_match_id': {'ttl': 120}
+    })
+
+@dataclass
+class RoutingConfig:
+    # 模型路由表：键为智能体类名或step_name，值为模型配置覆盖项（model、max_tokens、base_url、api_key等）
+    model_routes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+@dataclass
+class SchedulerConfig:
+    enable_llm_scheduler: bool = False
+    default_rpm: int = 0  # 每分钟请求数限制，0表示不限制
+    default_tpm: int = 0  # 每分钟token数限制，0表示不限制
+    # 端点级别限制：{base_url: {"rpm": ..., "tpm": ...}}
+    endpoint_limits: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+@dataclass
+class FailoverConfig:
+    # 主模型客户端之外的备用端点：[{"name": ..., "base_url": ..., "api_key": ...}]，
+    # 非空时主客户端与这些端点一起包装为 FailoverChatClient
+    endpoints: List[Dict[str, Any]] = field(default_factory=list)
+    hedge_percentile: float = 0.9  # 首token等待超过该TTFT分位数时向次优端点发起对冲请求
+    min_samples_for_hedge: int = 5
+    default_hedge_delay: Optional[float] = None  # 样本不足时的对冲等待时间（秒），None表示不对冲
+    failure_threshold: int = 3  # 连续失败多少次后进入冷却
+    cooldown_seconds: float = 30.0
+
+@dataclass
+class BudgetConfig:
+    default_time_budget: float = 0  # 默认墙钟时间预算（秒），0表示不限制
+    default_token_budget: int = 0  # 默认token预算，0表示不限制
+    default_cost_budget: float = 0.0  # 默认费用预算，0表示不限制
+    reserve_seconds: float = 30.0  # 为任务总结预留的时间
+    reserve_tokens: int = 4000  # 为任务总结预留的token数
+    # 模型单价：{model: {"input": 每千token价格, "output": 每千token价格}}
+    model_prices: Dict[str, Dict[str, float]] = field(default_factory=dict)
 
 @dataclass
 class Settings:
     model: ModelConfig = field(default_factory=ModelConfig)
     agent: AgentConfig = field(default_factory=AgentConfig)
     tool: ToolConfig = field(default_factory=ToolConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    routing: RoutingConfig = field(default_factory=RoutingConfig)
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+    failover: FailoverConfig = field(default_factory=FailoverConfig)
+    budget: BudgetConfig = field(default_factory=BudgetConfig)
     debug: bool = False
     environment: str = "development"
     
@@ -41,8 +151,82 @@ class Settings:
             self.agent.max_loop_count = int(os.getenv('SAGE_MAX_LOOP_COUNT'))
         if os.getenv('OPENAI_API_KEY'):
             self.model.api_key = os.getenv('OPENAI_API_KEY')
+        if os.getenv('SAGE_FUSED_OBSERVE_PLAN'):
+            self.agent.enable_fused_observe_plan = os.getenv('SAGE_FUSED_OBSERVE_PLAN').lower() == 'true'
+        if os.getenv('SAGE_COMPLETION_FAST_PATH') is not None:
+            self.agent.completion_fast_path_signals = [s.strip() for s in os.getenv('SAGE_COMPLETION_FAST_PATH').split(',') if s.strip()]
+        if os.getenv('SAGE_BACKGROUND_STAGE_SUMMARY'):
+            self.agent.background_stage_summary = os.getenv('SAGE_BACKGROUND_STAGE_SUMMARY').lower() == 'true'
+        if os.getenv('SAGE_SUMMARY_DOC_INLINE_CHARS'):
+            self.agent.summary_doc_inline_chars = int(os.getenv('SAGE_SUMMARY_DOC_INLINE_CHARS'))
+        if os.getenv('SAGE_SUMMARY_DOC_MAX_CHARS'):
+            self.agent.summary_doc_max_chars = int(os.getenv('SAGE_SUMMARY_DOC_MAX_CHARS'))
+        if os.getenv('SAGE_EXECUTOR_CONTEXT'):
+            self.agent.executor_context_mode = os.getenv('SAGE_EXECUTOR_CONTEXT')
+        if os.getenv('SAGE_TASK_STATUS_FULL_EVERY'):
+            self.agent.task_status_full_every = int(os.getenv('SAGE_TASK_STATUS_FULL_EVERY'))
+        if os.getenv('SAGE_AUTO_ROUTING'):
+            self.agent.enable_auto_routing = os.getenv('SAGE_AUTO_ROUTING').lower() == 'true'
+        if os.getenv('SAGE_AUTO_ROUTING_LLM'):
+            self.agent.auto_routing_use_llm = os.getenv('SAGE_AUTO_ROUTING_LLM').lower() == 'true'
+        if os.getenv('SAGE_LOOP_REPEAT_THRESHOLD'):
+            self.agent.loop_repeat_threshold = int(os.getenv('SAGE_LOOP_REPEAT_THRESHOLD'))
+        if os.getenv('SAGE_LOOP_ESCALATION'):
+            self.agent.loop_escalation_action = os.getenv('SAGE_LOOP_ESCALATION').lower()
+        if os.getenv('SAGE_LLM_MAX_RETRIES'):
+            self.model.max_retries = int(os.getenv('SAGE_LLM_MAX_RETRIES'))
         if os.getenv('SAGE_TOOL_TIMEOUT'):
             self.tool.tool_timeout = int(os.getenv('SAGE_TOOL_TIMEOUT'))
+        if os.getenv('SAGE_TOOL_RESULT_SPILL_THRESHOLD'):
+            self.tool.result_spill_threshold = int(os.getenv('SAGE_TOOL_RESULT_SPILL_THRESHOLD'))
+        if os.getenv('SAGE_TOOL_MANIFEST'):
+            self.tool.enable_discovery_manifest = os.getenv('SAGE_TOOL_MANIFEST').lower() == 'true'
+        if os.getenv('SAGE_TOOL_MANIFEST_DIR'):
+            self.tool.discovery_manifest_dir = os.getenv('SAGE_TOOL_MANIFEST_DIR')
+        if os.getenv('SAGE_ASYNC_UPLOAD'):
+            self.tool.async_upload = os.getenv('SAGE_ASYNC_UPLOAD').lower() == 'true'
+        if os.getenv('SAGE_UPLOAD_DEBOUNCE'):
+            self.tool.upload_debounce_seconds = float(os.getenv('SAGE_UPLOAD_DEBOUNCE'))
+        if os.getenv('SAGE_DOWNLOAD_MAX_SIZE_MB'):
+            self.tool.download_max_size_mb = float(os.getenv('SAGE_DOWNLOAD_MAX_SIZE_MB'))
+        if os.getenv('SAGE_LLM_CACHE'):
+            self.cache.enable_llm_cache = os.getenv('SAGE_LLM_CACHE').lower() == 'true'
+        if os.getenv('SAGE_LLM_CACHE_AGENTS'):
+            self.cache.llm_cache_agents = [a.strip() for a in os.getenv('SAGE_LLM_CACHE_AGENTS').split(',') if a.strip()]
+        if os.getenv('SAGE_LLM_CACHE_TTL'):
+            self.cache.llm_cache_ttl = int(os.getenv('SAGE_LLM_CACHE_TTL'))
+        if os.getenv('SAGE_LLM_CACHE_DIR'):
+            self.cache.llm_cache_dir = os.getenv('SAGE_LLM_CACHE_DIR')
+        if os.getenv('SAGE_TOOL_CACHE'):
+            self.cache.enable_tool_cache = os.getenv('SAGE_TOOL_CACHE').lower() == 'true'
+        if os.getenv('SAGE_TOOL_CACHE_DIR'):
+            self.cache.tool_cache_dir = os.getenv('SAGE_TOOL_CACHE_DIR')
+        if os.getenv('SAGE_MODEL_ROUTES'):
+            import json
+            try:
+                self.routing.model_routes = json.loads(os.getenv('SAGE_MODEL_ROUTES'))
+            except json.JSONDecodeError as e:
+                logger.warning(f"Settings: SAGE_MODEL_ROUTES 解析失败: {e}")
+        if os.getenv('SAGE_LLM_SCHEDULER'):
+            self.scheduler.enable_llm_scheduler = os.getenv('SAGE_LLM_SCHEDULER').lower() == 'true'
+        if os.getenv('SAGE_LLM_RPM'):
+            self.scheduler.default_rpm = int(os.getenv('SAGE_LLM_RPM'))
+        if os.getenv('SAGE_LLM_TPM'):
+            self.scheduler.default_tpm = int(os.getenv('SAGE_LLM_TPM'))
+        if os.getenv('SAGE_FAILOVER_ENDPOINTS'):
+            import json
+            try:
+                self.failover.endpoints = json.loads(os.getenv('SAGE_FAILOVER_ENDPOINTS'))
+            except json.JSONDecodeError as e:
+                logger.warning(f"Settings: SAGE_FAILOVER_ENDPOINTS 解析失败: {e}")
+        if os.getenv('SAGE_HEDGE_DELAY'):
+            self.failover.default_hedge_delay = float(os.getenv('SAGE_HEDGE_DELAY'))
+        if os.getenv('SAGE_TIME_BUDGET'):
+            self.budget.default_time_budget = float(os.getenv('SAGE_TIME_BUDGET'))
+        if os.getenv('SAGE_TOKEN_BUDGET'):
+            self.budget.default_token_budget = int(os.getenv('SAGE_TOKEN_BUDGET'))
+        if os.getenv('SAGE_COST_BUDGET'):
+            self.budget.default_cost_budget = float(os.getenv('SAGE_COST_BUDGET'))
     
     def get_model_config_dict(self) -> Dict[str, Any]:
         return {
@@ -64,16 +248,87 @@ class Settings:
                 'model_name': self.model.model_name,
                 'base_url': self.model.base_url,
                 'max_tokens': self.model.max_tokens,
-                'temperature': self.model.temperature
+                'temperature': self.model.temperature,
+                'max_retries': self.model.max_retries
             },
             'agent': {
                 'max_loop_count': self.agent.max_loop_count,
                 'enable_deep_thinking': self.agent.enable_deep_thinking,
-                'enable_summary': self.agent.enable_summary
+                'enable_summary': self.agent.enable_summary,
+                'enable_fused_observe_plan': self.agent.enable_fused_observe_plan,
+                'completion_fast_path_signals': self.agent.completion_fast_path_signals,
+                'background_stage_summary': self.agent.background_stage_summary,
+                'summary_doc_inline_chars': self.agent.summary_doc_inline_chars,
+                'summary_doc_max_chars': self.agent.summary_doc_max_chars,
+                'summary_doc_chunk_chars': self.agent.summary_doc_chunk_chars,
+                'summary_doc_map_workers': self.agent.summary_doc_map_workers,
+                'executor_context_mode': self.agent.executor_context_mode,
+                'task_status_full_every': self.agent.task_status_full_every,
+                'enable_auto_routing': self.agent.enable_auto_routing,
+                'auto_routing_use_llm': self.agent.auto_routing_use_llm,
+                'loop_repeat_threshold': self.agent.loop_repeat_threshold,
+                'loop_escalation_action': self.agent.loop_escalation_action
             },
             'tool': {
                 'tool_timeout': self.tool.tool_timeout,
-                'max_concurrent_tools': self.tool.max_concurrent_tools
+                'max_concurrent_tools': self.tool.max_concurrent_tools,
+                'result_spill_threshold': self.tool.result_spill_threshold,
+                'result_preview_head': self.tool.result_preview_head,
+                'result_preview_tail': self.tool.result_preview_tail,
+                'enable_discovery_manifest': self.tool.enable_discovery_manifest,
+                'discovery_manifest_dir': self.tool.discovery_manifest_dir,
+                'async_upload': self.tool.async_upload,
+                'upload_debounce_seconds': self.tool.upload_debounce_seconds,
+                'upload_workers': self.tool.upload_workers,
+                'upload_flush_timeout': self.tool.upload_flush_timeout,
+                'download_max_size_mb': self.tool.download_max_size_mb,
+                'download_parallel_threshold_mb': self.tool.download_parallel_threshold_mb,
+                'download_segments': self.tool.download_segments
+            },
+            'cache': {
+                'enable_llm_cache': self.cache.enable_llm_cache,
+                'llm_cache_agents': self.cache.llm_cache_agents,
+                'llm_cache_ttl': self.cache.llm_cache_ttl,
+                'llm_cache_max_entries': self.cache.llm_cache_max_entries,
+                'llm_cache_dir': self.cache.llm_cache_dir,
+                'enable_tool_cache': self.cache.enable_tool_cache,
+                'tool_cache_default_ttl': self.cache.tool_cache_default_ttl,
+                'tool_cache_max_entries': self.cache.tool_cache_max_entries,
+                'tool_cache_dir': self.cache.tool_cache_dir,
+                'tool_cache_policies': self.cache.tool_cache_policies
+            },
+            'routing': {
+                # 不导出api_key
+                'model_routes': {
+                    key: {k: v for k, v in route.items() if k not in ('api_key', 'client')}
+                    for key, route in self.routing.model_routes.items()
+                }
+            },
+            'scheduler': {
+                'enable_llm_scheduler': self.scheduler.enable_llm_scheduler,
+                'default_rpm': self.scheduler.default_rpm,
+                'default_tpm': self.scheduler.default_tpm,
+                'endpoint_limits': self.scheduler.endpoint_limits
+            },
+            'failover': {
+                # 不导出api_key
+                'endpoints': [
+                    {k: v for k, v in endpoint.items() if k not in ('api_key', 'client')}
+                    for endpoint in self.failover.endpoints
+                ],
+                'hedge_percentile': self.failover.hedge_percentile,
+                'min_samples_for_hedge': self.failover.min_samples_for_hedge,
+                'default_hedge_delay': self.failover.default_hedge_delay,
+                'failure_threshold': self.failover.failure_threshold,
+                'cooldown_seconds': self.failover.cooldown_seconds
+            },
+            'budget': {
+                'default_time_budget': self.budget.default_time_budget,
+                'default_token_budget': self.budget.default_token_budget,
+                'default_cost_budget': self.budget.default_cost_budget,
+                'reserve_seconds': self.budget.reserve_seconds,
+                'reserve_tokens': self.budget.reserve_tokens,
+                'model_prices': self.budget.model_prices
             }
         }
         return json.dumps(config_dict, indent=2)
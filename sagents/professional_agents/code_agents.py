@@ -27,7 +27,9 @@ class CodeAgent(AgentBase):
         
     def _create_filtered_tool_manager(self, original_tool_manager: Optional[Any] = None) -> ToolManager:
         """
-        创建一个过滤掉自己的tool_manager副本，避免自调用
+        创建一个过滤掉自己的tool_manager视图，避免自调用
+
+        视图与原始tool_manager共享工具注册表和MCP会话，不复制工具
         
         Args:
             original_tool_manager: 原始的tool_manager
@@ -38,19 +40,9 @@ class CodeAgent(AgentBase):
         if original_tool_manager is None:
             return self.tool_manager
             
-        # 创建新的tool_manager实例
-        filtered_tool_manager = ToolManager(is_auto_discover=False)
-        
-        # 复制所有工具，但排除自己
         agent_name = self.__class__.__name__
-        for tool_name, tool_spec in original_tool_manager.tools.items():
-            if tool_name != agent_name:
-                filtered_tool_manager.tools[tool_name] = tool_spec
-            else:
-                logger.info(f"CodeAgent: 过滤掉自调用工具: {tool_name}")
-                
-        logger.info(f"CodeAgent: 创建过滤后的tool_manager，原有{len(original_tool_manager.tools)}个工具，过滤后{len(filtered_tool_manager.tools)}个工具")
-        return filtered_tool_manager
+        logger.info(f"CodeAgent: 创建过滤掉自调用工具 {agent_name} 的tool_manager视图")
+        return original_tool_manager.create_view(exclude=[agent_name])
         
     def run_stream(self, messages: List[Dict],
                     tool_manager: Optional[Any] = None,
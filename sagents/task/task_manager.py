@@ -2,6 +2,7 @@ from typing import Dict, List, Optional, Any, Tuple
 import json
 import datetime
 from .task_base import TaskBase
+from .task_status_renderer import TaskStatusRenderer
 
 class TaskManager:
     """
@@ -23,6 +24,8 @@ class TaskManager:
         self.task_history: List[Dict[str, Any]] = []
         self.created_time = datetime.datetime.now().isoformat()
         self.next_task_number = 1  # 用于生成顺序的task_id
+        self.version = 0  # 每次任务变更递增，用于缓存状态描述
+        self._status_renderer = TaskStatusRenderer(self)
 
     def add_task(self, task: TaskBase) -> str:
         """
@@ -326,6 +329,26 @@ class TaskManager:
             dependency_graph[task.task_id] = task.dependencies.copy()
         return dependency_graph
 
+    def get_dependency_closure(self, task_id: str) -> List[str]:
+        """
+        获取任务的全部前置任务（依赖的传递闭包）
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            List[str]: 前置任务ID列表，按任务ID顺序排列，不包含任务自身
+        """
+        closure = set()
+        stack = list(self.tasks[task_id].dependencies) if task_id in self.tasks else []
+        while stack:
+            dependency_id = stack.pop()
+            if dependency_id in closure or dependency_id == task_id or dependency_id not in self.tasks:
+                continue
+            closure.add(dependency_id)
+            stack.extend(self.tasks[dependency_id].dependencies)
+        return sorted(closure, key=lambda x: int(x) if x.isdigit() else x)
+
     def get_execution_summary(self) -> Dict[str, Any]:
         """
         获取执行摘要（用于减少token使用）
@@ -536,6 +559,7 @@ class TaskManager:
             'details': details
         }
         self.task_history.append(entry)
+        self.version += 1
 
     def get_status_description(self) -> str:
         """
@@ -555,6 +579,8 @@ class TaskManager:
             
             for task in all_tasks:
                 status_info = f"- 任务ID: {task.task_id}, 描述: {task.description}, 状态: {task.status.value}"
+                if task.dependencies:
+                    status_info += f", 依赖: {', '.join(task.dependencies)}"
                 status_lines.append(status_info)
             
             return "\n".join(status_lines)
@@ -562,6 +588,25 @@ class TaskManager:
         except Exception as e:
             return f"任务管理器状态获取失败: {str(e)}"
 
+    def render_status(self, consumer: str, full_every: Optional[int] = None) -> str:
+        """
+        为每轮都需要任务状态的智能体渲染状态描述
+        
+        每隔full_every次渲染给出一次完整描述（同get_status_description），
+        其余时候给出紧凑快照和自该调用方上次渲染以来的变化，结果按版本号缓存。
+        
+        Args:
+            consumer: 调用方名称（如智能体类名）
+            full_every: 完整描述的间隔，为None时使用Settings配置
+            
+        Returns:
+            str: 任务状态描述
+        """
+        if full_every is None:
+            from sagents.config.settings import get_settings
+            full_every = get_settings().agent.task_status_full_every
+        return self._status_renderer.render(consumer, full_every)
+
     def get_compact_status_description(self) -> str:
         """
         获取任务管理器的紧凑状态描述字符串（用于简短展示）
@@ -0,0 +1,138 @@
+"""
+任务状态渲染
+
+按TaskManager的版本号增量渲染规划、观察提示中的任务状态：
+周期性给出完整快照，其余轮次给出紧凑快照和自上次渲染以来的变化。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+from typing import Dict, Any, Optional, Tuple
+
+
+class TaskStatusRenderer:
+    """
+    任务状态渲染器
+
+    为规划、观察等每轮都需要任务状态的智能体渲染状态描述：
+    每隔若干次渲染给出一次完整快照（所有任务的描述和状态），
+    其余时候给出紧凑快照（已结束的任务只列出ID，未结束的任务保留描述）加上自该智能体上次渲染以来的变化。
+    渲染结果按TaskManager的版本号缓存，任务没有变化时不会重复构建。
+    """
+
+    # 已结束的任务在紧凑快照中只列出ID
+    TERMINAL_STATUSES = ('completed', 'failed', 'skipped')
+    TERMINAL_LABELS = {'completed': '已完成', 'failed': '失败', 'skipped': '已跳过'}
+
+    def __init__(self, task_manager: Any):
+        """
+        初始化任务状态渲染器
+
+        Args:
+            task_manager: 任务管理器
+        """
+        self.task_manager = task_manager
+        # 每个调用方上次渲染时的状态：{consumer: {'version', 'statuses', 'renders_since_full'}}
+        self._consumers: Dict[str, Dict[str, Any]] = {}
+        # 当前版本的渲染缓存
+        self._cache_version: Optional[int] = None
+        self._cache: Dict[Tuple, str] = {}
+
+    def render(self, consumer: str, full_every: int = 5) -> str:
+        """
+        为指定调用方渲染任务状态
+
+        Args:
+            consumer: 调用方名称（如智能体类名），各调用方分别记录上次渲染的状态
+            full_every: 每隔多少次渲染给出一次完整快照，<=1 表示每次都给出完整快照
+
+        Returns:
+            str: 任务状态描述
+        """
+        version = self.task_manager.version
+        if self._cache_version != version:
+            self._cache_version = version
+            self._cache = {}
+
+        state = self._consumers.get(consumer)
+        full = state is None or full_every <= 1 or state['renders_since_full'] + 1 >= full_every
+
+        if full:
+            text = self._cached(('full',), self.task_manager.get_status_description)
+        else:
+            compact = self._cached(('compact',), self._render_compact)
+            changes = self._cached(('changes', state['version']), lambda: self._render_changes(state['statuses']))
+            text = f"{compact}\n\n{changes}"
+
+        self._consumers[consumer] = {
+            'version': version,
+            'statuses': self._current_statuses(),
+            'renders_since_full': 0 if full else state['renders_since_full'] + 1
+        }
+        return text
+
+    def reset(self, consumer: Optional[str] = None):
+        """
+        清除调用方的渲染记录，下一次渲染给出完整快照
+
+        Args:
+            consumer: 调用方名称，为None时清除所有调用方
+        """
+        if consumer is None:
+            self._consumers.clear()
+        else:
+            self._consumers.pop(consumer, None)
+
+    def _cached(self, key: Tuple, build) -> str:
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def _current_statuses(self) -> Dict[str, str]:
+        return {task.task_id: task.status.value for task in self.task_manager.get_all_tasks()}
+
+    def _render_compact(self) -> str:
+        """渲染紧凑快照"""
+        all_tasks = self.task_manager.get_all_tasks()
+        if not all_tasks:
+            return "任务管理器中暂无任务"
+
+        terminal_ids = {status: [] for status in self.TERMINAL_STATUSES}
+        open_lines = []
+        for task in all_tasks:
+            status = task.status.value
+            if status in terminal_ids:
+                terminal_ids[status].append(task.task_id)
+                continue
+            line = f"- 任务ID: {task.task_id}, 描述: {task.description}, 状态: {status}"
+            if task.dependencies:
+                line += f", 依赖: {', '.join(task.dependencies)}"
+            open_lines.append(line)
+
+        lines = [f"任务管理器包含 {len(all_tasks)} 个任务（未结束 {len(open_lines)} 个）："]
+        for status in self.TERMINAL_STATUSES:
+            if terminal_ids[status]:
+                lines.append(f"- {self.TERMINAL_LABELS[status]}的任务ID: {', '.join(terminal_ids[status])}")
+        lines.extend(open_lines)
+        return "\n".join(lines)
+
+    def _render_changes(self, previous_statuses: Dict[str, str]) -> str:
+        """渲染自上次渲染以来的变化"""
+        lines = []
+        current_ids = set()
+        for task in self.task_manager.get_all_tasks():
+            current_ids.add(task.task_id)
+            status = task.status.value
+            previous = previous_statuses.get(task.task_id)
+            if previous is None:
+                lines.append(f"- 新增任务 {task.task_id}: {task.description}（{status}）")
+            elif previous != status:
+                lines.append(f"- 任务 {task.task_id}: {previous} -> {status}")
+        for task_id in previous_statuses:
+            if task_id not in current_ids:
+                lines.append(f"- 任务 {task_id} 已归档")
+
+        if not lines:
+            return "自上次查看以来任务状态没有变化"
+        return "自上次查看以来的任务状态变化：\n" + "\n".join(lines)
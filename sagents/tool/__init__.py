@@ -1,5 +1,5 @@
 from .tool_manager import ToolManager
-from .tool_base import ToolBase, ToolSpec, McpToolSpec, SseServerParameters
+from .tool_base import ToolBase, ToolSpec, McpToolSpec, SseServerParameters, ToolResult
 from .calculation_tool import *
 from .execute_command_tool import *
 from .file_parser_tool import *
@@ -12,6 +12,7 @@ __all__ = [
     'ToolSpec',
     'McpToolSpec',
     'SseServerParameters',
+    'ToolResult',
     'Calculator',
     'TaskCompletionTool',
     'FileSystemTool',
@@ -8,21 +8,14 @@ import time
 from datetime import datetime
 from pathlib import Path
 import urllib.parse
-import requests
 import asyncio
 import stat
 import platform
 import zipfile
 import tarfile
 import re
-import chardet
 import traceback
 from typing import Dict, Any, List, Optional, Union
-import pdfplumber
-import pypandoc
-from pptx import Presentation
-import html2text
-from openpyxl import load_workbook
 import subprocess
 
 from .tool_base import ToolBase
@@ -136,6 +129,7 @@ class TextProcessor:
     @staticmethod
     def detect_encoding(file_path: str) -> str:
         """检测文件编码"""
+        import chardet
         try:
             with open(file_path, 'rb') as f:
                 raw_data = f.read(10000)  # 读取前10KB进行检测
@@ -258,6 +252,7 @@ class PDFParser:
     @staticmethod
     def extract_text(pdf_path: str) -> str:
         """从PDF提取文本"""
+        import pdfplumber
         try:
             with pdfplumber.open(pdf_path) as pdf:
                 text_parts = []
@@ -278,6 +273,7 @@ class PDFParser:
     @staticmethod
     def get_pdf_info(pdf_path: str) -> Dict[str, Any]:
         """获取PDF信息"""
+        import pdfplumber
         try:
             with pdfplumber.open(pdf_path) as pdf:
                 return {
@@ -293,6 +289,7 @@ class OfficeParser:
     @staticmethod
     def extract_text_from_docx(file_path: str) -> str:
         """从DOCX提取文本"""
+        import pypandoc
         try:
             return pypandoc.convert_file(file_path, 'markdown', extra_args=['--extract-media=.'])
         except Exception as e:
@@ -322,6 +319,7 @@ class OfficeParser:
     @staticmethod
     def extract_text_from_pptx(file_path: str) -> str:
         """从PPTX提取文本"""
+        from pptx import Presentation
         try:
             prs = Presentation(file_path)
             slides_text = []
@@ -369,6 +367,7 @@ class ExcelParser:
     @staticmethod
     def _read_excel_to_dict(file_path: str) -> Dict[str, List[List[str]]]:
         """读取Excel文件到字典"""
+        from openpyxl import load_workbook
         workbook = load_workbook(file_path, data_only=True, read_only=True)
         excel_data = {}
 
@@ -471,6 +470,7 @@ class WebParser:
     @staticmethod
     def extract_text_from_url(url: str, timeout: int = 30) -> str:
         """从URL提取文本"""
+        import requests
         max_retries = 3
         initial_retry_delay = 2  # 初始重试延迟增加到2秒
         
@@ -751,6 +751,7 @@ class WebParser:
     @staticmethod
     def _html_to_text(html_content: str) -> str:
         """HTML转文本 - 优化版本：保留纯文字和超链接，忽略图片"""
+        import html2text
         h = html2text.HTML2Text()
         h.ignore_links = False  # 保留超链接
         h.ignore_images = True  # 忽略图片
@@ -806,6 +807,7 @@ class PlainTextParser:
     @staticmethod
     def extract_text_with_pandoc(file_path: str, input_format: str = None) -> str:
         """使用Pandoc提取文本"""
+        import pypandoc
         try:
             if input_format:
                 return pypandoc.convert_file(file_path, 'markdown', format=input_format)
@@ -8,19 +8,22 @@ import time
 from datetime import datetime
 from pathlib import Path
 import urllib.parse
-import requests
 import asyncio
 import stat
 import platform
 import zipfile
 import tarfile
 import re
-import chardet
 import traceback
 from typing import Dict, Any, List, Optional, Union
 
 from .tool_base import ToolBase
 from sagents.utils.logger import logger
+from sagents.utils.file_line_index import detect_file_encoding, read_line_range
+from sagents.utils.cloud_upload_queue import get_cloud_upload_queue
+from sagents.utils.file_downloader import get_file_downloader
+from sagents.utils.stream_replace import stream_replace_file
+from sagents.utils.exceptions import DownloadError
 
 class FileSystemError(Exception):
     """文件系统异常"""
@@ -123,12 +126,9 @@ class FileMetadata:
     
     @staticmethod
     def _detect_encoding(file_path: str) -> str:
-        """检测文件编码"""
+        """检测文件编码（按文件路径、mtime和大小缓存）"""
         try:
-            with open(file_path, 'rb') as f:
-                raw_data = f.read(10000)
-                result = chardet.detect(raw_data)
-                return result.get('encoding', 'utf-8')
+            return detect_file_encoding(file_path)
         except Exception:
             return 'utf-8'
 
@@ -143,7 +143,7 @@ class FileSystemTool(ToolBase):
 
     @ToolBase.tool()
     def file_read(self, file_path: str, start_line: int = 0, end_line: Optional[int] = None, 
-                  encoding: str = "auto", max_size_mb: float = 10.0) -> Dict[str, Any]:
+                  encoding: str = "auto", max_size_mb: float = 10.0, line_byte_offset: int = 0) -> Dict[str, Any]:
         """高级文件读取工具
 
         Args:
@@ -151,7 +151,8 @@ class FileSystemTool(ToolBase):
             start_line (int): 开始行号，默认0
             end_line (int): 结束行号（不包含），None表示读取到末尾
             encoding (str): 文件编码，'auto'表示自动检测
-            max_size_mb (float): 最大读取文件大小（MB），默认10MB
+            max_size_mb (float): 单次读取的最大内容大小（MB），默认10MB，超出时只返回范围开头的部分行
+            line_byte_offset (int): 从开始行内的该字节偏移处读取，用于继续读取被截断的超长行，默认0
 
         Returns:
             Dict[str, Any]: 包含文件内容和元信息
@@ -179,42 +180,25 @@ class FileSystemTool(ToolBase):
             if not file_info["permissions"]["readable"]:
                 return {"status": "error", "message": "文件无读取权限"}
             
-            # 检查文件大小
-            if file_info["size_mb"] > max_size_mb:
-                return {"status": "error", "message": f"文件过大: {file_info['size_mb']:.2f}MB > {max_size_mb}MB"}
-            
-            # 检测编码
-            if encoding == "auto":
-                encoding = file_info.get("encoding", "utf-8")
-            
-            # 读取文件内容
-            with open(file_path, 'r', encoding=encoding) as f:
-                lines = f.readlines()
-            
-            # 处理行范围
-            total_lines = len(lines)
-            if end_line is None:
-                end_line = total_lines
-            
-            start_line = max(0, start_line)
-            end_line = min(total_lines, end_line)
-            
-            if start_line >= total_lines:
-                content = ""
-            else:
-                content = ''.join(lines[start_line:end_line])
+            # 通过mmap和缓存的行偏移索引只读取请求的行范围，不限制文件本身的大小
+            read_result = read_line_range(file_path, start_line, end_line, encoding,
+                                          max_bytes=int(max_size_mb * 1024 * 1024),
+                                          line_byte_offset=line_byte_offset)
+            start_line = read_result["start_line"]
+            end_line = read_result["end_line"]
+            total_lines = read_result["total_lines"]
             
             total_time = time.time() - start_time
             
-            return {
+            response = {
                 "status": "success",
                 "message": f"成功读取文件 (行 {start_line}-{end_line})",
-                "content": content,
+                "content": read_result["content"],
                 "file_info": {
                     "path": file_path,
                     "total_lines": total_lines,
-                    "read_lines": end_line - start_line,
-                    "encoding": encoding,
+                    "read_lines": max(0, end_line - start_line),
+                    "encoding": read_result["encoding"],
                     "size_mb": file_info["size_mb"]
                 },
                 "line_range": {
@@ -225,6 +209,20 @@ class FileSystemTool(ToolBase):
                 "execution_time": total_time,
                 "operation_id": operation_id
             }
+            if read_result["line_cut"]:
+                # 单行超过限制：只返回了该行的一部分，需要在行内继续读取
+                response["truncated"] = True
+                response["line_cut"] = True
+                response["next_read"] = {"start_line": read_result["next_start_line"],
+                                         "line_byte_offset": read_result["next_line_byte_offset"]}
+                response["message"] = (f"第 {start_line} 行超过 {max_size_mb}MB，只返回了该行的一部分；"
+                                       f"可使用 start_line={read_result['next_start_line']}, "
+                                       f"line_byte_offset={read_result['next_line_byte_offset']} 继续读取该行")
+            elif read_result["truncated"]:
+                response["truncated"] = True
+                response["next_read"] = {"start_line": end_line, "line_byte_offset": 0}
+                response["message"] += f"，内容超过 {max_size_mb}MB 已截断，可从第 {end_line} 行继续读取"
+            return response
             
         except UnicodeDecodeError as e:
             return {"status": "error", "message": f"文件编码错误: {str(e)}，请尝试指定正确的编码"}
@@ -242,7 +240,7 @@ class FileSystemTool(ToolBase):
             content (str): 要写入的内容
             mode (str): 写入模式 - 'overwrite', 'append', 'prepend'
             encoding (str): 文件编码，默认utf-8
-            auto_upload (bool): 是否自动上传到云端，默认True
+            auto_upload (bool): 是否自动上传到云端，默认True。上传成功时结果中包含cloud_url；配置为后台上传时可通过 get_cloud_upload_status 查询链接
             
         Returns:
             Dict[str, Any]: 操作结果和文件信息
@@ -312,13 +310,21 @@ class FileSystemTool(ToolBase):
             # 自动上传到云端
             if auto_upload:
                 try:
-                    upload_result = self.upload_file_to_cloud(file_path)
-                    if upload_result["status"] == "success":
-                        result["cloud_url"] = upload_result["url"]
-                        result["file_id"] = upload_result.get("file_id")
-                        result["message"] += "，已上传到云端"
+                    from sagents.config.settings import get_settings
+                    upload_queue = get_cloud_upload_queue(self.default_upload_url, self.default_headers)
+                    if get_settings().tool.async_upload:
+                        # 加入后台队列，多次写入同一文件只上传最终内容
+                        upload_status = upload_queue.submit(file_path)
+                        result["cloud_upload"] = {"status": upload_status["status"]}
+                        result["message"] += "，已加入云端上传队列"
                     else:
-                        result["upload_error"] = upload_result["message"]
+                        upload_status = upload_queue.upload_now(file_path)
+                        if upload_status["url"] and upload_status["status"] != "failed":
+                            result["cloud_url"] = upload_status["url"]
+                            result["file_id"] = upload_status["file_id"]
+                            result["message"] += "，已上传到云端"
+                        else:
+                            result["upload_error"] = upload_status["error"]
                 except Exception as e:
                     result["upload_error"] = f"云端上传失败: {str(e)}"
             
@@ -350,63 +356,54 @@ class FileSystemTool(ToolBase):
             if not os.path.exists(file_path):
                 return {"status": "error", "message": "文件不存在"}
             
-            # 获取文件信息
-            file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
-            file_size_mb = file_size / (1024 * 1024)
-            
-            # 检查文件大小（限制100MB）
-            if file_size > 100 * 1024 * 1024:
-                return {"status": "error", "message": "文件过大，超过100MB限制"}
-            
-            # 准备上传
-            url = self.default_upload_url
-            headers = self.default_headers
-            
-            # 发起上传请求
-            upload_start_time = time.time()
-            with open(file_path, 'rb') as f:
-                files = {'file': (file_name, f, 'application/octet-stream')}
-                response = requests.post(url, headers=headers, files=files, timeout=60)
-            
-            upload_time = time.time() - upload_start_time
-            response.raise_for_status()
-            
-            # 处理响应
-            json_data = response.json()
-            file_url = json_data.get('data', {}).get('url')
-            file_id = json_data.get('data', {}).get('fileId')
-            
-            if not file_url:
-                return {
-                    "status": "error", 
-                    "message": "API返回成功但缺少文件URL",
-                    "response": json_data
-                }
-            
-            total_time = time.time() - start_time
+            # 与file_write共用上传队列：内容与上次上传相同时直接返回已有链接
+            upload_queue = get_cloud_upload_queue(self.default_upload_url, self.default_headers)
+            upload_status = upload_queue.upload_now(file_path)
+            if upload_status["status"] == "failed" or not upload_status["url"]:
+                return {"status": "error", "message": upload_status["error"] or "上传失败"}
             
+            file_size = os.path.getsize(file_path)
             return {
                 "status": "success", 
-                "message": "文件上传成功", 
-                "url": file_url,
-                "file_id": file_id,
-                "file_name": file_name,
+                "message": "文件内容未变化，返回已上传的文件" if upload_status["status"] == "unchanged" else "文件上传成功",
+                "url": upload_status["url"],
+                "file_id": upload_status["file_id"],
+                "file_name": os.path.basename(file_path),
                 "file_size": file_size,
-                "file_size_mb": file_size_mb,
-                "upload_time": upload_time,
-                "total_time": total_time,
+                "file_size_mb": file_size / (1024 * 1024),
+                "total_time": time.time() - start_time,
                 "operation_id": operation_id
             }
                 
-        except requests.exceptions.Timeout:
-            return {"status": "error", "message": "上传超时"}
-        except requests.exceptions.RequestException as e:
-            return {"status": "error", "message": f"网络请求失败: {str(e)}"}
         except Exception as e:
             logger.error(f"💥 上传异常 [{operation_id}] - 错误: {str(e)}")
             return {"status": "error", "message": f"上传失败: {str(e)}"}
 
+    @ToolBase.tool()
+    def get_cloud_upload_status(self, file_path: str, wait_seconds: float = 0) -> Dict[str, Any]:
+        """查询 file_write 自动上传的状态和云端链接
+
+        Args:
+            file_path (str): 文件绝对路径
+            wait_seconds (float): 上传未完成时最多等待的秒数，默认0表示不等待
+
+        Returns:
+            Dict[str, Any]: 上传状态（pending/uploading/uploaded/unchanged/failed）、云端链接和错误信息
+        """
+        validation = SecurityValidator.validate_path(file_path)
+        if not validation["valid"]:
+            return {"status": "error", "message": validation["error"]}
+        file_path = validation["resolved_path"]
+        
+        upload_queue = get_cloud_upload_queue(self.default_upload_url, self.default_headers)
+        if wait_seconds > 0:
+            upload_status = upload_queue.wait(file_path, timeout=wait_seconds)
+        else:
+            upload_status = upload_queue.get_status(file_path)
+        if upload_status is None:
+            return {"status": "error", "message": "该文件没有上传记录"}
+        return {"status": "success", "upload": upload_status}
+
     @ToolBase.tool()
     def download_file_from_url(self, url: str, working_dir: str) -> Dict[str, Any]:
         """从URL下载文件并保存到指定目录
@@ -418,6 +415,7 @@ class FileSystemTool(ToolBase):
         Returns:
             Dict[str, Any]: 下载结果，包含保存的文件路径
         """
+        import requests
         start_time = time.time()
         operation_id = hashlib.md5(f"download_{url}_{time.time()}".encode()).hexdigest()[:8]
         logger.info(f"📥 download_file_from_url开始执行 [{operation_id}] - URL: {url}")
@@ -427,64 +425,30 @@ class FileSystemTool(ToolBase):
             if not os.path.exists(working_dir):
                 return {"status": "error", "message": f"工作目录不存在: {working_dir}"}
             
-            # 发起HTTP请求下载文件
-            download_start_time = time.time()
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            download_time = time.time() - download_start_time
-            
-            # 获取文件大小
-            content_length = len(response.content)
-            content_size_mb = content_length / (1024 * 1024)
-            
-            # 解码URL并获取文件名
-            decoded_url = urllib.parse.unquote(url)
-            file_name = os.path.basename(decoded_url)
-            
-            # 如果文件名为空，使用默认名称
-            if not file_name or file_name in ['/', '\\']:
-                file_name = f"downloaded_file_{operation_id}"
-            
-            # 构建完整文件路径
-            file_path = os.path.join(working_dir, file_name)
-            
-            # 检查文件是否已存在，如果存在则添加后缀
-            original_file_path = file_path
-            counter = 1
-            while os.path.exists(file_path):
-                name, ext = os.path.splitext(original_file_path)
-                file_path = f"{name}_{counter}{ext}"
-                counter += 1
-            
-            # 保存文件
-            save_start_time = time.time()
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            save_time = time.time() - save_start_time
-            
-            # 验证文件是否保存成功
-            if not os.path.exists(file_path):
-                return {"status": "error", "message": f"文件保存失败: {file_path}"}
-            
-            saved_size = os.path.getsize(file_path)
-            if saved_size != content_length:
-                logger.warning(f"⚠️ 文件大小不匹配 [{operation_id}] - 下载: {content_length}, 保存: {saved_size}")
+            # 流式写入磁盘，支持断点续传、大文件分段并行下载、大小限制和按内容去重
+            download_result = get_file_downloader().download(url, working_dir)
+            file_path = download_result["file_path"]
+            file_size = download_result["file_size"]
             
             total_time = time.time() - start_time
             
             return {
                 "status": "success",
-                "message": "文件下载成功",
+                "message": "文件已存在，复用工作目录中内容相同的文件" if download_result["deduplicated"] else "文件下载成功",
                 "file_path": file_path,
-                "file_name": file_name,
-                "file_size": saved_size,
-                "file_size_mb": content_size_mb,
-                "download_time": download_time,
-                "save_time": save_time,
+                "file_name": os.path.basename(file_path),
+                "file_size": file_size,
+                "file_size_mb": file_size / (1024 * 1024),
+                "sha256": download_result["sha256"],
+                "deduplicated": download_result["deduplicated"],
+                "resumed": download_result["resumed"],
+                "segments": download_result["segments"],
                 "total_time": total_time,
                 "operation_id": operation_id
             }
             
+        except DownloadError as e:
+            return {"status": "error", "message": str(e)}
         except requests.exceptions.HTTPError as e:
             return {"status": "error", "message": f"HTTP错误: {e.response.status_code}"}
         except requests.exceptions.RequestException as e:
@@ -539,7 +503,8 @@ class FileSystemTool(ToolBase):
 
     @ToolBase.tool()
     def search_and_replace(self, file_path: str, search_pattern: str, replacement: str, 
-                          use_regex: bool = False, case_sensitive: bool = True) -> Dict[str, Any]:
+                          use_regex: bool = False, case_sensitive: bool = True,
+                          dry_run: bool = False) -> Dict[str, Any]:
         """在文件中搜索并替换文本
 
         Args:
@@ -548,6 +513,7 @@ class FileSystemTool(ToolBase):
             replacement (str): 替换文本
             use_regex (bool): 是否使用正则表达式
             case_sensitive (bool): 是否区分大小写
+            dry_run (bool): 为True时只预览匹配位置和替换结果，不修改文件
 
         Returns:
             Dict[str, Any]: 替换结果统计
@@ -561,44 +527,31 @@ class FileSystemTool(ToolBase):
             file_path = validation["resolved_path"]
             
             # 检查文件
-            file_info = FileMetadata.get_file_info(file_path)
-            if not file_info["exists"] or not file_info["is_file"]:
+            if not os.path.isfile(file_path):
                 return {"status": "error", "message": "文件不存在或不是有效文件"}
             
-            # 读取文件
-            encoding = file_info.get("encoding", "utf-8")
-            with open(file_path, 'r', encoding=encoding) as f:
-                original_content = f.read()
-            
-            # 执行搜索替换
-            if use_regex:
-                flags = 0 if case_sensitive else re.IGNORECASE
-                pattern = re.compile(search_pattern, flags)
-                new_content, replace_count = pattern.subn(replacement, original_content)
-            else:
-                if case_sensitive:
-                    new_content = original_content.replace(search_pattern, replacement)
-                    replace_count = original_content.count(search_pattern)
-                else:
-                    pattern = re.compile(re.escape(search_pattern), re.IGNORECASE)
-                    new_content, replace_count = pattern.subn(replacement, original_content)
+            # 流式读取并写入临时文件，完成后原子替换原文件
+            encoding = FileMetadata._detect_encoding(file_path)
+            replace_result = stream_replace_file(file_path, search_pattern, replacement,
+                                                 use_regex=use_regex, case_sensitive=case_sensitive,
+                                                 encoding=encoding, dry_run=dry_run)
+            replace_count = replace_result["replacements"]
             
-            # 写入修改后的内容
-            with open(file_path, 'w', encoding=encoding) as f:
-                f.write(new_content)
-            
-            return {
+            result = {
                 "status": "success",
-                "message": f"成功替换 {replace_count} 处匹配项",
+                "message": f"共找到 {replace_count} 处匹配项（预览模式，未修改文件）" if dry_run else f"成功替换 {replace_count} 处匹配项",
                 "statistics": {
                     "replacements": replace_count,
-                    "original_length": len(original_content),
-                    "new_length": len(new_content),
-                    "length_change": len(new_content) - len(original_content)
+                    "original_length": replace_result["original_length"],
+                    "new_length": replace_result["new_length"],
+                    "length_change": replace_result["new_length"] - replace_result["original_length"]
                 }
             }
+            if dry_run:
+                result["preview"] = replace_result["previews"]
+            return result
             
         except re.error as e:
             return {"status": "error", "message": f"正则表达式错误: {str(e)}"}
         except Exception as e:
-            return {"status": "error", "message": f"搜索替换失败: {str(e)}"} 
\ No newline at end of file
+            return {"status": "error", "message": f"搜索替换失败: {str(e)}"}
@@ -0,0 +1,213 @@
+"""
+工具参数校验器
+
+按工具的参数schema预先编译校验函数，在执行工具前校验并转换参数类型，
+参数错误时立即返回明确的错误信息，而不是在工具内部（或外部调用之后）才抛出异常。
+"""
+import json
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+# 单个字段的校验函数：(值, 字段路径) -> (转换后的值, 错误信息列表)
+FieldChecker = Callable[[Any, str], Tuple[Any, List[str]]]
+
+_TRUE_STRINGS = ('true', '1', 'yes', 'y', 'on')
+_FALSE_STRINGS = ('false', '0', 'no', 'n', 'off')
+
+
+def _coerce_string(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _coerce_integer(value: Any) -> Any:
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            try:
+                number = float(text)
+            except ValueError:
+                return value
+            return int(number) if number.is_integer() else value
+    return value
+
+
+def _coerce_number(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() and '.' not in value else number
+    return value
+
+
+def _coerce_boolean(value: Any) -> Any:
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE_STRINGS:
+            return True
+        if text in _FALSE_STRINGS:
+            return False
+    if isinstance(value, int) and not isinstance(value, bool) and value in (0, 1):
+        return bool(value)
+    return value
+
+
+def _coerce_json(value: Any, opening: str) -> Any:
+    if isinstance(value, str) and value.strip().startswith(opening):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+# 各JSON类型的 (类型转换, 类型判断)
+_TYPE_RULES: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any], bool]]] = {
+    'string': (_coerce_string, lambda v: isinstance(v, str)),
+    'integer': (_coerce_integer, lambda v: isinstance(v, int) and not isinstance(v, bool)),
+    'number': (_coerce_number, lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)),
+    'boolean': (_coerce_boolean, lambda v: isinstance(v, bool)),
+    'array': (lambda v: _coerce_json(v, '['), lambda v: isinstance(v, list)),
+    'object': (lambda v: _coerce_json(v, '{'), lambda v: isinstance(v, dict)),
+    'null': (lambda v: v, lambda v: v is None),
+}
+
+
+def _describe(value: Any) -> str:
+    text = json.dumps(value, ensure_ascii=False, default=str)
+    return text if len(text) <= 60 else text[:57] + '...'
+
+
+def compile_field_schema(schema: Dict[str, Any]) -> FieldChecker:
+    """
+    将单个字段的schema编译为校验函数
+
+    支持 type（含类型列表）、anyOf/oneOf、enum、数组的 items 以及对象的 properties/required。
+
+    Args:
+        schema: 字段的JSON schema
+
+    Returns:
+        FieldChecker: 校验函数
+    """
+    schema = schema or {}
+
+    variants = schema.get('anyOf') or schema.get('oneOf')
+    if variants:
+        checkers = [compile_field_schema(variant) for variant in variants]
+
+        def check_variants(value: Any, path: str) -> Tuple[Any, List[str]]:
+            # 先找无需转换即可通过的分支，再接受需要转换的分支
+            results = [checker(value, path) for checker in checkers]
+            for converted, errors in results:
+                if not errors and converted == value and type(converted) is type(value):
+                    return converted, []
+            for converted, errors in results:
+                if not errors:
+                    return converted, []
+            return value, [f"{path}: 值 {_describe(value)} 不符合任何允许的类型"]
+        return check_variants
+
+    types = schema.get('type')
+    types = [types] if isinstance(types, str) else list(types or [])
+    types = [t for t in types if t in _TYPE_RULES]
+    enum = schema.get('enum')
+    item_checker = compile_field_schema(schema['items']) if isinstance(schema.get('items'), dict) else None
+    property_checkers = {
+        name: compile_field_schema(sub_schema) for name, sub_schema in (schema.get('properties') or {}).items()
+    }
+    required = list(schema.get('required') or [])
+
+    def check(value: Any, path: str) -> Tuple[Any, List[str]]:
+        if types:
+            for type_name in types:
+                if _TYPE_RULES[type_name][1](value):
+                    break
+            else:
+                for type_name in types:
+                    coerce, is_type = _TYPE_RULES[type_name]
+                    converted = coerce(value)
+                    if is_type(converted):
+                        value = converted
+                        break
+                else:
+                    return value, [f"{path}: 期望类型 {'/'.join(types)}，实际为 {_describe(value)}"]
+
+        if enum is not None and value not in enum:
+            return value, [f"{path}: 值 {_describe(value)} 不在允许的取值 {_describe(enum)} 中"]
+
+        errors = []
+        if item_checker and isinstance(value, list):
+            items = []
+            for index, item in enumerate(value):
+                item, item_errors = item_checker(item, f"{path}[{index}]")
+                items.append(item)
+                errors.extend(item_errors)
+            value = items
+        if isinstance(value, dict) and (property_checkers or required):
+            value = dict(value)
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}.{name}: 缺少必填字段")
+            for name, checker in property_checkers.items():
+                if name in value:
+                    value[name], field_errors = checker(value[name], f"{path}.{name}")
+                    errors.extend(field_errors)
+        return value, errors
+    return check
+
+
+class ToolArgsValidator:
+    """预编译的工具参数校验器"""
+
+    def __init__(self,
+                 tool_name: str,
+                 parameters: Dict[str, Dict[str, Any]],
+                 required: Optional[List[str]] = None,
+                 allow_extra: bool = False):
+        """
+        编译工具参数schema
+
+        Args:
+            tool_name: 工具名称
+            parameters: 参数schema {参数名: 字段schema}
+            required: 必填参数列表
+            allow_extra: 是否允许schema之外的参数
+        """
+        self.tool_name = tool_name
+        self.required = list(required or [])
+        self.allow_extra = allow_extra
+        self._checkers = {name: compile_field_schema(schema) for name, schema in (parameters or {}).items()}
+
+    def validate(self, arguments: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        校验并转换工具参数
+
+        Args:
+            arguments: 模型给出的工具参数
+
+        Returns:
+            Tuple[Dict[str, Any], List[str]]: 转换后的参数和错误信息列表（为空表示校验通过）
+        """
+        errors = [f"{name}: 缺少必填参数" for name in self.required if arguments.get(name) is None]
+        converted = {}
+        for name, value in arguments.items():
+            checker = self._checkers.get(name)
+            if checker is None:
+                if not self.allow_extra:
+                    errors.append(f"{name}: 未知参数，可用参数为 {', '.join(self._checkers) or '无'}")
+                    continue
+                converted[name] = value
+            elif value is None and name not in self.required:
+                # 可选参数传入null时按未传处理，使用工具的默认值
+                continue
+            else:
+                converted[name], field_errors = checker(value, name)
+                errors.extend(field_errors)
+        return converted, errors
@@ -1,11 +1,33 @@
-from typing import Dict, Any, List, Callable, Optional, Type, Union
-from dataclasses import dataclass
-from mcp import StdioServerParameters
+from typing import Dict, Any, List, Callable, Optional, Type, Union, TYPE_CHECKING, get_args, get_origin
+from dataclasses import dataclass, field
 from sagents.utils.logger import logger
 import inspect
 import json
 from functools import wraps
-from docstring_parser import parse,DocstringStyle
+
+if TYPE_CHECKING:
+    # mcp导入较慢，只在用到MCP工具时才导入
+    from mcp import StdioServerParameters
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean",
+               dict: "object", list: "array", tuple: "array", set: "array"}
+
+def _annotation_to_schema(annotation: Any) -> Dict[str, Any]:
+    """将参数的类型注解转换为JSON schema（Optional[X] 按 X 处理，无法识别的类型按字符串处理）"""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            annotation = args[0]
+    base = get_origin(annotation) or annotation
+    json_type = _JSON_TYPES.get(base) if isinstance(base, type) else None
+    if json_type is None:
+        return {"type": "string"}
+    schema = {"type": json_type}
+    if json_type == "array":
+        item_args = get_args(annotation)
+        if len(item_args) == 1:
+            schema["items"] = _annotation_to_schema(item_args[0])
+    return schema
 
 @dataclass
 class SseServerParameters:
@@ -19,7 +41,7 @@ class McpToolSpec:
     parameters: Dict[str, Dict[str, Any]]  # Now includes description for each param
     required: List[str]
     server_name: str
-    server_params: Union[StdioServerParameters, SseServerParameters]
+    server_params: Union['StdioServerParameters', SseServerParameters]
 @dataclass
 class ToolSpec:
     name: str
@@ -28,6 +50,87 @@ class ToolSpec:
     parameters: Dict[str, Dict[str, Any]]  # Now includes description for each param
     required: List[str]
 
+class LazyToolSpec(ToolSpec):
+    """
+    延迟生成schema的ToolSpec
+
+    ToolBase.tool() 在类定义时只记录函数，首次访问 description/parameters/required 时
+    才解析docstring和函数签名，避免导入工具模块时为每个工具解析docstring。
+    """
+
+    def __init__(self, name: str, func: Callable):
+        self.name = name
+        self.func = func
+        self._schema: Optional[Dict[str, Any]] = None
+
+    def _get_schema(self) -> Dict[str, Any]:
+        if self._schema is None:
+            self._schema = _build_tool_schema(self.func)
+        return self._schema
+
+    @property
+    def schema_loaded(self) -> bool:
+        return self._schema is not None
+
+    def get_schema(self) -> Dict[str, Any]:
+        """返回 {description, parameters, required}，必要时解析docstring"""
+        return self._get_schema()
+
+    def load_schema(self, schema: Dict[str, Any]):
+        """使用已缓存的schema（如工具发现清单中的记录），跳过docstring解析"""
+        if self._schema is None:
+            self._schema = schema
+
+    @property
+    def description(self) -> str:
+        return self._get_schema()['description']
+
+    @property
+    def parameters(self) -> Dict[str, Dict[str, Any]]:
+        return self._get_schema()['parameters']
+
+    @property
+    def required(self) -> List[str]:
+        return self._get_schema()['required']
+
+def _build_tool_schema(func: Callable) -> Dict[str, Any]:
+    """根据函数的docstring和签名生成工具描述与参数schema"""
+    from docstring_parser import parse, DocstringStyle
+
+    # Parse full docstring using docstring_parser
+    docstring_text = inspect.getdoc(func) or ""
+    parsed_docstring = parse(docstring_text, style=DocstringStyle.GOOGLE)
+
+    # Use parsed description if available
+    parsed_description = parsed_docstring.short_description or ""
+    if parsed_docstring.long_description:
+        parsed_description += "\n" + parsed_docstring.long_description
+
+    # Extract parameters from signature
+    sig = inspect.signature(func)
+    param_docs = {doc_param.arg_name: doc_param.description for doc_param in parsed_docstring.params}
+    parameters = {}
+    required = []
+
+    for name, param in sig.parameters.items():
+        # session_id 由ToolManager按调用方会话注入，不由模型填写
+        if name in ("self", "session_id"):
+            continue
+
+        param_info = {"type": "string", "description": ""}  # Default values
+        if param.annotation != inspect.Parameter.empty:
+            param_info.update(_annotation_to_schema(param.annotation))
+
+        # Use docstring description if available, otherwise default
+        param_info["description"] = param_docs.get(name) or f"The {name} parameter"
+
+        if param.default == inspect.Parameter.empty:
+            required.append(name)
+
+        parameters[name] = param_info
+
+    return {'description': parsed_description, 'parameters': parameters, 'required': required}
+
 @dataclass
 class AgentToolSpec:
     name: str
@@ -36,6 +139,63 @@ class AgentToolSpec:
     parameters: Dict[str, Dict[str, Any]]
     required: List[str]
 
+@dataclass
+class ToolResult:
+    """
+    工具执行结果
+
+    保存工具返回的原始内容（不预先序列化）与元数据，
+    只在交给LLM（to_llm_content）或对外传输（to_dict）时序列化一次，且不缩进。
+    """
+    tool_name: str
+    content: Any = None
+    error_type: Optional[str] = None  # 不为None表示执行失败
+    message: Optional[str] = None  # 失败原因
+    exception_detail: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)  # 与content一起交给LLM的附加字段（如截断信息）
+    metadata: Dict[str, Any] = field(default_factory=dict)  # 只在内部使用的元数据（如执行耗时）
+    _llm_content: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def is_error(self) -> bool:
+        return self.error_type is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为传输用的字典（不序列化content）"""
+        if self.is_error:
+            error_response = {
+                "error": True,
+                "error_type": self.error_type,
+                "message": self.message,
+                "tool_name": self.tool_name,
+                "timestamp": self.metadata.get('timestamp')
+            }
+            if self.exception_detail:
+                error_response["exception_detail"] = self.exception_detail
+            return error_response
+        return {"content": self.content, **self.extra}
+
+    def to_llm_content(self) -> str:
+        """序列化为交给LLM的JSON字符串，结果会被缓存"""
+        if self._llm_content is None:
+            self._llm_content = json.dumps(self.to_dict(), ensure_ascii=False, default=str)
+        return self._llm_content
+
+    def content_text(self) -> str:
+        """content的文本形式，用于写入文件等需要完整文本的场景"""
+        if isinstance(self.content, str):
+            return self.content
+        return json.dumps(self.content, ensure_ascii=False, indent=2, default=str)
+
+    def replace_content(self, content: Any, **extra):
+        """替换content与附加字段，并清除序列化缓存"""
+        self.content = content
+        self.extra = extra
+        self._llm_content = None
+
+    def __str__(self) -> str:
+        return self.to_llm_content()
+
 class ToolBase:
     _tools: Dict[str, ToolSpec] = {}  # Class-level registry
     
@@ -49,78 +209,15 @@ class ToolBase:
                 self.tools[name] = spec
                 if name not in self.__class__._tools:
                     self.__class__._tools[name] = spec
-                logger.info(f"Registered tool: {name} to {self.__class__.__name__}")
-                print(f"Registered tool: {name} to {self.__class__.__name__}")
+                logger.debug(f"Registered tool: {name} to {self.__class__.__name__}")
     
     @classmethod
     def tool(cls):
         """Decorator factory for registering tool methods"""
         def decorator(func):
-            logger.debug(f"Applying tool decorator to {func.__name__} in {cls.__name__}")
-            # Parse full docstring using docstring_parser
-            docstring_text = inspect.getdoc(func) or ""
-            parsed_docstring = parse(docstring_text,style=DocstringStyle.GOOGLE)
-            
-            # Use parsed description if available
-            parsed_description = parsed_docstring.short_description or ""
-            if parsed_docstring.long_description:
-                parsed_description += "\n" + parsed_docstring.long_description
-            
-            # Extract parameters from signature
-            sig = inspect.signature(func)
-            parameters = {}
-            required = []
-            
-            for name, param in sig.parameters.items():
-                if name == "self":
-                    continue
-                    
-                param_info = {"type": "string", "description": ""}  # Default values
-                if param.annotation != inspect.Parameter.empty:
-                    type_name = param.annotation.__name__.lower()
-                    if type_name == "str":
-                        param_info["type"] = "string"
-                    elif type_name == "int":
-                        param_info["type"] = "integer"
-                    elif type_name == "float":
-                        param_info["type"] = "number"
-                    elif type_name == "bool":
-                        param_info["type"] = "boolean"
-                    elif type_name == "dict":
-                        param_info["type"] = "object"
-                    elif type_name == "list":
-                        param_info["type"] = "array"
-                
-                # Get parameter description from parsed docstring
-                param_desc = ""
-                for doc_param in parsed_docstring.params:
-                    logger.debug(f"Checking param: {doc_param.arg_name} vs {name}")
-                    print(f"Checking param: {doc_param.arg_name} vs {name}")
-                    if doc_param.arg_name == name:
-                        param_desc = doc_param.description
-                        logger.debug(f"Found param description: {param_desc}")
-                        print(f"Found param description: {param_desc}")
-                        break
-                
-                # Use docstring description if available, otherwise default
-                param_info["description"] = param_desc or f"The {name} parameter"
-                logger.debug(f"Final param description for {name}: {param_info['description']}")
-                print(f"Final param description for {name}: {param_info['description']}")
-                
-                if param.default == inspect.Parameter.empty:
-                    required.append(name)
-                
-                parameters[name] = param_info
-            
-            # Always use function name as tool name
+            # 只记录函数，schema在首次使用时生成
             tool_name = func.__name__
-            spec = ToolSpec(
-                name=tool_name,
-                description=parsed_description or "",
-                func=func,
-                parameters=parameters,
-                required=required
-            )
+            spec = LazyToolSpec(name=tool_name, func=func)
             
             @wraps(func)
             def wrapper(*args, **kwargs):
@@ -144,8 +241,6 @@ class ToolBase:
                     cls._tools = {}
                 cls._tools[tool_name] = spec
             
-            logger.info(f"Registered tool to toolbase: {tool_name}")
-            print(f"Registered tool to toolbase: {tool_name} ")
             return wrapper
         return decorator
 
@@ -0,0 +1,284 @@
+"""
+工具发现清单
+
+缓存工具包的自动发现结果：以各模块文件的 mtime/大小 为键，记录每个模块中定义的工具类和工具schema。
+同一进程内再次发现时直接复用已发现的工具类和实例；新进程启动时读取磁盘清单，
+跳过不包含工具类的模块，并直接使用记录的schema，不再解析docstring。
+schema由 tool_base 中的解析逻辑生成，清单同时记录 tool_base.py 的内容哈希，解析逻辑变化后整个清单失效。
+MCP服务器发现的工具按服务器缓存，连接失败的服务器不缓存，下次创建ToolManager时重试。
+"""
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import pkgutil
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Type
+
+from .tool_base import ToolBase, LazyToolSpec
+from sagents.utils.logger import logger
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE_NAME = 'tool_manifest.json'
+
+# 模块指纹：{模块名: [mtime_ns, 文件大小]}
+Fingerprint = Dict[str, List[int]]
+
+# 进程内缓存：{包路径: (指纹, 工具类列表)}
+_discovery_cache: Dict[str, Tuple[Fingerprint, List[Type[ToolBase]]]] = {}
+# 进程内共享的工具实例，多个ToolManager复用同一个实例
+_shared_instances: Dict[type, ToolBase] = {}
+# MCP工具缓存：{(服务器名, 服务器配置): 工具规格列表}，只缓存成功完成发现的服务器
+_mcp_cache: Dict[Tuple[str, str], List[Any]] = {}
+_lock = threading.RLock()
+
+
+def _stat_key(path: Path) -> Optional[List[int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def scan_tool_modules(package_path: Path) -> Fingerprint:
+    """
+    列出包中需要扫描的模块及其文件指纹（只stat文件，不导入）
+
+    Args:
+        package_path: 工具包目录
+
+    Returns:
+        Fingerprint: {模块名: [mtime_ns, 文件大小]}
+    """
+    fingerprint = {}
+    for _, module_name, is_pkg in pkgutil.iter_modules([str(package_path)]):
+        # __pycache__ 中有 __init__.*.pyc，会被pkgutil当作包列出
+        if module_name.startswith('__') or module_name == 'tool_base' or module_name.endswith('_base'):
+            continue
+        module_file = package_path / module_name / '__init__.py' if is_pkg else package_path / f'{module_name}.py'
+        fingerprint[module_name] = _stat_key(module_file) or [0, 0]
+    return fingerprint
+
+
+def get_schema_builder_hash() -> str:
+    """
+    计算生成工具schema的 tool_base.py 的内容哈希
+
+    Returns:
+        str: 十六进制摘要，文件无法读取时返回空字符串
+    """
+    try:
+        with open(sys.modules[ToolBase.__module__].__file__, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (OSError, AttributeError, TypeError):
+        return ''
+
+
+def get_manifest_path(package_path: Path) -> Optional[str]:
+    """
+    获取工具发现清单的路径，未启用清单时返回None
+
+    Args:
+        package_path: 工具包目录
+
+    Returns:
+        Optional[str]: 清单文件路径，默认保存在工具包的 __pycache__ 目录下
+    """
+    from sagents.config.settings import get_settings
+    tool_config = get_settings().tool
+    if not tool_config.enable_discovery_manifest:
+        return None
+    if tool_config.discovery_manifest_dir:
+        name = f"{Path(package_path).name}_{MANIFEST_FILE_NAME}"
+        return os.path.join(tool_config.discovery_manifest_dir, name)
+    return str(Path(package_path) / '__pycache__' / MANIFEST_FILE_NAME)
+
+
+def load_manifest(manifest_path: Optional[str]) -> Dict[str, Any]:
+    """
+    读取工具发现清单，文件不存在、损坏、版本不一致或schema解析逻辑已变化时返回空清单
+
+    Args:
+        manifest_path: 清单文件路径
+
+    Returns:
+        Dict[str, Any]: {模块名: {"fingerprint", "classes", "tools"}}
+    """
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"ToolDiscovery: 读取工具发现清单失败，将重新扫描: {e}")
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    if manifest.get('schema_builder') != get_schema_builder_hash():
+        logger.debug("ToolDiscovery: tool_base.py 已变化，清单中的schema失效")
+        return {}
+    return manifest.get('modules', {})
+
+
+def save_manifest(manifest_path: Optional[str], modules: Dict[str, Any]):
+    """
+    写入工具发现清单（先写临时文件再替换，写入失败只记录日志）
+
+    Args:
+        manifest_path: 清单文件路径
+        modules: {模块名: {"fingerprint", "classes", "tools"}}
+    """
+    if not manifest_path:
+        return
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'schema_builder': get_schema_builder_hash(),
+                       'modules': modules}, f, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        logger.debug(f"ToolDiscovery: 无法写入工具发现清单 {manifest_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _find_tool_classes(module) -> List[Type[ToolBase]]:
+    return [obj for _, obj in inspect.getmembers(module)
+            if inspect.isclass(obj) and issubclass(obj, ToolBase) and obj is not ToolBase]
+
+
+def _class_key(tool_class: type) -> str:
+    return f"{tool_class.__module__}.{tool_class.__qualname__}"
+
+
+def _tool_specs(tool_class: type) -> Dict[str, LazyToolSpec]:
+    return {name: spec for name, spec in get_shared_tool_instance(tool_class).tools.items()
+            if isinstance(spec, LazyToolSpec)}
+
+
+def discover_tool_classes(package_path: Path, full_package_name: str) -> List[Type[ToolBase]]:
+    """
+    发现工具包中的工具类，优先使用进程内缓存和磁盘清单
+
+    Args:
+        package_path: 工具包目录
+        full_package_name: 工具包的完整包名（如 sagents.tool）
+
+    Returns:
+        List[Type[ToolBase]]: 按模块顺序去重后的工具类列表
+    """
+    package_path = Path(package_path)
+    cache_key = str(package_path.resolve())
+    fingerprint = scan_tool_modules(package_path)
+    with _lock:
+        cached = _discovery_cache.get(cache_key)
+        if cached and cached[0] == fingerprint:
+            logger.debug(f"ToolDiscovery: 复用进程内的工具发现结果: {full_package_name}")
+            return list(cached[1])
+
+        manifest_path = get_manifest_path(package_path)
+        manifest = load_manifest(manifest_path)
+        modules = {}
+        tool_classes: List[Type[ToolBase]] = []
+        skipped = 0
+        for module_name, module_fingerprint in fingerprint.items():
+            entry = manifest.get(module_name)
+            if entry and entry.get('fingerprint') == module_fingerprint and not entry.get('classes'):
+                # 清单记录该模块没有工具类且文件未变化，无需导入
+                modules[module_name] = entry
+                skipped += 1
+                continue
+            try:
+                module = importlib.import_module(f'.{module_name}', full_package_name)
+            except ImportError as e:
+                logger.error(f"Error importing module {module_name}: {e}")
+                continue
+            classes = _find_tool_classes(module)
+            cached_tools = entry.get('tools', {}) if entry and entry.get('fingerprint') == module_fingerprint else {}
+            tools = {}
+            for tool_class in classes:
+                if tool_class not in tool_classes:
+                    tool_classes.append(tool_class)
+                for tool_name, spec in _tool_specs(tool_class).items():
+                    schema = cached_tools.get(tool_name)
+                    if schema is not None:
+                        spec.load_schema(schema)
+                    if manifest_path:
+                        tools[tool_name] = spec.get_schema()
+            modules[module_name] = {
+                'fingerprint': module_fingerprint,
+                'classes': [_class_key(tool_class) for tool_class in classes],
+                'tools': tools
+            }
+
+        if manifest_path and modules != manifest:
+            save_manifest(manifest_path, modules)
+        _discovery_cache[cache_key] = (fingerprint, tool_classes)
+        logger.info(f"ToolDiscovery: 在 {full_package_name} 中发现 {len(tool_classes)} 个工具类，"
+                    f"根据清单跳过 {skipped} 个模块")
+        return list(tool_classes)
+
+
+def get_shared_tool_instance(tool_class: Type[ToolBase]) -> ToolBase:
+    """
+    获取进程内共享的工具实例，首次调用时创建
+
+    Args:
+        tool_class: 工具类
+
+    Returns:
+        ToolBase: 工具实例
+    """
+    with _lock:
+        instance = _shared_instances.get(tool_class)
+        if instance is None:
+            instance = tool_class()
+            _shared_instances[tool_class] = instance
+        return instance
+
+
+def _mcp_server_key(server_name: str, config: Dict[str, Any]) -> Tuple[str, str]:
+    return server_name, json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def get_cached_mcp_tools(server_name: str, config: Dict[str, Any]) -> Optional[List[Any]]:
+    """
+    获取已从MCP服务器发现的工具规格，服务器配置变化后失效
+
+    Args:
+        server_name: MCP服务器名
+        config: 服务器配置
+
+    Returns:
+        Optional[List[Any]]: 工具规格列表，该服务器没有成功发现过时返回None
+    """
+    with _lock:
+        cached = _mcp_cache.get(_mcp_server_key(server_name, config))
+    return list(cached) if cached is not None else None
+
+
+def cache_mcp_tools(server_name: str, config: Dict[str, Any], tool_specs: List[Any]):
+    """
+    缓存从MCP服务器发现的工具规格，同一进程内再次创建ToolManager时不必重新连接该服务器；
+    只应在该服务器成功完成发现后调用，连接失败的服务器不缓存，以便下次重试
+
+    Args:
+        server_name: MCP服务器名
+        config: 服务器配置
+        tool_specs: 工具规格列表
+    """
+    with _lock:
+        _mcp_cache[_mcp_server_key(server_name, config)] = list(tool_specs)
+
+
+def clear_discovery_cache():
+    """清除进程内的工具发现缓存、共享工具实例和MCP工具缓存（磁盘清单按指纹自动失效）"""
+    with _lock:
+        _discovery_cache.clear()
+        _shared_instances.clear()
+        _mcp_cache.clear()
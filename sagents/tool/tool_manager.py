@@ -1,21 +1,80 @@
-from typing import Dict, Any, List, Type, Optional, Union
-from .tool_base import ToolBase, ToolSpec, McpToolSpec,SseServerParameters,AgentToolSpec
+from __future__ import annotations
+
+from typing import Dict, Any, List, Type, Optional, Union, Iterable, Iterator, TYPE_CHECKING
+from collections.abc import MutableMapping
+from .tool_base import ToolBase, ToolSpec, McpToolSpec,SseServerParameters,AgentToolSpec,ToolResult
+from .tool_args_validator import ToolArgsValidator
+from .tool_discovery import discover_tool_classes, get_shared_tool_instance, get_cached_mcp_tools, cache_mcp_tools
 from sagents.utils.logger import logger
+from sagents.utils.session_budget import get_session_budget
+from sagents.utils.tool_result_store import apply_result_size_policy
+from sagents.utils.tool_result_cache import get_tool_result_cache
 import importlib
-import pkgutil
 from pathlib import Path
 import inspect
 import json
 import asyncio
-from mcp import StdioServerParameters
-from mcp.client.stdio import stdio_client
-from mcp.client.sse import sse_client
-from mcp import ClientSession, Tool
-from mcp.types import CallToolResult
 import traceback
 import time
 import os,sys
 
+if TYPE_CHECKING:
+    # mcp导入较慢，只在连接MCP服务器或执行MCP工具时才导入
+    from mcp import StdioServerParameters, ClientSession, Tool
+    from mcp.types import CallToolResult
+
+
+class ToolNamespace(MutableMapping):
+    """
+    工具注册表的过滤视图
+
+    读取时透传到底层注册表（按 include/exclude 过滤），写入只保存在视图自身，
+    创建视图不复制任何工具，底层注册表后续注册的工具对视图立即可见。
+    """
+
+    def __init__(self, base: Dict[str, Any], include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None):
+        self._base = base
+        self._include = set(include) if include is not None else None
+        self._exclude = set(exclude or [])
+        self._local: Dict[str, Any] = {}
+
+    def _visible(self, name: str) -> bool:
+        if name in self._exclude:
+            return False
+        return self._include is None or name in self._include
+
+    def __getitem__(self, name: str):
+        if name in self._local:
+            return self._local[name]
+        if self._visible(name):
+            return self._base[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name: str, spec: Any):
+        self._local[name] = spec
+
+    def __delitem__(self, name: str):
+        if name in self._local:
+            del self._local[name]
+        elif name in self._base and self._visible(name):
+            self._exclude.add(name)
+        else:
+            raise KeyError(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._local or (name in self._base and self._visible(name))
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self._base:
+            if name not in self._local and self._visible(name):
+                yield name
+        yield from self._local
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
 class ToolManager:
     def __init__(self, is_auto_discover=True):
         """初始化工具管理器"""
@@ -33,17 +92,43 @@ class ToolManager:
         self.tools: Dict[str, Union[ToolSpec, McpToolSpec, AgentToolSpec]] = {}
         self._mcp_sessions: Dict[str, Dict[str, Union[ClientSession]]] = {}  # {session_id: {server_name: session}}
         self._tool_instances: Dict[type, ToolBase] = {}  # 缓存工具实例
+        self._args_validators: Dict[str, ToolArgsValidator] = {}  # 按工具名缓存预编译的参数校验器
         
         if is_auto_discover:
             self._auto_discover_tools()
             self._mcp_setting_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'mcp_servers', 'mcp_setting.json')
             # 在测试环境中，我们不希望自动发现MCP工具
             if not os.environ.get('TESTING'):
-                logger.debug("Not in testing environment, discovering MCP tools")
-                asyncio.run(self._discover_mcp_tools(mcp_setting_path=self._mcp_setting_path))
+                # 同一进程内已成功发现且配置未变化的服务器直接复用工具规格，只连接其余服务器
+                pending_servers = self._register_cached_mcp_servers(self._load_mcp_servers(self._mcp_setting_path))
+                if pending_servers:
+                    logger.debug("Not in testing environment, discovering MCP tools")
+                    asyncio.run(self._discover_mcp_tools(mcp_setting_path=self._mcp_setting_path,
+                                                         servers=pending_servers))
             else:
                 logger.debug("In testing environment, skipping MCP tool discovery")
 
+    def create_view(self, include: Optional[Iterable[str]] = None,
+                    exclude: Optional[Iterable[str]] = None) -> 'ToolManager':
+        """
+        创建过滤后的工具管理器视图
+
+        视图与当前管理器共享工具注册表、工具实例、参数校验器、MCP会话和执行统计，
+        只是可见的工具不同；创建开销与工具数量无关，适合按会话或按智能体裁剪工具集。
+        在视图上注册的工具只对该视图可见。
+
+        Args:
+            include: 只保留这些工具，为None时保留全部
+            exclude: 需要排除的工具
+
+        Returns:
+            ToolManager: 工具管理器视图
+        """
+        view = object.__new__(type(self))
+        view.__dict__.update(self.__dict__)
+        view.tools = ToolNamespace(self.tools, include=include, exclude=exclude)
+        return view
+
     def discover_tools_from_path(self, path: str):
         """Discover and register tools from a custom path
         
@@ -95,6 +180,7 @@ class ToolManager:
             await self._register_mcp_tools_sse(server_name, server_params)
         else:
             logger.debug(f"Registering stdio server {server_name} with command: {config['command']}")
+            from mcp import StdioServerParameters
             server_params = StdioServerParameters(
                 command=config['command'],
                 args=config.get('args', []),
@@ -127,30 +213,25 @@ class ToolManager:
         if str(sys_package_path) not in sys.path:
             sys.path.append(str(sys_package_path))
             logger.info(f"Added path to sys.path: {sys_package_path}")
-        for _, module_name, _ in pkgutil.iter_modules([str(package_path)]):
-            if module_name == 'tool_base' or module_name.endswith('_base'):
-                logger.debug(f"Skipping base module: {module_name}")
-                continue
-            try:
-                logger.info(f"Attempting to import module: {module_name}")
-                module = importlib.import_module(f'.{module_name}', full_package_name)
-                for _, obj in inspect.getmembers(module):
-                    if inspect.isclass(obj) and issubclass(obj, ToolBase):
-                        logger.info(f"Found tool class: {obj.__name__}")
-                        self.register_tool_class(obj)
-            except ImportError as e:
-                traceback.print_exc()
-                logger.error(f"Error importing module {module_name}: {e}")
-                continue
+        # 发现结果按模块mtime缓存在进程内和磁盘清单中，工具实例在进程内共享
+        for tool_class in discover_tool_classes(package_path, full_package_name):
+            logger.debug(f"Found tool class: {tool_class.__name__}")
+            self.register_tool_class(tool_class, get_shared_tool_instance(tool_class))
         logger.info(f"Auto-discovery completed with {len(self.tools)} total tools")
         # 将package_path 从sys.path 中移除
         if str(sys_package_path) in sys.path:
             sys.path.remove(str(sys_package_path))
             logger.info(f"Removed package path from sys.path: {sys_package_path}")
-    def register_tool_class(self, tool_class: Type[ToolBase]):
-        """Register all tools from a ToolBase subclass"""
+    def register_tool_class(self, tool_class: Type[ToolBase], tool_instance: Optional[ToolBase] = None):
+        """Register all tools from a ToolBase subclass
+
+        Args:
+            tool_class: ToolBase subclass
+            tool_instance: Existing instance to reuse, a new one is created if None
+        """
         logger.info(f"Registering tools from class: {tool_class.__name__}")
-        tool_instance = tool_class()
+        if tool_instance is None:
+            tool_instance = tool_class()
         # 缓存工具实例，以便后续执行时重用
         self._tool_instances[tool_class] = tool_instance
         instance_tools = tool_instance.tools
@@ -180,50 +261,92 @@ class ToolManager:
             return False
         
         self.tools[tool_spec.name] = tool_spec
+        self._args_validators.pop(tool_spec.name, None)
         logger.info(f"Successfully registered tool: {tool_spec.name}")
         print(f"Registered tool to manager: {tool_spec.name}")
         return True
 
-    async def _discover_mcp_tools(self,mcp_setting_path: str = None):
-        """Discover and register tools from MCP servers"""
+    def _load_mcp_servers(self, mcp_setting_path: str) -> Dict[str, dict]:
+        """Load enabled MCP server configs from the settings file"""
         logger.info(f"Discovering MCP tools from settings file: {mcp_setting_path}")
         if os.path.exists(mcp_setting_path)==False:
             logger.warning(f"MCP setting file not found: {mcp_setting_path}")
             print(f"MCP setting file not found: {mcp_setting_path}")
-            return
+            return {}
         try:
             with open(mcp_setting_path) as f:
                 mcp_config = json.load(f)
                 logger.debug(f"Loaded MCP config with {len(mcp_config.get('mcpServers', {}))} servers")
                 print('mcp_config',mcp_config)
-            
-            for server_name, config in mcp_config.get('mcpServers', {}).items():
-                logger.debug(f"Processing MCP server config for {server_name}")
-                print(f"Loading MCP server config for {server_name}: {config}")
-                if config.get('disabled', False):
-                    logger.debug(f"Skipping disabled MCP server: {server_name}")
-                    print(f"Skipping disabled MCP server: {server_name}")
-                    continue
-                
+        except Exception as e:
+            logger.error(f"Error loading MCP config: {str(e)}")
+            print(f"Error loading MCP config: {e}")
+            return {}
+
+        servers = {}
+        for server_name, config in mcp_config.get('mcpServers', {}).items():
+            logger.debug(f"Processing MCP server config for {server_name}")
+            print(f"Loading MCP server config for {server_name}: {config}")
+            if config.get('disabled', False):
+                logger.debug(f"Skipping disabled MCP server: {server_name}")
+                print(f"Skipping disabled MCP server: {server_name}")
+                continue
+            servers[server_name] = config
+        return servers
+
+    def _register_cached_mcp_servers(self, servers: Dict[str, dict]) -> Dict[str, dict]:
+        """Register tools of servers already discovered in this process, return the servers still to connect"""
+        pending = {}
+        for server_name, config in servers.items():
+            cached_tools = get_cached_mcp_tools(server_name, config)
+            if cached_tools is None:
+                pending[server_name] = config
+                continue
+            logger.debug(f"Reusing {len(cached_tools)} discovered tools of MCP server {server_name}")
+            for tool_spec in cached_tools:
+                self.register_tool(tool_spec)
+        return pending
+
+    async def _discover_mcp_tools(self, mcp_setting_path: str = None, servers: Optional[Dict[str, dict]] = None):
+        """Discover and register tools from MCP servers
+
+        Args:
+            mcp_setting_path: MCP settings file, used when servers is None
+            servers: Enabled server configs to discover, keyed by server name
+        """
+        if servers is None:
+            servers = self._register_cached_mcp_servers(self._load_mcp_servers(mcp_setting_path))
+        for server_name, config in servers.items():
+            try:
                 if 'sse_url' in config:
                     logger.debug(f"Setting up SSE server: {server_name} at URL: {config['sse_url']}")
                     server_params = SseServerParameters(url=config['sse_url'],api_key=config.get('api_key',None))
-                    await self._register_mcp_tools_sse(server_name, server_params)
+                    discovered = await self._register_mcp_tools_sse(server_name, server_params)
                 else:
                     logger.debug(f"Setting up stdio server: {server_name} with command: {config['command']}")
+                    from mcp import StdioServerParameters
                     server_params = StdioServerParameters(
                         command=config['command'],
                         args=config.get('args', []),
                         env=config.get('env', None)
                     )
-                    await self._register_mcp_tools_stdio(server_name, server_params)
-        except Exception as e:
-            logger.error(f"Error loading MCP config: {str(e)}")
-            print(f"Error loading MCP config: {e}")
+                    discovered = await self._register_mcp_tools_stdio(server_name, server_params)
+            except Exception as e:
+                logger.error(f"Error loading MCP server {server_name}: {str(e)}")
+                print(f"Error loading MCP server {server_name}: {e}")
+                continue
+            if discovered:
+                # 只缓存成功完成发现的服务器，失败的服务器在下次创建ToolManager时重试
+                cache_mcp_tools(server_name, config, [
+                    tool for tool in self.tools.values()
+                    if isinstance(tool, McpToolSpec) and tool.server_name == server_name
+                ])
 
-    async def _register_mcp_tools_stdio(self, server_name: str, server_params: StdioServerParameters):
-        """Register tools from stdio MCP server"""
+    async def _register_mcp_tools_stdio(self, server_name: str, server_params: StdioServerParameters) -> bool:
+        """Register tools from stdio MCP server, return whether the tool list was fetched"""
         logger.info(f"Registering tools from stdio MCP server: {server_name}")
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
         try:
             async with stdio_client(server_params) as (read, write):
                 async with ClientSession(read, write) as session:
@@ -239,16 +362,20 @@ class ToolManager:
                     logger.info(f"Received {len(tools)} tools from stdio MCP server {server_name}")
                     for tool in tools:
                         await self._register_mcp_tool(server_name,tool, server_params)
+            return True
         except Exception as e:
             logger.error(f"Failed to connect to stdio MCP server {server_name}: {str(e)}")
             logger.error(traceback.format_exc())
             print(traceback.format_exc())
             print(f"Failed to connect to stdio MCP server {server_name}: {e}")
+            return False
 
-    async def _register_mcp_tools_sse(self, server_name: str, server_params: SseServerParameters):
-        """Register tools from SSE MCP server"""
+    async def _register_mcp_tools_sse(self, server_name: str, server_params: SseServerParameters) -> bool:
+        """Register tools from SSE MCP server, return whether the tool list was fetched"""
         logger.info(f"Registering tools from SSE MCP server: {server_name} at {server_params.url}")
         print(f"Connecting to SSE MCP server {server_name} at {server_params.url}")
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
         try:
             headers= None
             if server_params.api_key:
@@ -271,13 +398,15 @@ class ToolManager:
                     logger.info(f"Received {len(tools)} tools from SSE MCP server {server_name}")
                     for tool in tools:
                         await self._register_mcp_tool(server_name, tool, server_params)
+            return True
         except Exception as e:
             logger.error(f"Failed to connect to SSE MCP server {server_name}: {str(e)}")
             print(f"Failed to connect to SSE MCP server {server_name}: {e}")
+            return False
 
     async def _register_mcp_tool(self, server_name: str, tool_info:Union[Tool, dict], 
                                server_params: Union[StdioServerParameters, SseServerParameters]):
-        
+        from mcp import Tool
         if isinstance(tool_info, Tool):
             tool_info = tool_info.model_dump()
         if not isinstance(tool_info, dict):
@@ -437,8 +566,37 @@ class ToolManager:
         
         logger.debug(f"Found tool: {tool_name} (type: {type(tool).__name__})")
         
+        # 执行前按预编译的schema校验并转换参数，参数错误时立即返回
+        if isinstance(tool, (ToolSpec, McpToolSpec)):
+            kwargs, arg_errors = self._get_args_validator(tool).validate(kwargs)
+            if arg_errors:
+                error_msg = f"Invalid arguments for tool '{tool_name}': " + "; ".join(arg_errors)
+                logger.warning(error_msg)
+                self._log_execution(tool_name, False, "INVALID_ARGUMENTS")
+                return self._format_error_response(error_msg, tool_name, "INVALID_ARGUMENTS")
+        
+        # 声明了缓存策略的幂等工具，先查跨会话的结果缓存
+        result_cache = get_tool_result_cache() if isinstance(tool, (ToolSpec, McpToolSpec)) else None
+        cache_arguments = dict(kwargs)
+        if result_cache:
+            cached_content = result_cache.lookup(tool_name, cache_arguments)
+            if cached_content is not None:
+                execution_time = time.time() - execution_start
+                cached_result = ToolResult(tool_name, content=cached_content, metadata={
+                    'execution_time': execution_time, 'timestamp': time.time(), 'cache_hit': True
+                })
+                self._log_execution(tool_name, True, execution_time=execution_time)
+                return self._apply_result_size_policy(tool_name, session_id, cached_result)
+        
         # Step 2: Execute based on tool type (self-call prevention handled at agent level)
         
+        # 会话设置了截止时间时，工具超时不超过剩余时间
+        budget = get_session_budget(session_id)
+        mcp_timeout = budget.tool_timeout(10) if budget else 10
+        if budget and isinstance(tool, ToolSpec) and 'timeout' in tool.parameters:
+            default_timeout = kwargs.get('timeout') or tool.parameters['timeout'].get('default') or 30
+            kwargs['timeout'] = int(budget.tool_timeout(default_timeout))
+        
         try:
             # Step 3: Execute tool
             if isinstance(tool, McpToolSpec):
@@ -450,14 +608,17 @@ class ToolManager:
                 with ThreadPoolExecutor(max_workers=1) as executor:
                     try:
                         future = executor.submit(run_async_task)
-                        final_result = future.result(timeout=10)
+                        final_result = future.result(timeout=mcp_timeout)
                     except TimeoutError:
                         logger.error(f"MCP tool {tool.name} execution timed out")
-                        raise RuntimeError(f"MCP tool {tool.name} execution timed out after 10 seconds")
+                        raise RuntimeError(f"MCP tool {tool.name} execution timed out after {mcp_timeout:.0f} seconds")
                     except Exception as e:
                         logger.error(f"MCP tool {tool.name} execution failed: {str(e)}")
                         raise
             elif isinstance(tool, ToolSpec):
+                if self._accepts_session_id(tool):
+                    # 需要区分会话的工具（如读取工具结果）由调用方的会话ID决定，而非模型参数
+                    kwargs['session_id'] = session_id
                 final_result = self._execute_standard_tool(tool, **kwargs)
             elif isinstance(tool, AgentToolSpec):
                 # For AgentToolSpec, return a generator for streaming
@@ -468,20 +629,17 @@ class ToolManager:
                 self._log_execution(tool_name, False, "UNKNOWN_TOOL_TYPE")
                 return self._format_error_response(error_msg, tool_name, "UNKNOWN_TOOL_TYPE")
             
-            # Step 4: Validate Result (for non-streaming tools)
+            # Step 4: Record result metadata (for non-streaming tools)
+            # 结果保持为结构化对象，只在交给LLM或对外传输时序列化一次
             execution_time = time.time() - execution_start
             logger.info(f"Tool '{tool_name}' completed successfully in {execution_time:.2f}s")
-            
-            # Validate JSON format
-            is_valid, validation_msg = self._validate_json_response(final_result, tool_name)
-            if not is_valid:
-                logger.error(f"Tool '{tool_name}' returned invalid JSON: {validation_msg}")
-                self._log_execution(tool_name, False, "INVALID_JSON")
-                return self._format_error_response(f"Invalid JSON response: {validation_msg}", 
-                                                 tool_name, "INVALID_JSON")
+            final_result.metadata.update({'execution_time': execution_time, 'timestamp': time.time()})
+            if result_cache:
+                result_cache.store(tool_name, cache_arguments, final_result.content,
+                                   is_error=bool(final_result.metadata.get('is_error')))
             
             self._log_execution(tool_name, True, execution_time=execution_time)
-            return final_result
+            return self._apply_result_size_policy(tool_name, session_id, final_result)
             
         except Exception as e:
             execution_time = time.time() - execution_start
@@ -495,6 +653,48 @@ class ToolManager:
 
 
 
+    def _get_args_validator(self, tool: Union[ToolSpec, McpToolSpec]) -> ToolArgsValidator:
+        """
+        获取工具的参数校验器，首次使用时按schema编译
+
+        Args:
+            tool: 工具定义
+
+        Returns:
+            ToolArgsValidator: 参数校验器
+        """
+        validator = self._args_validators.get(tool.name)
+        if validator is None:
+            # MCP工具只保存了properties，不确定是否允许额外参数，交给服务端判断
+            validator = ToolArgsValidator(tool.name, tool.parameters, tool.required,
+                                          allow_extra=isinstance(tool, McpToolSpec))
+            self._args_validators[tool.name] = validator
+        return validator
+
+    def _apply_result_size_policy(self, tool_name: str, session_id: str, result: ToolResult) -> ToolResult:
+        """
+        结果超过阈值时写入会话工作目录，返回头尾预览和结果句柄
+
+        Args:
+            tool_name: 工具名称
+            session_id: 会话ID
+            result: 工具结果
+
+        Returns:
+            ToolResult: 原结果或预览结果
+        """
+        # 分页读取的结果本身不再写入文件，否则无法读到完整内容
+        if tool_name == 'read_tool_result':
+            return result
+        from sagents.config.settings import get_settings
+        tool_config = get_settings().tool
+        return apply_result_size_policy(
+            session_id, result,
+            threshold=tool_config.result_spill_threshold,
+            head_chars=tool_config.result_preview_head,
+            tail_chars=tool_config.result_preview_tail
+        )
+
     def _execute_agent_tool_streaming(self, tool: AgentToolSpec, messages: list, session_id: str):
         """
         执行AgentToolSpec并返回流式结果
@@ -562,7 +762,7 @@ class ToolManager:
             }
             yield [error_response]
 
-    async def _execute_mcp_tool(self, tool: McpToolSpec, session_id: str, **kwargs) -> str:
+    async def _execute_mcp_tool(self, tool: McpToolSpec, session_id: str, **kwargs) -> ToolResult:
         """Execute MCP tool and format result"""
         logger.info(f"Executing MCP tool: {tool.name} on server: {tool.server_name}")
         
@@ -570,6 +770,8 @@ class ToolManager:
             result = await self._run_mcp_tool_async(tool, session_id, **kwargs)
             logger.info(f"MCP tool {tool.name} execution completed successfully")
             # Process MCP result
+            # 服务端通过isError标记的失败结果会被展开为普通文本，记录在元数据中供结果缓存判断
+            metadata = {'is_error': True} if isinstance(result, dict) and result.get('isError') else {}
             if isinstance(result, dict) and result.get('content'):
                 content = result['content']
                 if isinstance(content, list) and len(content) > 0:
@@ -577,15 +779,23 @@ class ToolManager:
                     formatted_content = '\n'.join([item.get('text', str(item)) for item in content])
                 else:
                     formatted_content = str(content)
-                return json.dumps({"content": formatted_content}, ensure_ascii=False, indent=2)
+                return ToolResult(tool.name, content=formatted_content, metadata=metadata)
             else:
-                return json.dumps(result, ensure_ascii=False, indent=2)
+                return ToolResult(tool.name, content=result, metadata=metadata)
                 
         except Exception as e:
             logger.error(f"MCP tool execution failed: {tool.name} - {str(e)}")
             raise
 
-    def _execute_standard_tool(self, tool: ToolSpec, **kwargs) -> str:
+    @staticmethod
+    def _accepts_session_id(tool: ToolSpec) -> bool:
+        """工具函数是否声明了 session_id 参数（不出现在工具schema中）"""
+        try:
+            return 'session_id' in inspect.signature(tool.func).parameters
+        except (TypeError, ValueError):
+            return False
+
+    def _execute_standard_tool(self, tool: ToolSpec, **kwargs) -> ToolResult:
         """Execute standard tool and format result"""
         logger.debug(f"Executing standard tool: {tool.name}")
         
@@ -607,12 +817,11 @@ class ToolManager:
                 else:
                     result = tool.func(**kwargs)
             
-            # Format result
-            if isinstance(result, (dict, list)):
-                content = json.dumps(result, ensure_ascii=False, indent=2)
-                return json.dumps({"content": content}, ensure_ascii=False, indent=2)
+            # 保留结构化结果，不在此处序列化
+            if isinstance(result, (dict, list, str)):
+                return ToolResult(tool.name, content=result)
             else:
-                return json.dumps({"content": str(result)}, ensure_ascii=False, indent=2)
+                return ToolResult(tool.name, content=str(result))
                 
         except Exception as e:
             logger.error(f"Standard tool execution failed: {tool.name} - {str(e)}")
@@ -630,20 +839,15 @@ class ToolManager:
             raise
 
     def _format_error_response(self, error_msg: str, tool_name: str, error_type: str, 
-                              exception_detail: str = None) -> str:
+                              exception_detail: str = None) -> ToolResult:
         """Format a consistent error response"""
-        error_response = {
-            "error": True,
-            "error_type": error_type,
-            "message": error_msg,
-            "tool_name": tool_name,
-            "timestamp": time.time()
-        }
-        
-        if exception_detail:
-            error_response["exception_detail"] = exception_detail
-            
-        return json.dumps(error_response, ensure_ascii=False, indent=2)
+        return ToolResult(
+            tool_name,
+            error_type=error_type,
+            message=error_msg,
+            exception_detail=exception_detail,
+            metadata={'timestamp': time.time()}
+        )
 
     async def _run_mcp_tool_async(self, tool: McpToolSpec, session_id: str = None, **kwargs) -> Any:
         """Run an MCP tool asynchronously"""
@@ -668,6 +872,8 @@ class ToolManager:
 
     async def _execute_sse_mcp_tool(self, tool: McpToolSpec, **kwargs) -> Any:
         """Execute SSE MCP tool"""
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
         headers= None
         if tool.server_params.api_key:
             headers = {
@@ -682,46 +888,23 @@ class ToolManager:
 
     async def _execute_stdio_mcp_tool(self, tool: McpToolSpec, **kwargs) -> Any:
         """Execute stdio MCP tool"""
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
         async with stdio_client(tool.server_params) as (read, write):
             async with ClientSession(read, write) as session:
                 await session.initialize()
                 result = await session.call_tool(tool.name, kwargs)
                 return result.model_dump()
 
-    def _validate_json_response(self, response_text: str, tool_name: str) -> tuple[bool, str]:
-        """Validate if response is proper JSON and return validation result"""
-        if not response_text:
-            return False, "Empty response"
-        
-        try:
-            parsed = json.loads(response_text)
-            
-            # Check for common issues
-            if isinstance(parsed, str) and len(parsed) > 10000:
-                logger.warning(f"Tool '{tool_name}' returned very large response ({len(parsed)} chars)")
-                
-            return True, "Valid JSON"
-            
-        except json.JSONDecodeError as e:
-            error_pos = getattr(e, 'pos', 'unknown')
-            if hasattr(e, 'pos') and e.pos < len(response_text):
-                start = max(0, e.pos - 50)
-                end = min(len(response_text), e.pos + 50)
-                context = response_text[start:end]
-                logger.error(f"JSON parse error at position {error_pos}: {context}")
-            
-            return False, f"JSON decode error at position {error_pos}: {e}"
-        except Exception as e:
-            logger.error(f"Unexpected JSON validation error for '{tool_name}': {e}")
-            return False, f"Validation error: {e}"
-
     def get_execution_stats(self) -> dict:
         """获取工具执行统计信息"""
         total = max(1, self.execution_stats['total_executions'])
+        result_cache = get_tool_result_cache()
         return {
             **self.execution_stats,
             'success_rate': (self.execution_stats['successful_executions'] / total) * 100,
-            'total_tools_registered': len(self.tools)
+            'total_tools_registered': len(self.tools),
+            'result_cache': result_cache.get_stats() if result_cache else None
         }
 
     def _log_execution(self, tool_name: str, success: bool, error_type: str = None, execution_time: float = None):
@@ -0,0 +1,35 @@
+"""
+工具结果分页读取工具
+"""
+from typing import Dict, Any, Optional
+from .tool_base import ToolBase
+from sagents.config.settings import get_settings
+from sagents.utils.tool_result_store import MAX_READ_CHARS, read_tool_result as read_stored_result
+
+
+class ToolResultTool(ToolBase):
+    """工具结果分页读取工具"""
+
+    def __init__(self):
+        super().__init__()
+
+    @ToolBase.tool()
+    def read_tool_result(self, handle: str, offset: int = 0, length: int = 4000,
+                         session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        分页读取被截断的工具结果。当工具结果中包含 truncated 和 result_handle 字段时，
+        使用该句柄按字符偏移读取完整结果中未展示的部分。
+
+        Args:
+            handle (str): 工具结果中的 result_handle
+            offset (int): 起始字符偏移，默认为0
+            length (int): 读取的字符数，默认为4000，单次不超过结果截断阈值
+            session_id (str): 当前会话ID，由ToolManager注入，只能读取本会话的结果
+
+        Returns:
+            Dict[str, Any]: 读取的内容、结束偏移、总字符数以及是否还有剩余内容
+        """
+        # 读取的页不超过截断阈值，避免分页结果本身再次被截断写入文件
+        threshold = get_settings().tool.result_spill_threshold
+        max_length = min(MAX_READ_CHARS, threshold) if threshold > 0 else MAX_READ_CHARS
+        return read_stored_result(handle, offset, length, session_id=session_id, max_length=max_length)
@@ -11,6 +11,7 @@ from sagents.utils.exceptions import (
     AgentTimeoutError,
     RetryConfig,
     exponential_backoff,
+    is_retryable_llm_error,
     with_retry,
     handle_exception
 )
@@ -22,6 +23,7 @@ __all__ = [
     'AgentTimeoutError', 
     'RetryConfig',
     'exponential_backoff',
+    'is_retryable_llm_error',
     'with_retry',
     'handle_exception'
 ] 
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+后台流式任务
+
+在后台线程中消费一个生成器，将产出的消息块缓存起来，
+调用方可以在合适的时机非阻塞地取出已完成的消息块，或在需要结果时等待其完成（汇合点）。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import contextvars
+import threading
+import traceback
+from typing import Any, Callable, Generator, List, Optional
+
+from sagents.utils.logger import logger
+
+
+class BackgroundStream:
+    """在后台线程中运行的流式任务"""
+
+    def __init__(self,
+                 name: str,
+                 stream_factory: Callable[[], Generator[Any, None, None]],
+                 should_stop: Optional[Callable[[], bool]] = None):
+        """
+        初始化并立即启动后台流式任务
+
+        Args:
+            name: 任务名称，用于日志和线程名
+            stream_factory: 返回生成器的函数，在后台线程中调用
+            should_stop: 每个消息块之后检查的停止条件（如会话被中断）
+        """
+        self.name = name
+        self.error: Optional[Exception] = None
+        self._stream_factory = stream_factory
+        self._should_stop = should_stop
+        self._chunks: List[Any] = []
+        self._lock = threading.Lock()
+        # 复制当前上下文，使后台线程中的上下文变量与调用方一致
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._run,), name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for chunk in self._stream_factory():
+                with self._lock:
+                    self._chunks.append(chunk)
+                if self._should_stop and self._should_stop():
+                    logger.info(f"BackgroundStream: {self.name} 收到停止信号，提前结束")
+                    break
+        except Exception as e:
+            self.error = e
+            logger.error(f"BackgroundStream: {self.name} 执行失败: {str(e)}")
+            logger.error(f"异常详情: {traceback.format_exc()}")
+
+    @property
+    def done(self) -> bool:
+        """后台任务是否已结束"""
+        return not self._thread.is_alive()
+
+    def drain(self) -> List[Any]:
+        """
+        非阻塞地取出已经产出的消息块
+
+        Returns:
+            List[Any]: 自上次取出以来新产出的消息块
+        """
+        with self._lock:
+            chunks, self._chunks = self._chunks, []
+        return chunks
+
+    def join(self, timeout: Optional[float] = None) -> List[Any]:
+        """
+        等待后台任务结束并取出剩余的消息块
+
+        Args:
+            timeout: 最长等待时间（秒），为None时一直等待
+
+        Returns:
+            List[Any]: 剩余的消息块
+        """
+        self._thread.join(timeout)
+        if not self.done:
+            logger.warning(f"BackgroundStream: {self.name} 在 {timeout}s 内未结束")
+        return self.drain()
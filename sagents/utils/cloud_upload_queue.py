@@ -0,0 +1,495 @@
+"""
+云端上传队列
+
+file_write 写入文件后不再同步上传，而是把路径加入后台队列：
+同一路径在防抖时间内的多次写入合并为一次上传，上传进行中再次写入时在完成后补传一次；
+内容与上次上传相同（先比较 mtime/大小，再比较sha256）时跳过上传；
+multipart请求体按块从文件流式读取，不把整个文件读入内存，
+上传过程中文件被截断或修改时放弃这次上传并重新排队，不会上传不完整的内容。
+上传状态可随时通过 get_status 查询，或通过 wait 等待某个路径上传完成；
+生成最终总结前通过 flush_cloud_upload_queues 等待所有上传结束。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Tuple
+
+from sagents.utils.logger import logger
+
+# 上传状态
+STATE_PENDING = 'pending'
+STATE_UPLOADING = 'uploading'
+STATE_UPLOADED = 'uploaded'
+STATE_UNCHANGED = 'unchanged'
+STATE_FAILED = 'failed'
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+# 上传过程中文件发生变化时最多重新排队的次数
+MAX_CHANGED_RETRIES = 3
+
+
+class FileChangedDuringUpload(OSError):
+    """上传过程中文件被截断，已发送的Content-Length无法兑现"""
+    pass
+
+
+class MultipartFileBody:
+    """从文件流式读取的 multipart/form-data 请求体（长度已知，requests会设置Content-Length）"""
+
+    def __init__(self, file_path: str, field_name: str = 'file', file_name: Optional[str] = None,
+                 content_type: str = 'application/octet-stream'):
+        """
+        Args:
+            file_path: 文件路径
+            field_name: 表单字段名
+            file_name: 上传的文件名，默认为文件的basename
+            content_type: 文件部分的Content-Type
+        """
+        boundary = uuid.uuid4().hex
+        file_name = (file_name or os.path.basename(file_path)).replace('"', '%22')
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = (f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+                f'Content-Type: {content_type}\r\n\r\n')
+        self._head = head.encode('utf-8')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._file_size = os.path.getsize(file_path)
+        # 不使用缓冲，每次读取都直接读文件，才能及时发现上传过程中的截断
+        self._file = open(file_path, 'rb', buffering=0)
+        self._position = 0
+        self.truncated = False
+
+    def __len__(self) -> int:
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self) - self._position
+        chunks = []
+        while size > 0 and self._position < len(self):
+            head_len = len(self._head)
+            file_end = head_len + self._file_size
+            if self._position < head_len:
+                chunk = self._head[self._position:self._position + size]
+            elif self._position < file_end:
+                chunk = self._file.read(min(size, file_end - self._position))
+                if not chunk:
+                    # 上传过程中文件被截断：中止请求，不发送不完整的内容
+                    self.truncated = True
+                    raise FileChangedDuringUpload(f"上传过程中文件被截断: {self._file.name}")
+            else:
+                offset = self._position - file_end
+                chunk = self._tail[offset:offset + size]
+            self._position += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self._file.close()
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    流式计算文件的sha256
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class _UploadEntry:
+    path: str
+    state: str = STATE_PENDING
+    due: float = 0.0
+    dirty: bool = False
+    writes: int = 0
+    uploads: int = 0
+    skipped: int = 0
+    changed_retries: int = 0
+    fingerprint: Optional[Tuple[int, int]] = None
+    sha256: Optional[str] = None
+    url: Optional[str] = None
+    file_id: Optional[str] = None
+    error: Optional[str] = None
+    updated_at: float = field(default_factory=time.time)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'file_path': self.path,
+            'status': self.state,
+            'url': self.url,
+            'file_id': self.file_id,
+            'sha256': self.sha256,
+            'error': self.error,
+            'writes': self.writes,
+            'uploads': self.uploads,
+            'skipped_unchanged': self.skipped,
+            'updated_at': self.updated_at
+        }
+
+
+class CloudUploadQueue:
+    """后台云端上传队列 - 按路径合并写入、按内容去重、流式上传"""
+
+    def __init__(self,
+                 upload_url: str,
+                 headers: Optional[Dict[str, str]] = None,
+                 debounce_seconds: float = 2.0,
+                 workers: int = 2,
+                 timeout: float = 60,
+                 max_file_size_mb: float = 100):
+        """
+        初始化上传队列
+
+        Args:
+            upload_url: 上传接口地址，返回 {"data": {"url", "fileId"}}
+            headers: 上传请求的额外请求头
+            debounce_seconds: 同一路径最后一次写入后等待多久再上传
+            workers: 后台上传线程数
+            timeout: 单次上传的超时时间（秒）
+            max_file_size_mb: 允许上传的最大文件大小（MB）
+        """
+        self.upload_url = upload_url
+        self.headers = dict(headers or {})
+        self.debounce_seconds = debounce_seconds
+        self.timeout = timeout
+        self.max_file_size = int(max_file_size_mb * 1024 * 1024)
+        self._entries: Dict[str, _UploadEntry] = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        for index in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker, name=f"cloud-upload-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, file_path: str) -> Dict[str, Any]:
+        """
+        登记一次文件写入，防抖时间后在后台上传
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            Dict[str, Any]: 该路径当前的上传状态
+        """
+        with self._cond:
+            entry = self._entries.setdefault(file_path, _UploadEntry(file_path))
+            entry.writes += 1
+            if entry.state == STATE_UPLOADING:
+                # 正在上传旧内容，完成后再补传一次
+                entry.dirty = True
+            else:
+                entry.state = STATE_PENDING
+                entry.due = time.time() + self.debounce_seconds
+            entry.updated_at = time.time()
+            self._cond.notify()
+            return entry.snapshot()
+
+    def upload_now(self, file_path: str) -> Dict[str, Any]:
+        """
+        在当前线程立即上传（内容未变化时直接返回上次的上传结果）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            Dict[str, Any]: 上传后的状态
+        """
+        with self._cond:
+            entry = self._entries.setdefault(file_path, _UploadEntry(file_path))
+            while entry.state == STATE_UPLOADING:
+                self._cond.wait()
+            entry.state = STATE_UPLOADING
+            entry.dirty = False
+        return self._run(entry)
+
+    def get_status(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        查询路径的上传状态
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            Optional[Dict[str, Any]]: 上传状态，未提交过时返回None
+        """
+        with self._cond:
+            entry = self._entries.get(file_path)
+            return entry.snapshot() if entry else None
+
+    def wait(self, file_path: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        跳过防抖立即上传该路径，并等待上传结束
+
+        Args:
+            file_path: 文件路径
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            Optional[Dict[str, Any]]: 等待结束时的上传状态，未提交过时返回None
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            entry = self._entries.get(file_path)
+            if entry is None:
+                return None
+            if entry.state == STATE_PENDING:
+                entry.due = 0
+                self._cond.notify_all()
+            while entry.state in (STATE_PENDING, STATE_UPLOADING):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return entry.snapshot()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        跳过防抖，等待所有排队的上传完成
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            bool: 是否所有上传都已结束
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            for entry in self._entries.values():
+                if entry.state == STATE_PENDING:
+                    entry.due = 0
+            self._cond.notify_all()
+            while any(entry.state in (STATE_PENDING, STATE_UPLOADING) for entry in self._entries.values()):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def shutdown(self, timeout: Optional[float] = 10):
+        """
+        上传剩余的排队文件后停止后台线程
+
+        Args:
+            timeout: 等待剩余上传的最长时间（秒）
+        """
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+    def _next_ready(self) -> Tuple[Optional[_UploadEntry], Optional[float]]:
+        """返回到期的排队项，以及没有到期项时需要等待的时间"""
+        now = time.time()
+        next_due = None
+        for entry in self._entries.values():
+            if entry.state != STATE_PENDING:
+                continue
+            if entry.due <= now:
+                return entry, None
+            next_due = entry.due if next_due is None else min(next_due, entry.due)
+        return None, None if next_due is None else next_due - now
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    entry, wait_time = self._next_ready()
+                    if entry is not None:
+                        break
+                    self._cond.wait(wait_time)
+                entry.state = STATE_UPLOADING
+            self._run(entry)
+
+    def _run(self, entry: _UploadEntry) -> Dict[str, Any]:
+        """上传处于uploading状态的条目，结束后处理上传期间的新写入"""
+        try:
+            self._process(entry)
+        except Exception as e:
+            logger.error(f"CloudUploadQueue: 上传 {entry.path} 时发生异常: {e}")
+            entry.state, entry.error = STATE_FAILED, str(e)
+        with self._cond:
+            if entry.dirty:
+                entry.dirty = False
+                entry.state = STATE_PENDING
+                entry.due = time.time() + self.debounce_seconds
+            entry.updated_at = time.time()
+            self._cond.notify_all()
+            return entry.snapshot()
+
+    def _process(self, entry: _UploadEntry):
+        """上传一个文件，结果写入entry（不持有锁）"""
+        if not os.path.exists(entry.path):
+            entry.state, entry.error = STATE_FAILED, "文件不存在"
+            return
+        stat = os.stat(entry.path)
+        if stat.st_size > self.max_file_size:
+            entry.state = STATE_FAILED
+            entry.error = f"文件过大，超过{self.max_file_size // (1024 * 1024)}MB限制"
+            return
+        fingerprint = (stat.st_mtime_ns, stat.st_size)
+        if entry.url and fingerprint == entry.fingerprint:
+            entry.state, entry.error = STATE_UNCHANGED, None
+            entry.skipped += 1
+            return
+        sha256 = file_sha256(entry.path)
+        if entry.url and sha256 == entry.sha256:
+            logger.debug(f"CloudUploadQueue: {entry.path} 内容未变化，跳过上传")
+            entry.fingerprint = fingerprint
+            entry.state, entry.error = STATE_UNCHANGED, None
+            entry.skipped += 1
+            return
+
+        result = self._post(entry.path)
+        entry.uploads += 1
+        if result.get('url'):
+            stat = os.stat(entry.path) if os.path.exists(entry.path) else None
+            if stat is None or (stat.st_mtime_ns, stat.st_size) != fingerprint:
+                result = {'error': "上传过程中文件被修改", 'changed': True}
+        if result.get('changed'):
+            entry.state, entry.error = STATE_FAILED, result['error']
+            if entry.changed_retries < MAX_CHANGED_RETRIES:
+                # 由_run按待补传处理，防抖后重新上传最新内容
+                entry.changed_retries += 1
+                entry.dirty = True
+            logger.warning(f"CloudUploadQueue: {entry.path} {entry.error}，重新排队（第 {entry.changed_retries} 次）")
+        elif result.get('url'):
+            entry.changed_retries = 0
+            entry.state, entry.error = STATE_UPLOADED, None
+            entry.url, entry.file_id = result['url'], result.get('file_id')
+            entry.sha256, entry.fingerprint = sha256, fingerprint
+            logger.info(f"CloudUploadQueue: {entry.path} 上传成功: {entry.url}")
+        else:
+            entry.state, entry.error = STATE_FAILED, result.get('error')
+            logger.warning(f"CloudUploadQueue: {entry.path} 上传失败: {entry.error}")
+
+    def _post(self, file_path: str) -> Dict[str, Any]:
+        """以流式multipart请求上传文件，返回 {url, file_id} 或 {error}"""
+        import requests
+        body = MultipartFileBody(file_path)
+        try:
+            headers = {**self.headers, 'Content-Type': body.content_type}
+            response = requests.post(self.upload_url, headers=headers, data=body, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json().get('data') or {}
+        except FileChangedDuringUpload as e:
+            return {'error': str(e), 'changed': True}
+        except requests.exceptions.Timeout:
+            return {'error': "上传超时"}
+        except requests.exceptions.RequestException as e:
+            # 读取请求体时的异常可能被requests包装
+            if body.truncated:
+                return {'error': "上传过程中文件被截断", 'changed': True}
+            return {'error': f"网络请求失败: {str(e)}"}
+        except ValueError as e:
+            return {'error': f"上传接口返回的不是JSON: {str(e)}"}
+        finally:
+            body.close()
+        if not data.get('url'):
+            return {'error': "API返回成功但缺少文件URL"}
+        return {'url': data['url'], 'file_id': data.get('fileId')}
+
+
+# 全局上传队列：{上传地址: 队列}
+_queues: Dict[str, CloudUploadQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_cloud_upload_queue(upload_url: str, headers: Optional[Dict[str, str]] = None) -> CloudUploadQueue:
+    """
+    获取上传地址对应的全局上传队列，首次调用时按配置创建
+
+    Args:
+        upload_url: 上传接口地址
+        headers: 上传请求的额外请求头
+
+    Returns:
+        CloudUploadQueue: 上传队列
+    """
+    with _queues_lock:
+        queue = _queues.get(upload_url)
+        if queue is None:
+            from sagents.config.settings import get_settings
+            tool_config = get_settings().tool
+            queue = CloudUploadQueue(
+                upload_url,
+                headers=headers,
+                debounce_seconds=tool_config.upload_debounce_seconds,
+                workers=tool_config.upload_workers
+            )
+            _queues[upload_url] = queue
+        return queue
+
+
+def flush_cloud_upload_queues(timeout: Optional[float] = None) -> bool:
+    """
+    跳过防抖，等待所有队列中的上传结束（生成最终总结前调用，使总结能拿到云端链接）
+
+    Args:
+        timeout: 最长等待时间（秒），None表示一直等待
+
+    Returns:
+        bool: 是否所有上传都已结束
+    """
+    with _queues_lock:
+        queues = list(_queues.values())
+    deadline = None if timeout is None else time.time() + timeout
+    finished = True
+    for queue in queues:
+        remaining = None if deadline is None else max(0.0, deadline - time.time())
+        finished = queue.flush(remaining) and finished
+    return finished
+
+
+def find_cloud_upload_status(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    在所有上传队列中查找路径的上传状态
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        Optional[Dict[str, Any]]: 上传状态，未提交过时返回None
+    """
+    with _queues_lock:
+        queues = list(_queues.values())
+    for queue in queues:
+        status = queue.get_status(file_path)
+        if status is not None:
+            return status
+    return None
+
+
+def shutdown_cloud_upload_queues(timeout: Optional[float] = 10):
+    """上传所有队列中剩余的文件并停止后台线程（进程退出时自动调用）"""
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for queue in queues:
+        queue.shutdown(timeout)
+
+
+atexit.register(shutdown_cloud_upload_queues)
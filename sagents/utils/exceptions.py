@@ -27,17 +27,57 @@ class AgentTimeoutError(SageException):
     """智能体超时错误"""
     pass
 
+class LLMStreamDivergedError(SageException):
+    """流式调用中断重试后，新的生成与已经输出的内容不一致"""
+    pass
+
+class DownloadError(SageException):
+    """文件下载错误（超过大小限制、内容不完整等）"""
+    pass
+
 # 重试配置
 class RetryConfig:
     """重试配置类"""
-    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=60.0):
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=60.0, jitter=0.0):
         self.max_attempts = max_attempts
         self.base_delay = base_delay
         self.max_delay = max_delay
+        self.jitter = jitter  # 抖动比例（0~1），避免多个客户端同时重试
 
-def exponential_backoff(max_attempts=3, base_delay=1.0, max_delay=60.0):
+    def compute_delay(self, attempt: int) -> float:
+        """计算第attempt次（从0开始）失败后的等待时间"""
+        delay = min(self.base_delay * (2 ** attempt), self.max_delay)
+        if self.jitter:
+            delay = delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+        return delay
+
+def exponential_backoff(max_attempts=3, base_delay=1.0, max_delay=60.0, jitter=0.0):
     """指数退避重试配置"""
-    return RetryConfig(max_attempts, base_delay, max_delay)
+    return RetryConfig(max_attempts, base_delay, max_delay, jitter)
+
+# 可重试的网络/服务端错误类型名（兼容openai与httpx异常，避免强依赖）
+_RETRYABLE_ERROR_NAMES = {
+    'APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError',
+    'ConnectError', 'ConnectTimeout', 'ReadTimeout', 'ReadError', 'RemoteProtocolError',
+    'IncompleteRead', 'ChunkedEncodingError'
+}
+
+def is_retryable_llm_error(exception: Exception) -> bool:
+    """
+    判断LLM调用异常是否值得重试：连接错误、超时（408）、429以及5xx响应
+    
+    Args:
+        exception: 捕获的异常
+        
+    Returns:
+        bool: 是否可重试
+    """
+    status_code = getattr(exception, 'status_code', None)
+    if status_code is not None:
+        return status_code in (408, 429) or status_code >= 500
+    if isinstance(exception, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _RETRYABLE_ERROR_NAMES for cls in type(exception).__mro__)
 
 def with_retry(config: RetryConfig):
     """重试装饰器"""
@@ -52,8 +92,7 @@ def with_retry(config: RetryConfig):
                     except Exception as e:
                         last_exception = e
                         if attempt < config.max_attempts - 1:
-                            delay = min(config.base_delay * (2 ** attempt), config.max_delay)
-                            await asyncio.sleep(delay)
+                            await asyncio.sleep(config.compute_delay(attempt))
                         else:
                             break
                 raise last_exception
@@ -68,8 +107,7 @@ def with_retry(config: RetryConfig):
                     except Exception as e:
                         last_exception = e
                         if attempt < config.max_attempts - 1:
-                            delay = min(config.base_delay * (2 ** attempt), config.max_delay)
-                            time.sleep(delay)
+                            time.sleep(config.compute_delay(attempt))
                         else:
                             break
                 raise last_exception
@@ -103,6 +141,7 @@ __all__ = [
     'AgentTimeoutError',
     'RetryConfig',
     'exponential_backoff',
+    'is_retryable_llm_error',
     'with_retry',
     'handle_exception'
 ] 
\ No newline at end of file
@@ -0,0 +1,441 @@
+"""
+多端点容灾客户端
+
+将多个OpenAI兼容端点（例如多个vLLM副本 + 一个托管兜底服务）包装成一个客户端，
+对外暴露与 OpenAI 客户端一致的 ``client.chat.completions.create(...)`` 接口，
+AgentBase 可以直接透明使用。
+
+功能：
+1. 按端点统计首token时延（TTFT）与错误率，优先路由到最快的健康端点
+2. 主请求的TTFT超过历史分位数阈值时，向次优端点发起对冲请求，先返回首个chunk的胜出，其余请求的连接被直接关闭
+3. 请求失败时自动切换到下一个端点，连续失败的端点进入冷却期
+
+配置了 settings.failover.endpoints 时，通过 wrap_with_failover 将主模型客户端与备用端点一起包装。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, Any, Callable, List, Optional, Union
+
+from sagents.config.settings import get_settings
+from sagents.utils.logger import logger
+
+
+class EndpointState:
+    """单个端点的运行状态与统计"""
+
+    def __init__(self, name: str, client: Any, sample_size: int = 50):
+        """
+        初始化端点状态
+
+        Args:
+            name: 端点名称
+            client: OpenAI兼容客户端
+            sample_size: 保留的TTFT样本数量
+        """
+        self.name = name
+        self.client = client
+        self.ttft_samples = deque(maxlen=sample_size)
+        self.total_requests = 0
+        self.total_errors = 0
+        self.hedged_wins = 0
+        self.cancelled = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, ttft: Optional[float] = None):
+        """
+        记录一次成功的请求
+
+        Args:
+            ttft: 流式请求的首token时延；非流式请求的总耗时不是TTFT，传None不计入样本
+        """
+        with self._lock:
+            self.total_requests += 1
+            if ttft is not None:
+                self.ttft_samples.append(ttft)
+            self.consecutive_failures = 0
+
+    def record_error(self, failure_threshold: int, cooldown_seconds: float, new_request: bool = True):
+        """
+        记录一次失败
+
+        Args:
+            failure_threshold: 连续失败多少次后进入冷却
+            cooldown_seconds: 冷却时长（秒）
+            new_request: 是否是一次新的请求；已按成功计数的流在中途失败时为False，避免重复计数
+        """
+        with self._lock:
+            if new_request:
+                self.total_requests += 1
+            self.total_errors += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= failure_threshold:
+                self.cooldown_until = time.time() + cooldown_seconds
+                logger.warning(f"FailoverClient: 端点 {self.name} 连续失败 {self.consecutive_failures} 次，冷却 {cooldown_seconds}s")
+
+    def record_cancelled(self, elapsed: Optional[float] = None):
+        """
+        记录一次被取消的请求
+
+        Args:
+            elapsed: 取消时已等待的时间，作为该端点TTFT的下界样本，避免慢端点因一直被取消而保持低估的时延
+        """
+        with self._lock:
+            self.cancelled += 1
+            if elapsed is not None:
+                self.ttft_samples.append(elapsed)
+
+    @property
+    def error_rate(self) -> float:
+        return self.total_errors / self.total_requests if self.total_requests else 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.time() >= self.cooldown_until
+
+    def ttft_percentile(self, percentile: float) -> Optional[float]:
+        """
+        计算TTFT分位数
+
+        Args:
+            percentile: 分位数（0~1）
+
+        Returns:
+            Optional[float]: 分位数值，没有样本时返回None
+        """
+        with self._lock:
+            samples = sorted(self.ttft_samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile * (len(samples) - 1))))
+        return samples[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        median = self.ttft_percentile(0.5)
+        return {
+            'name': self.name,
+            'healthy': self.healthy,
+            'total_requests': self.total_requests,
+            'total_errors': self.total_errors,
+            'error_rate': round(self.error_rate, 4),
+            'ttft_p50': round(median, 3) if median is not None else None,
+            'hedged_wins': self.hedged_wins,
+            'cancelled': self.cancelled
+        }
+
+
+class _StreamAttempt:
+    """一次流式请求：记录响应对象，取消时由发起方直接关闭连接"""
+
+    def __init__(self, endpoint: EndpointState, close_stream: Callable[[Any], None]):
+        self.endpoint = endpoint
+        self.start_time = time.time()
+        self.cancelled = False
+        self._close_stream = close_stream
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def attach(self, stream: Any) -> bool:
+        """
+        记录已建立的响应对象
+
+        Returns:
+            bool: 请求是否仍然有效；已被取消时关闭该响应并返回False
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._stream = stream
+                return True
+        self._close_stream(stream)
+        return False
+
+    def cancel(self):
+        """取消请求：已建立的响应立即关闭，尚未建立的在建立后由工作线程关闭"""
+        with self._lock:
+            self.cancelled = True
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            self._close_stream(stream)
+
+
+class FailoverChatClient:
+    """多端点容灾 + 对冲请求的OpenAI兼容客户端"""
+
+    def __init__(self,
+                 endpoints: List[Union[Any, Dict[str, Any]]],
+                 hedge_percentile: float = 0.9,
+                 min_samples_for_hedge: int = 5,
+                 default_hedge_delay: Optional[float] = None,
+                 failure_threshold: int = 3,
+                 cooldown_seconds: float = 30.0,
+                 error_penalty: float = 5.0):
+        """
+        初始化容灾客户端
+
+        Args:
+            endpoints: 端点列表，元素可以是OpenAI兼容客户端，或包含 name/client/base_url/api_key 的字典
+            hedge_percentile: 触发对冲请求的TTFT分位数阈值
+            min_samples_for_hedge: 计算分位数所需的最少样本数，不足时使用default_hedge_delay
+            default_hedge_delay: 样本不足时的对冲等待时间（秒），为None表示样本不足时不对冲
+            failure_threshold: 连续失败多少次后进入冷却
+            cooldown_seconds: 冷却时长（秒）
+            error_penalty: 排序时错误率对时延的惩罚系数
+        """
+        if not endpoints:
+            raise ValueError("FailoverChatClient 至少需要一个端点")
+
+        self.endpoints: List[EndpointState] = [self._build_endpoint(i, ep) for i, ep in enumerate(endpoints)]
+        self.hedge_percentile = hedge_percentile
+        self.min_samples_for_hedge = min_samples_for_hedge
+        self.default_hedge_delay = default_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.error_penalty = error_penalty
+
+        # 与OpenAI客户端保持一致的调用入口：client.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+        logger.info(f"FailoverClient: 初始化完成，端点: {[ep.name for ep in self.endpoints]}")
+
+    @staticmethod
+    def _build_endpoint(index: int, endpoint: Union[Any, Dict[str, Any]]) -> EndpointState:
+        if isinstance(endpoint, dict):
+            client = endpoint.get('client')
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(base_url=endpoint['base_url'], api_key=endpoint.get('api_key', ''))
+            name = endpoint.get('name') or endpoint.get('base_url') or f"endpoint_{index}"
+            return EndpointState(name, client)
+        name = str(getattr(endpoint, 'base_url', '') or f"endpoint_{index}")
+        return EndpointState(name, endpoint)
+
+    def _ranked_endpoints(self) -> List[EndpointState]:
+        """
+        按健康状态、TTFT中位数和错误率对端点排序
+
+        没有TTFT样本的端点排在有样本的端点之后（彼此之间按错误率排序），
+        只出错、从未成功返回首token的端点不会因为时延为0而排在最前；
+        新端点通过对冲请求或前面的端点失败时被探测到。
+
+        Returns:
+            List[EndpointState]: 排序后的端点列表
+        """
+        def score(ep: EndpointState):
+            median = ep.ttft_percentile(0.5)
+            if median is None:
+                return (not ep.healthy, True, ep.error_rate)
+            return (not ep.healthy, False, median * (1 + self.error_penalty * ep.error_rate))
+        # 冷却中的端点排在最后，所有端点都在冷却时仍然按顺序尝试
+        return sorted(self.endpoints, key=score)
+
+    def _hedge_delay(self, endpoint: EndpointState) -> Optional[float]:
+        if len(endpoint.ttft_samples) >= self.min_samples_for_hedge:
+            return endpoint.ttft_percentile(self.hedge_percentile)
+        return self.default_hedge_delay
+
+    def create(self, **kwargs):
+        """
+        OpenAI兼容的 chat.completions.create 入口
+
+        Args:
+            **kwargs: 透传给底层客户端的参数
+
+        Returns:
+            流式调用返回chunk生成器，非流式调用返回响应对象
+        """
+        if kwargs.get('stream'):
+            return self._create_streaming(kwargs)
+        return self._create_non_streaming(kwargs)
+
+    def _create_non_streaming(self, kwargs: Dict[str, Any]):
+        last_error = None
+        for endpoint in self._ranked_endpoints():
+            try:
+                response = endpoint.client.chat.completions.create(**kwargs)
+                endpoint.record_success()
+                return response
+            except Exception as e:
+                last_error = e
+                endpoint.record_error(self.failure_threshold, self.cooldown_seconds)
+                logger.warning(f"FailoverClient: 端点 {endpoint.name} 请求失败，尝试下一个端点: {e}")
+        raise last_error
+
+    def _launch(self, attempt: "_StreamAttempt", kwargs: Dict[str, Any], results: "queue.Queue"):
+        """
+        在后台线程中发起流式请求，并等待首个chunk
+
+        Args:
+            attempt: 本次请求（取消时由调用方直接关闭其响应对象）
+            kwargs: 请求参数
+            results: 结果队列，放入 (endpoint, stream, iterator, first_chunk, ttft, error)
+        """
+        endpoint = attempt.endpoint
+
+        def worker():
+            stream = None
+            try:
+                stream = endpoint.client.chat.completions.create(**kwargs)
+                if not attempt.attach(stream):
+                    return
+                iterator = iter(stream)
+                first_chunk = next(iterator)
+                ttft = time.time() - attempt.start_time
+                if attempt.cancelled:
+                    return
+                results.put((endpoint, stream, iterator, first_chunk, ttft, None))
+            except Exception as e:
+                if attempt.cancelled:
+                    return
+                if stream is not None:
+                    self._close_stream(stream)
+                results.put((endpoint, None, None, None, None, e))
+
+        thread = threading.Thread(target=worker, name=f"failover-{endpoint.name}", daemon=True)
+        thread.start()
+
+    @staticmethod
+    def _close_stream(stream: Any):
+        # 工作线程可能正阻塞在读取首个chunk上，此时仅close不会断开TCP连接，
+        # 先shutdown底层socket，让服务端立即感知断开并停止生成
+        response = getattr(stream, 'response', None)
+        network_stream = (getattr(response, 'extensions', None) or {}).get('network_stream')
+        sock = network_stream.get_extra_info('socket') if network_stream is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        close = getattr(stream, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.debug(f"FailoverClient: 关闭流失败: {e}")
+
+    def _create_streaming(self, kwargs: Dict[str, Any]):
+        ranked = self._ranked_endpoints()
+        results: "queue.Queue" = queue.Queue()
+        attempts: List[_StreamAttempt] = []
+        finished_ids = set()
+        pending = 0
+        next_index = 0
+        last_error = None
+        hedged = False
+
+        def launch_next() -> bool:
+            nonlocal pending, next_index
+            if next_index >= len(ranked):
+                return False
+            attempt = _StreamAttempt(ranked[next_index], self._close_stream)
+            next_index += 1
+            attempts.append(attempt)
+            self._launch(attempt, kwargs, results)
+            pending += 1
+            return True
+
+        launch_next()
+        hedge_delay = self._hedge_delay(ranked[0])
+
+        winner = None
+        while pending > 0:
+            wait_timeout = hedge_delay if (not hedged and hedge_delay is not None and next_index < len(ranked)) else None
+            try:
+                endpoint, stream, iterator, first_chunk, ttft, error = results.get(timeout=wait_timeout)
+            except queue.Empty:
+                # 主请求TTFT超过阈值，发起对冲请求
+                hedged = True
+                logger.info(f"FailoverClient: 首token等待超过 {hedge_delay:.2f}s，向 {ranked[next_index].name} 发起对冲请求")
+                launch_next()
+                continue
+
+            pending -= 1
+            finished_ids.add(id(endpoint))
+            if error is not None:
+                last_error = error
+                endpoint.record_error(self.failure_threshold, self.cooldown_seconds)
+                logger.warning(f"FailoverClient: 端点 {endpoint.name} 流式请求失败: {error}")
+                if pending == 0:
+                    launch_next()
+                continue
+
+            endpoint.record_success(ttft)
+            if hedged and endpoint is not ranked[0]:
+                endpoint.hedged_wins += 1
+            winner = (endpoint, stream, iterator, first_chunk)
+            break
+
+        if winner is None:
+            raise last_error if last_error else RuntimeError("FailoverClient: 没有可用端点")
+
+        # 取消仍在进行的其他请求：直接关闭其响应对象，不必等到首个chunk
+        for attempt in attempts:
+            if id(attempt.endpoint) not in finished_ids:
+                attempt.cancel()
+                attempt.endpoint.record_cancelled(time.time() - attempt.start_time)
+        self._drain_losers(results, winner[0])
+
+        return self._iterate_winner(*winner)
+
+    def _drain_losers(self, results: "queue.Queue", winner: EndpointState):
+        """关闭在取消之前已经返回首个chunk、但未被选中的请求"""
+        while True:
+            try:
+                endpoint, stream, _, _, _, error = results.get_nowait()
+            except queue.Empty:
+                return
+            if endpoint is not winner and stream is not None:
+                self._close_stream(stream)
+
+    def _iterate_winner(self, endpoint: EndpointState, stream: Any, iterator: Any, first_chunk: Any):
+        yield first_chunk
+        try:
+            for chunk in iterator:
+                yield chunk
+        except Exception:
+            # 该请求在拿到首个chunk时已计为一次请求，这里只记录错误
+            endpoint.record_error(self.failure_threshold, self.cooldown_seconds, new_request=False)
+            raise
+        finally:
+            self._close_stream(stream)
+
+    def get_endpoint_stats(self) -> List[Dict[str, Any]]:
+        """
+        获取各端点的统计信息
+
+        Returns:
+            List[Dict[str, Any]]: 端点统计列表
+        """
+        return [ep.to_dict() for ep in self.endpoints]
+
+
+def wrap_with_failover(client: Any, name: str = 'primary') -> Any:
+    """
+    按 settings.failover 配置将主模型客户端包装为容灾客户端
+
+    Args:
+        client: 主模型客户端（OpenAI兼容）
+        name: 主端点名称
+
+    Returns:
+        没有配置备用端点时原样返回client，否则返回以client为首个端点的FailoverChatClient
+    """
+    config = get_settings().failover
+    if not config.endpoints:
+        return client
+    return FailoverChatClient(
+        [{'name': name, 'client': client}] + list(config.endpoints),
+        hedge_percentile=config.hedge_percentile,
+        min_samples_for_hedge=config.min_samples_for_hedge,
+        default_hedge_delay=config.default_hedge_delay,
+        failure_threshold=config.failure_threshold,
+        cooldown_seconds=config.cooldown_seconds
+    )
@@ -0,0 +1,348 @@
+"""
+文件下载器
+
+以流式分块的方式把URL下载到工作目录，不把整个文件读入内存：
+- 下载中的数据写入工作目录下 .downloads/ 中的临时文件，进度记录在同名的 .json 中，
+  中断后再次下载同一URL时通过HTTP Range从断点继续（ETag/Last-Modified/大小不变时）；
+- 服务器支持Range且文件较大时，按字节区间分段并行下载，各段直接写入临时文件的对应位置；
+- 超过大小上限时在下载前（有Content-Length时）或下载过程中中止；
+- 下载完成后按sha256与工作目录中大小相同的已有文件去重；同一URL且服务端校验信息未变化时直接复用上次下载的文件。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from sagents.utils.exceptions import DownloadError
+from sagents.utils.logger import logger
+
+DOWNLOAD_DIR_NAME = '.downloads'
+INDEX_FILE_NAME = 'index.json'
+CHUNK_SIZE = 1024 * 1024
+# 从网络读取的块大小：较小的块使中断时已收到的数据能及时写入并计入进度
+NETWORK_CHUNK_SIZE = 64 * 1024
+# 进度文件的最小保存间隔（秒）
+_PROGRESS_SAVE_INTERVAL = 1.0
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    流式计算文件的sha256
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class FileDownloader:
+    """流式、可续传、可分段并行的文件下载器"""
+
+    def __init__(self,
+                 max_size_mb: float = 1024,
+                 parallel_threshold_mb: float = 32,
+                 segments: int = 4,
+                 timeout: float = 30,
+                 headers: Optional[Dict[str, str]] = None):
+        """
+        初始化下载器
+
+        Args:
+            max_size_mb: 允许下载的最大文件大小（MB），<=0 表示不限制
+            parallel_threshold_mb: 文件大小超过该值且服务器支持Range时分段并行下载（MB）
+            segments: 并行下载的分段数，<=1 表示不分段
+            timeout: 连接和每次读取的超时时间（秒）
+            headers: 额外的请求头
+        """
+        self.max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb > 0 else None
+        self.parallel_threshold = int(parallel_threshold_mb * 1024 * 1024)
+        self.segments = max(1, segments)
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+
+    def download(self, url: str, working_dir: str, file_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        下载URL到工作目录
+
+        Args:
+            url: 文件URL
+            working_dir: 保存文件的工作目录
+            file_name: 保存的文件名，默认从URL推断
+
+        Returns:
+            Dict[str, Any]: file_path、file_size、sha256、是否去重（deduplicated）、是否续传（resumed）、分段数
+
+        Raises:
+            DownloadError: 超过大小限制或服务器响应异常
+            requests.exceptions.RequestException: 网络请求失败
+        """
+        import requests
+        download_dir = os.path.join(working_dir, DOWNLOAD_DIR_NAME)
+        os.makedirs(download_dir, exist_ok=True)
+        url_key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        part_path = os.path.join(download_dir, f"{url_key}.part")
+        progress_path = f"{part_path}.json"
+        index_path = os.path.join(download_dir, INDEX_FILE_NAME)
+
+        with requests.Session() as session:
+            session.headers.update(self.headers)
+            remote = self._probe(session, url)
+            self._check_size(remote['size'])
+
+            reused = self._reuse_previous(index_path, url, remote)
+            if reused:
+                return reused
+
+            progress = _read_json(progress_path)
+            # 只有服务端提供ETag/Last-Modified时才续传，避免拼接不同版本的内容
+            resumable = bool(remote['accept_ranges'] and remote['size'] and remote['validator'] and progress
+                             and progress.get('validator') == remote['validator']
+                             and progress.get('size') == remote['size'] and os.path.exists(part_path))
+            if resumable:
+                segments = progress['segments']
+                logger.info(f"FileDownloader: 从断点继续下载 {url}，"
+                            f"已完成 {sum(s[2] for s in segments)}/{remote['size']} 字节")
+            else:
+                segments = self._plan_segments(remote)
+                with open(part_path, 'wb') as f:
+                    if remote['size'] and len(segments) > 1:
+                        f.truncate(remote['size'])
+            progress = {'url': url, 'validator': remote['validator'], 'size': remote['size'], 'segments': segments}
+
+            try:
+                if remote['accept_ranges'] and remote['size']:
+                    self._download_ranges(session, url, part_path, progress, progress_path)
+                else:
+                    self._download_stream(session, url, part_path)
+            except Exception:
+                if remote['accept_ranges'] and remote['size']:
+                    # 保留已下载的部分，下次从断点继续
+                    _write_json(progress_path, progress)
+                else:
+                    self._remove(part_path, progress_path)
+                raise
+
+        size = os.path.getsize(part_path)
+        if remote['size'] and size != remote['size']:
+            self._remove(part_path, progress_path)
+            raise DownloadError(f"下载的文件大小不完整: {size}/{remote['size']} 字节")
+        sha256 = file_sha256(part_path)
+
+        duplicate = self._find_duplicate(working_dir, size, sha256)
+        if duplicate:
+            self._remove(part_path, progress_path)
+            file_path = duplicate
+            logger.info(f"FileDownloader: {url} 与已有文件 {duplicate} 内容相同，复用已有文件")
+        else:
+            file_path = self._unique_path(working_dir, file_name or self._file_name_from_url(url, url_key))
+            os.replace(part_path, file_path)
+            self._remove(progress_path)
+
+        self._record(index_path, url, remote, file_path, size, sha256)
+        return {
+            'file_path': file_path,
+            'file_size': size,
+            'sha256': sha256,
+            'deduplicated': bool(duplicate),
+            'resumed': resumable,
+            'segments': len(segments)
+        }
+
+    def _probe(self, session, url: str) -> Dict[str, Any]:
+        """HEAD请求获取大小、是否支持Range和校验信息；HEAD不可用时返回未知"""
+        import requests
+        remote = {'size': None, 'accept_ranges': False, 'validator': None}
+        try:
+            response = session.head(url, allow_redirects=True, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"FileDownloader: HEAD请求失败，按未知大小下载: {e}")
+            return remote
+        if response.status_code >= 400:
+            return remote
+        length = response.headers.get('Content-Length')
+        encoding = response.headers.get('Content-Encoding', 'identity')
+        if length and length.isdigit() and encoding == 'identity':
+            remote['size'] = int(length)
+        remote['accept_ranges'] = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            remote['validator'] = etag or last_modified
+        return remote
+
+    def _check_size(self, size: Optional[int]):
+        if self.max_bytes is not None and size is not None and size > self.max_bytes:
+            raise DownloadError(f"文件过大: {size / (1024 * 1024):.2f}MB 超过 {self.max_bytes / (1024 * 1024):.0f}MB 限制")
+
+    def _plan_segments(self, remote: Dict[str, Any]) -> List[List[int]]:
+        """划分下载区间 [start, end, 已下载字节数]，大小未知时 end 为 -1"""
+        size = remote['size']
+        if not size:
+            return [[0, -1, 0]]
+        count = self.segments if remote['accept_ranges'] and size >= self.parallel_threshold else 1
+        step = -(-size // count)
+        return [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+
+    def _download_stream(self, session, url: str, part_path: str):
+        """单个请求流式下载（服务器不支持Range或大小未知）"""
+        with session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            written = 0
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(NETWORK_CHUNK_SIZE):
+                    written += len(chunk)
+                    if self.max_bytes is not None and written > self.max_bytes:
+                        raise DownloadError(f"文件过大: 已超过 {self.max_bytes / (1024 * 1024):.0f}MB 限制，已中止下载")
+                    f.write(chunk)
+
+    def _download_ranges(self, session, url: str, part_path: str,
+                         progress: Dict[str, Any], progress_path: str):
+        """按区间下载（并行或续传），各区间写入临时文件的对应位置"""
+        lock = threading.Lock()
+        last_save = [time.time()]
+
+        def fetch(segment: List[int]):
+            start, end, done = segment
+            if start + done > end:
+                return
+            headers = {'Range': f"bytes={start + done}-{end}"}
+            if progress['validator']:
+                headers['If-Range'] = progress['validator']
+            with session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise DownloadError("服务器未按Range返回部分内容，文件可能已变化")
+                with open(part_path, 'r+b') as f:
+                    f.seek(start + done)
+                    for chunk in response.iter_content(NETWORK_CHUNK_SIZE):
+                        chunk = chunk[:end + 1 - (start + segment[2])]
+                        f.write(chunk)
+                        with lock:
+                            segment[2] += len(chunk)
+                            if time.time() - last_save[0] >= _PROGRESS_SAVE_INTERVAL:
+                                last_save[0] = time.time()
+                                _write_json(progress_path, progress)
+                        if start + segment[2] > end:
+                            break
+
+        segments = progress['segments']
+        if len(segments) == 1:
+            fetch(segments[0])
+            return
+        with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix='download') as executor:
+            for future in [executor.submit(fetch, segment) for segment in segments]:
+                future.result()
+
+    def _reuse_previous(self, index_path: str, url: str, remote: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """同一URL的校验信息和大小未变化，且上次保存的文件仍在时直接复用"""
+        if not remote['validator']:
+            return None
+        record = _read_json(index_path).get(url)
+        if not record or record.get('validator') != remote['validator'] or record.get('size') != remote['size']:
+            return None
+        file_path = record.get('file_path')
+        if not file_path or not os.path.exists(file_path) or os.path.getsize(file_path) != record['size']:
+            return None
+        logger.info(f"FileDownloader: {url} 未变化，复用已下载的文件 {file_path}")
+        return {
+            'file_path': file_path,
+            'file_size': record['size'],
+            'sha256': record.get('sha256'),
+            'deduplicated': True,
+            'resumed': False,
+            'segments': 0
+        }
+
+    @staticmethod
+    def _find_duplicate(working_dir: str, size: int, sha256: str) -> Optional[str]:
+        """在工作目录（不含子目录）中查找内容相同的文件，只对大小相同的文件计算哈希"""
+        try:
+            entries = list(os.scandir(working_dir))
+        except OSError:
+            return None
+        for entry in entries:
+            try:
+                if not entry.is_file() or entry.stat().st_size != size:
+                    continue
+                if file_sha256(entry.path) == sha256:
+                    return entry.path
+            except OSError:
+                continue
+        return None
+
+    @staticmethod
+    def _record(index_path: str, url: str, remote: Dict[str, Any], file_path: str, size: int, sha256: str):
+        index = _read_json(index_path)
+        index[url] = {'validator': remote['validator'], 'size': size, 'sha256': sha256, 'file_path': file_path}
+        try:
+            _write_json(index_path, index)
+        except OSError as e:
+            logger.debug(f"FileDownloader: 无法写入下载索引: {e}")
+
+    @staticmethod
+    def _file_name_from_url(url: str, fallback: str) -> str:
+        path = urllib.parse.urlparse(url).path
+        file_name = os.path.basename(urllib.parse.unquote(path))
+        return file_name or f"downloaded_file_{fallback[:8]}"
+
+    @staticmethod
+    def _unique_path(working_dir: str, file_name: str) -> str:
+        file_path = os.path.join(working_dir, file_name)
+        name, ext = os.path.splitext(file_path)
+        counter = 1
+        while os.path.exists(file_path):
+            file_path = f"{name}_{counter}{ext}"
+            counter += 1
+        return file_path
+
+    @staticmethod
+    def _remove(*paths: str):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def get_file_downloader() -> FileDownloader:
+    """
+    按配置创建下载器
+
+    Returns:
+        FileDownloader: 下载器
+    """
+    from sagents.config.settings import get_settings
+    tool_config = get_settings().tool
+    return FileDownloader(
+        max_size_mb=tool_config.download_max_size_mb,
+        parallel_threshold_mb=tool_config.download_parallel_threshold_mb,
+        segments=tool_config.download_segments
+    )
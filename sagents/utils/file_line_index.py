@@ -0,0 +1,364 @@
+"""
+文件行偏移索引
+
+为按行范围读取大文件（如多GB的日志）提供随机访问：通过mmap按块统计换行符，
+记录每个块之前的换行数（稀疏索引，内存占用与文件大小/块大小成正比），
+定位某一行时二分查找所在的块，只在该块内查找换行位置，无需读取整个文件。
+索引和检测到的编码按 (路径, mtime, 大小) 缓存，文件变化后自动失效。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import bisect
+import codecs
+import mmap
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from sagents.utils.logger import logger
+
+# 索引块大小（字节）：定位一行最多在一个块内查找
+BLOCK_SIZE = 256 * 1024
+# 编码检测读取的字节数
+ENCODING_SAMPLE_SIZE = 10000
+# 最多缓存的文件数
+MAX_CACHED_FILES = 64
+# 可按字节切分行的编码中单个字符的最大字节数（UTF-8、GB18030 为4）
+MAX_CHAR_BYTES = 4
+
+FileKey = Tuple[str, int, int]
+
+
+def get_file_key(file_path: str) -> FileKey:
+    """
+    获取文件缓存键 (绝对路径, mtime_ns, 文件大小)
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        FileKey: 缓存键
+    """
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+class _LRUCache:
+    """按文件键缓存的线程安全LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: FileKey) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: FileKey, value: Any):
+        with self._lock:
+            # 同一路径只保留最新版本
+            for stale in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[stale]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_index_cache = _LRUCache(MAX_CACHED_FILES)
+_encoding_cache = _LRUCache(MAX_CACHED_FILES * 4)
+
+
+def detect_file_encoding(file_path: str, key: Optional[FileKey] = None) -> str:
+    """
+    检测文件编码（按文件键缓存）
+
+    Args:
+        file_path: 文件路径
+        key: 已获取的文件缓存键，为None时重新stat
+
+    Returns:
+        str: 编码名称；检测失败时返回utf-8，检测为ascii时返回utf-8（兼容后续出现的非ASCII内容）
+    """
+    key = key or get_file_key(file_path)
+    encoding = _encoding_cache.get(key)
+    if encoding is not None:
+        return encoding
+    import chardet
+    try:
+        with open(file_path, 'rb') as f:
+            encoding = chardet.detect(f.read(ENCODING_SAMPLE_SIZE)).get('encoding') or 'utf-8'
+    except Exception:
+        encoding = 'utf-8'
+    if encoding.lower() == 'ascii':
+        encoding = 'utf-8'
+    _encoding_cache.set(key, encoding)
+    return encoding
+
+
+def is_line_indexable(encoding: str) -> bool:
+    """
+    判断编码是否能按字节 \\n 切分行（UTF-16/32 等编码不能）
+
+    Args:
+        encoding: 编码名称
+
+    Returns:
+        bool: 是否可以使用行偏移索引
+    """
+    try:
+        return '\n'.encode(encoding) == b'\n' and 'a\n'.encode(encoding) == b'a\n'
+    except (LookupError, UnicodeError):
+        return False
+
+
+class LineIndex:
+    """文件的稀疏行偏移索引"""
+
+    def __init__(self, file_path: str, key: FileKey, block_size: int = BLOCK_SIZE):
+        """
+        扫描文件建立索引
+
+        Args:
+            file_path: 文件路径
+            key: 文件缓存键
+            block_size: 索引块大小（字节）
+        """
+        self.file_path = file_path
+        self.key = key
+        self.size = key[2]
+        self.block_size = block_size
+        # newlines_before[b] 为第b个块之前的换行符数量
+        self.newlines_before = array('q', [0])
+        self.ends_with_newline = False
+        if self.size == 0:
+            self.total_newlines = 0
+            return
+        start_time = time.time()
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            total = 0
+            for start in range(0, self.size, block_size):
+                total += mm[start:start + block_size].count(b'\n')
+                self.newlines_before.append(total)
+            self.ends_with_newline = mm[self.size - 1:self.size] == b'\n'
+        self.total_newlines = total
+        logger.debug(f"LineIndex: 为 {file_path} 建立行索引，{self.size} 字节，{self.total_lines} 行，"
+                     f"耗时 {time.time() - start_time:.3f}s")
+
+    @property
+    def total_lines(self) -> int:
+        """总行数（与 readlines() 的结果一致：最后一行没有换行符时也计为一行）"""
+        if self.size == 0:
+            return 0
+        return self.total_newlines + (0 if self.ends_with_newline else 1)
+
+    def line_offset(self, mm: mmap.mmap, line: int) -> int:
+        """
+        获取某一行起始位置的字节偏移
+
+        Args:
+            mm: 文件的mmap
+            line: 行号（从0开始），超出总行数时返回文件大小
+
+        Returns:
+            int: 字节偏移
+        """
+        if line <= 0:
+            return 0
+        if line > self.total_newlines:
+            return self.size
+        # 第line行从第line个换行符之后开始，先找到该换行符所在的块
+        block = bisect.bisect_left(self.newlines_before, line) - 1
+        pos = block * self.block_size
+        remaining = line - self.newlines_before[block]
+        while remaining > 0:
+            pos = mm.find(b'\n', pos) + 1
+            remaining -= 1
+        return pos
+
+    def line_at(self, mm: mmap.mmap, offset: int) -> int:
+        """
+        获取字节偏移之前完整结束的行数（即偏移所在行的行号）
+
+        Args:
+            mm: 文件的mmap
+            offset: 字节偏移
+
+        Returns:
+            int: 行号
+        """
+        offset = max(0, min(offset, self.size))
+        block = offset // self.block_size
+        return self.newlines_before[block] + mm[block * self.block_size:offset].count(b'\n')
+
+
+def get_line_index(file_path: str, key: Optional[FileKey] = None) -> LineIndex:
+    """
+    获取文件的行索引，文件未变化时复用缓存
+
+    Args:
+        file_path: 文件路径
+        key: 已获取的文件缓存键，为None时重新stat
+
+    Returns:
+        LineIndex: 行索引
+    """
+    key = key or get_file_key(file_path)
+    index = _index_cache.get(key)
+    if index is None:
+        index = LineIndex(file_path, key)
+        _index_cache.set(key, index)
+    return index
+
+
+def read_line_range(file_path: str,
+                    start_line: int = 0,
+                    end_line: Optional[int] = None,
+                    encoding: str = 'auto',
+                    max_bytes: Optional[int] = None,
+                    line_byte_offset: int = 0) -> Dict[str, Any]:
+    """
+    读取文件的行范围 [start_line, end_line)
+
+    超出 max_bytes 时只返回范围开头能容纳的完整行；第一行本身就超过 max_bytes 时只返回该行的开头部分
+    （在字符边界处截断），line_cut 为True，并通过 next_start_line / next_line_byte_offset 给出在该行内继续读取的位置。
+
+    Args:
+        file_path: 文件路径
+        start_line: 开始行号（从0开始）
+        end_line: 结束行号（不包含），None表示读取到末尾
+        encoding: 文件编码，'auto'表示自动检测
+        max_bytes: 单次读取的最大字节数
+        line_byte_offset: 从开始行内的该字节偏移处开始读取，用于继续读取被截断的超长行
+
+    Returns:
+        Dict[str, Any]: content、start_line、end_line、total_lines、encoding、是否被截断（truncated）、
+        单行是否被截断（line_cut），截断时还包含继续读取的 next_start_line 与 next_line_byte_offset
+    """
+    key = get_file_key(file_path)
+    if encoding == 'auto':
+        encoding = detect_file_encoding(file_path, key)
+    if not is_line_indexable(encoding):
+        return _read_line_range_text(file_path, start_line, end_line, encoding, max_bytes, line_byte_offset)
+
+    index = get_line_index(file_path, key)
+    total_lines = index.total_lines
+    start_line = max(0, start_line)
+    end_line = total_lines if end_line is None else min(total_lines, end_line)
+    result = {'start_line': start_line, 'end_line': end_line, 'total_lines': total_lines,
+              'encoding': encoding, 'truncated': False, 'line_cut': False, 'content': ''}
+    if index.size == 0 or start_line >= end_line:
+        return result
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_start = index.line_offset(mm, start_line)
+        end = index.line_offset(mm, end_line)
+        start = min(line_start + max(0, line_byte_offset), end)
+        if max_bytes is not None and end - start > max_bytes:
+            # 截断到能完整容纳的最后一行；单行就超过限制时在字符边界处截断该行
+            fit_line = index.line_at(mm, start + max_bytes)
+            result['truncated'] = True
+            if fit_line > start_line:
+                end_line = fit_line
+                end = index.line_offset(mm, end_line)
+                result.update(end_line=end_line, next_start_line=end_line, next_line_byte_offset=0)
+            else:
+                raw = mm[start:start + max_bytes]
+                if raw.endswith(b'\r') and mm[start + len(raw):start + len(raw) + 1] == b'\n':
+                    # 不在 \r\n 中间截断，否则续读的内容以单独的 \n 开头，多出一个空行
+                    raw = raw[:-1] if len(raw) > 1 else raw + b'\n'
+                text, consumed = _decode_prefix(raw, encoding)
+                if not consumed:
+                    # max_bytes 小于一个字符时至少读取一个完整字符，保证续读位置前进
+                    text, consumed = _decode_prefix(mm[start:min(start + MAX_CHAR_BYTES, end)], encoding)
+                    text = text[:1]
+                    consumed = len(text.encode(encoding)) or end - start
+                result.update(end_line=start_line, line_cut=True, next_start_line=start_line,
+                              next_line_byte_offset=start - line_start + consumed,
+                              content=text.replace('\r\n', '\n').replace('\r', '\n'))
+                return result
+        raw = mm[start:end]
+    result['content'] = raw.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+    return result
+
+
+def _decode_prefix(raw: bytes, encoding: str) -> Tuple[str, int]:
+    """解码字节串中完整的字符，返回文本和实际消耗的字节数（末尾不完整的多字节字符留给下次读取）"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    text = decoder.decode(raw, final=False)
+    return text, len(raw) - len(decoder.getstate()[0])
+
+
+def _read_line_range_text(file_path: str,
+                          start_line: int,
+                          end_line: Optional[int],
+                          encoding: str,
+                          max_bytes: Optional[int] = None,
+                          line_byte_offset: int = 0) -> Dict[str, Any]:
+    """
+    不能按字节切分行的编码：按文本模式流式读取，不把整个文件读入内存
+
+    max_bytes 与 line_byte_offset 的含义与 read_line_range 相同，字节数按该编码（不含BOM）计算
+    """
+    start_line = max(0, start_line)
+    bom = len(''.encode(encoding))
+    lines = []
+    size = 0
+    total_lines = 0
+    cut = {}
+    with open(file_path, 'r', encoding=encoding) as f:
+        for total_lines, line in enumerate(f, start=1):
+            line_no = total_lines - 1
+            if line_no < start_line or (end_line is not None and line_no >= end_line) or cut:
+                continue
+            skipped = 0
+            if line_no == start_line and line_byte_offset > 0:
+                skip_chars = _prefix_chars(line, line_byte_offset, encoding, bom)
+                skipped = len(line[:skip_chars].encode(encoding)) - bom
+                line = line[skip_chars:]
+            line_size = len(line.encode(encoding)) - bom
+            if max_bytes is None or size + line_size <= max_bytes:
+                lines.append(line)
+                size += line_size
+            elif lines:
+                cut = {'truncated': True, 'end_line': line_no, 'next_start_line': line_no, 'next_line_byte_offset': 0}
+            else:
+                # 单行就超过限制时在字符边界处截断该行，至少读取一个字符
+                prefix = line[:max(_prefix_chars(line, max_bytes, encoding, bom), 1)]
+                lines.append(prefix)
+                cut = {'truncated': True, 'line_cut': True, 'end_line': line_no, 'next_start_line': line_no,
+                       'next_line_byte_offset': skipped + len(prefix.encode(encoding)) - bom}
+    end_line = total_lines if end_line is None else min(total_lines, end_line)
+    result = {'start_line': start_line, 'end_line': end_line, 'total_lines': total_lines,
+              'encoding': encoding, 'truncated': False, 'line_cut': False, 'content': ''.join(lines)}
+    result.update(cut)
+    return result
+
+
+def _prefix_chars(text: str, limit: int, encoding: str, bom: int) -> int:
+    """返回编码后不超过 limit 字节（不含BOM）的最长前缀的字符数"""
+    size = 0
+    for i, char in enumerate(text):
+        size += len(char.encode(encoding)) - bom
+        if size > limit:
+            return i
+    return len(text)
+
+
+def clear_line_index_cache():
+    """清除行索引和编码缓存"""
+    _index_cache.clear()
+    _encoding_cache.clear()
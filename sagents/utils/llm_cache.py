@@ -0,0 +1,292 @@
+"""
+LLM响应缓存
+
+基于内容寻址的LLM响应缓存，缓存键由 模型 + 消息 + 调用配置 的哈希决定。
+提供内存LRU与磁盘两级存储，支持TTL过期，流式响应以chunk序列的形式缓存，
+命中时回放为合成的chunk对象，对下游解析逻辑透明。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+
+from sagents.utils.logger import logger
+
+# 只影响传输、不影响生成内容的调用参数，不参与缓存键（会话预算会按剩余时间逐次改写timeout）
+NON_KEY_PARAMS = ('timeout',)
+
+
+class LLMResponseCache:
+    """LLM响应缓存 - 内存LRU + 可选磁盘持久化"""
+
+    def __init__(self,
+                 max_entries: int = 256,
+                 ttl_seconds: float = 3600,
+                 disk_dir: Optional[str] = None):
+        """
+        初始化LLM响应缓存
+
+        Args:
+            max_entries: 内存中最多保留的条目数，超过后按LRU淘汰
+            ttl_seconds: 条目存活时间（秒），<=0 表示永不过期
+            disk_dir: 磁盘缓存目录，为None时只使用内存缓存
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {
+            'hits': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        logger.info(f"{self.__class__.__name__}: 初始化完成，max_entries={max_entries}, ttl={ttl_seconds}s, disk_dir={disk_dir}")
+
+    @staticmethod
+    def make_key(messages: List[Dict[str, Any]], model_config: Dict[str, Any], stream: bool) -> str:
+        """
+        根据模型、消息和调用配置生成缓存键
+
+        Args:
+            messages: 输入消息列表
+            model_config: 最终的模型调用配置（包含model、temperature、tools等），NON_KEY_PARAMS中的参数不参与
+            stream: 是否为流式调用
+
+        Returns:
+            str: sha256 十六进制摘要
+        """
+        payload = {
+            'model': model_config.get('model'),
+            'messages': messages,
+            'config': {k: v for k, v in model_config.items() if k not in NON_KEY_PARAMS},
+            'stream': stream
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存条目，先查内存再查磁盘
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[Dict[str, Any]]: 命中时返回条目，否则返回None
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._is_expired(entry):
+                    del self._memory[key]
+                    self._remove_disk_entry(key)
+                else:
+                    self._memory.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self.stats['memory_hits'] += 1
+                    return entry
+
+            entry = self._load_disk_entry(key)
+            if entry is not None:
+                self._put_memory(key, entry)
+                self.stats['hits'] += 1
+                self.stats['disk_hits'] += 1
+                return entry
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key: str, kind: str, payload: Any, ttl: Optional[float] = None):
+        """
+        写入缓存条目
+
+        Args:
+            key: 缓存键
+            kind: 条目类型，"stream" 表示chunk列表，"response" 表示完整响应
+            payload: 已序列化为基础类型的响应数据
+            ttl: 该条目的存活时间（秒），为None时使用缓存默认的TTL
+        """
+        entry = {'kind': kind, 'payload': payload, 'created_at': time.time()}
+        if ttl is not None:
+            entry['ttl'] = ttl
+        with self._lock:
+            self._put_memory(key, entry)
+            self.stats['stores'] += 1
+            if self.disk_dir:
+                try:
+                    path = self._disk_path(key)
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(entry, f, ensure_ascii=False)
+                    os.replace(tmp_path, path)
+                except Exception as e:
+                    logger.warning(f"{self.__class__.__name__}: 写入磁盘缓存失败: {e}")
+
+    def clear(self):
+        """清空内存与磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self.disk_dir and os.path.isdir(self.disk_dir):
+                for name in os.listdir(self.disk_dir):
+                    if name.endswith('.json'):
+                        try:
+                            os.remove(os.path.join(self.disk_dir, name))
+                        except OSError:
+                            pass
+        logger.info(f"{self.__class__.__name__}: 缓存已清空")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 命中/未命中/写入/淘汰次数及当前条目数
+        """
+        with self._lock:
+            total = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._memory),
+                'hit_rate': round(self.stats['hits'] / total, 4) if total else 0.0
+            }
+
+    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+        ttl = entry.get('ttl', self.ttl_seconds)
+        if ttl is None or ttl <= 0:
+            return False
+        return time.time() - entry.get('created_at', 0) > ttl
+
+    def _put_memory(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _load_disk_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except Exception as e:
+            logger.warning(f"{self.__class__.__name__}: 读取磁盘缓存失败: {e}")
+            return None
+        if self._is_expired(entry):
+            self._remove_disk_entry(key)
+            return None
+        return entry
+
+    def _remove_disk_entry(self, key: str):
+        if not self.disk_dir:
+            return
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+
+def serialize_llm_object(obj: Any) -> Optional[Dict[str, Any]]:
+    """
+    将OpenAI响应对象（chunk或completion）序列化为字典
+
+    Args:
+        obj: 响应对象
+
+    Returns:
+        Optional[Dict[str, Any]]: 序列化结果，无法序列化时返回None
+    """
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    if isinstance(obj, dict):
+        return obj
+    return None
+
+
+def to_namespace(data: Any) -> Any:
+    """
+    将序列化的字典递归转换为支持属性访问的对象，用于回放缓存的响应
+
+    Args:
+        data: 字典/列表/基础类型
+
+    Returns:
+        Any: SimpleNamespace 结构
+    """
+    if isinstance(data, dict):
+        return SimpleNamespace(**{k: to_namespace(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return [to_namespace(item) for item in data]
+    return data
+
+
+# 全局缓存实例
+_llm_cache_instance: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    获取全局LLM响应缓存实例，首次调用时按配置创建
+
+    Returns:
+        LLMResponseCache: 全局缓存实例
+    """
+    global _llm_cache_instance
+    if _llm_cache_instance is None:
+        with _llm_cache_lock:
+            if _llm_cache_instance is None:
+                from sagents.config.settings import get_settings
+                cache_config = get_settings().cache
+                _llm_cache_instance = LLMResponseCache(
+                    max_entries=cache_config.llm_cache_max_entries,
+                    ttl_seconds=cache_config.llm_cache_ttl,
+                    disk_dir=cache_config.llm_cache_dir
+                )
+    return _llm_cache_instance
+
+
+def is_llm_cache_enabled(caller_name: str) -> bool:
+    """
+    判断调用方是否启用LLM响应缓存（全局开关打开，且智能体列表为空或包含该调用方）
+
+    Args:
+        caller_name: 调用方名称，智能体为类名
+
+    Returns:
+        bool: 是否启用
+    """
+    from sagents.config.settings import get_settings
+    cache_config = get_settings().cache
+    return cache_config.enable_llm_cache and (
+        not cache_config.llm_cache_agents or caller_name in cache_config.llm_cache_agents
+    )
+
+
+def reset_llm_cache():
+    """重置全局LLM响应缓存实例（配置变更后调用）"""
+    global _llm_cache_instance
+    with _llm_cache_lock:
+        _llm_cache_instance = None
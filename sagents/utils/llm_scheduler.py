@@ -0,0 +1,349 @@
+"""
+LLM调用调度器
+
+在所有会话共享的 AgentBase LLM 调用前增加一层客户端调度：
+1. 按端点的令牌桶限制每分钟请求数（RPM）和每分钟token数（TPM），避免触发429
+2. 优先级调度：快速模式 > 深度研究 > 后台总结
+3. 同优先级内按会话公平调度，已获得调用次数少的会话优先
+4. 统计排队等待时间
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import itertools
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from sagents.utils.logger import logger
+
+
+class LLMPriority:
+    """LLM调用优先级，数值越小优先级越高"""
+    RAPID = 0           # 快速模式（直接执行）
+    DEEP_RESEARCH = 1   # 深度研究（多智能体协作）
+    BACKGROUND = 2      # 后台任务（阶段总结等）
+
+    NAMES = {RAPID: 'rapid', DEEP_RESEARCH: 'deep_research', BACKGROUND: 'background'}
+
+
+class TokenBucket:
+    """令牌桶，按分钟速率匀速补充"""
+
+    def __init__(self, per_minute: float):
+        """
+        初始化令牌桶
+
+        Args:
+            per_minute: 每分钟补充的令牌数，<=0 表示不限制
+        """
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.per_minute or self.per_minute <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.per_minute / 60.0)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        计算获取指定数量令牌需要等待的时间
+
+        单次请求超过桶容量时按桶满计算，避免永远无法获取。
+
+        Args:
+            amount: 需要的令牌数
+
+        Returns:
+            float: 需要等待的秒数，0表示可以立即获取
+        """
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.per_minute
+
+    def consume(self, amount: float):
+        if self.unlimited:
+            return
+        self._refill()
+        # 允许透支，透支部分由后续补充抵扣
+        self.tokens -= amount
+
+
+class _Ticket:
+    """一次排队中的LLM调用"""
+
+    def __init__(self, seq: int, endpoint: str, session_id: Optional[str], priority: int, estimated_tokens: int):
+        self.seq = seq
+        self.endpoint = endpoint
+        self.session_id = session_id
+        self.priority = priority
+        self.estimated_tokens = estimated_tokens
+        self.enqueued_at = time.monotonic()
+        self.wait_time = 0.0
+
+
+class LLMScheduler:
+    """共享的LLM调用调度器"""
+
+    def __init__(self,
+                 default_rpm: float = 0,
+                 default_tpm: float = 0,
+                 endpoint_limits: Optional[Dict[str, Dict[str, float]]] = None):
+        """
+        初始化调度器
+
+        Args:
+            default_rpm: 默认每分钟请求数限制，<=0 表示不限制
+            default_tpm: 默认每分钟token数限制，<=0 表示不限制
+            endpoint_limits: 端点级别的限制，{endpoint: {"rpm": ..., "tpm": ...}}
+        """
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {}
+        self._waiting: List[_Ticket] = []
+        self._session_grants: Dict[str, int] = {}
+        self._session_priorities: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.metrics = {
+            'total_acquired': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'by_priority': {name: {'count': 0, 'total_wait_time': 0.0, 'max_wait_time': 0.0}
+                            for name in LLMPriority.NAMES.values()}
+        }
+
+        logger.info(f"LLMScheduler: 初始化完成，默认RPM={default_rpm}, 默认TPM={default_tpm}")
+
+    def set_session_priority(self, session_id: str, priority: int):
+        """
+        设置会话的默认优先级
+
+        Args:
+            session_id: 会话ID
+            priority: LLMPriority中的优先级
+        """
+        with self._cond:
+            self._session_priorities[session_id] = priority
+
+    def clear_session(self, session_id: str):
+        """
+        清理会话的调度状态
+
+        Args:
+            session_id: 会话ID
+        """
+        with self._cond:
+            self._session_priorities.pop(session_id, None)
+            self._session_grants.pop(session_id, None)
+
+    def resolve_priority(self, session_id: Optional[str], priority: Optional[int] = None) -> int:
+        """
+        解析调用的优先级：显式优先级与会话优先级取较低者（数值较大者）
+
+        Args:
+            session_id: 会话ID
+            priority: 调用方指定的优先级
+
+        Returns:
+            int: 最终优先级，两者都未指定时为DEEP_RESEARCH
+        """
+        session_priority = self._session_priorities.get(session_id) if session_id else None
+        if priority is None:
+            return session_priority if session_priority is not None else LLMPriority.DEEP_RESEARCH
+        if session_priority is None:
+            return priority
+        return max(priority, session_priority)
+
+    def _get_buckets(self, endpoint: str) -> Dict[str, TokenBucket]:
+        if endpoint not in self._buckets:
+            limits = self.endpoint_limits.get(endpoint, {})
+            self._buckets[endpoint] = {
+                'rpm': TokenBucket(limits.get('rpm', self.default_rpm)),
+                'tpm': TokenBucket(limits.get('tpm', self.default_tpm))
+            }
+        return self._buckets[endpoint]
+
+    def _is_head(self, ticket: _Ticket) -> bool:
+        """判断ticket是否为该端点等待队列中最应被调度的调用"""
+        candidates = [t for t in self._waiting if t.endpoint == ticket.endpoint]
+        head = min(candidates, key=lambda t: (t.priority, self._session_grants.get(t.session_id, 0), t.seq))
+        return head is ticket
+
+    def acquire(self, endpoint: str, session_id: Optional[str] = None, priority: Optional[int] = None, estimated_tokens: int = 0) -> _Ticket:
+        """
+        申请一次LLM调用的执行许可，阻塞直到获得许可
+
+        Args:
+            endpoint: 端点标识（通常为base_url）
+            session_id: 会话ID
+            priority: 调用优先级，为None时使用会话优先级
+            estimated_tokens: 预估的输入token数，用于TPM限流
+
+        Returns:
+            _Ticket: 调用凭证，调用结束后需传给release
+        """
+        with self._cond:
+            ticket = _Ticket(next(self._seq), endpoint, session_id, self.resolve_priority(session_id, priority), estimated_tokens)
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    if self._is_head(ticket):
+                        buckets = self._get_buckets(endpoint)
+                        wait = max(buckets['rpm'].wait_time(1), buckets['tpm'].wait_time(estimated_tokens))
+                        if wait <= 0:
+                            buckets['rpm'].consume(1)
+                            buckets['tpm'].consume(estimated_tokens)
+                            break
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait(timeout=1.0)
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+            if session_id:
+                self._session_grants[session_id] = self._session_grants.get(session_id, 0) + 1
+            ticket.wait_time = time.monotonic() - ticket.enqueued_at
+            self._record_wait(ticket)
+
+        if ticket.wait_time > 0.5:
+            logger.info(f"LLMScheduler: 会话 {session_id} 在端点 {endpoint} 排队 {ticket.wait_time:.2f}s（优先级 {LLMPriority.NAMES.get(ticket.priority)}）")
+        return ticket
+
+    def release(self, ticket: _Ticket, actual_tokens: Optional[int] = None):
+        """
+        调用结束后按实际token用量修正TPM令牌桶
+
+        Args:
+            ticket: acquire返回的凭证
+            actual_tokens: 实际消耗的总token数，为None时不修正
+        """
+        if actual_tokens is None:
+            return
+        with self._cond:
+            delta = actual_tokens - ticket.estimated_tokens
+            if delta:
+                self._get_buckets(ticket.endpoint)['tpm'].consume(delta)
+            self._cond.notify_all()
+
+    def _record_wait(self, ticket: _Ticket):
+        name = LLMPriority.NAMES.get(ticket.priority, str(ticket.priority))
+        self.metrics['total_acquired'] += 1
+        self.metrics['total_wait_time'] += ticket.wait_time
+        self.metrics['max_wait_time'] = max(self.metrics['max_wait_time'], ticket.wait_time)
+        priority_metrics = self.metrics['by_priority'].setdefault(name, {'count': 0, 'total_wait_time': 0.0, 'max_wait_time': 0.0})
+        priority_metrics['count'] += 1
+        priority_metrics['total_wait_time'] += ticket.wait_time
+        priority_metrics['max_wait_time'] = max(priority_metrics['max_wait_time'], ticket.wait_time)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        获取排队等待指标
+
+        Returns:
+            Dict[str, Any]: 总体及各优先级的调用次数、平均/最大等待时间、当前排队数
+        """
+        with self._cond:
+            result = {
+                'total_acquired': self.metrics['total_acquired'],
+                'avg_wait_time': round(self.metrics['total_wait_time'] / self.metrics['total_acquired'], 4) if self.metrics['total_acquired'] else 0.0,
+                'max_wait_time': round(self.metrics['max_wait_time'], 4),
+                'queue_length': len(self._waiting),
+                'by_priority': {}
+            }
+            for name, m in self.metrics['by_priority'].items():
+                result['by_priority'][name] = {
+                    'count': m['count'],
+                    'avg_wait_time': round(m['total_wait_time'] / m['count'], 4) if m['count'] else 0.0,
+                    'max_wait_time': round(m['max_wait_time'], 4)
+                }
+            return result
+
+
+# 中日韩文字及全角符号，常见分词器中每个字符约为一个token
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    粗略估算一段文本的token数：中日韩字符按每字1个token，其余文本按每4个字符1个token
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + -(-(len(text) - cjk) // 4)
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """
+    粗略估算消息的token数
+
+    Args:
+        messages: 消息列表
+
+    Returns:
+        int: 估算的token数
+    """
+    total = 0
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            total += estimate_text_tokens(content)
+        elif content:
+            total += estimate_text_tokens(str(content))
+    return total
+
+
+# 全局调度器实例
+_scheduler_instance: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> Optional[LLMScheduler]:
+    """
+    获取全局LLM调度器，未启用时返回None
+
+    Returns:
+        Optional[LLMScheduler]: 调度器实例
+    """
+    global _scheduler_instance
+    from sagents.config.settings import get_settings
+    scheduler_config = get_settings().scheduler
+    if not scheduler_config.enable_llm_scheduler:
+        return None
+    if _scheduler_instance is None:
+        with _scheduler_lock:
+            if _scheduler_instance is None:
+                _scheduler_instance = LLMScheduler(
+                    default_rpm=scheduler_config.default_rpm,
+                    default_tpm=scheduler_config.default_tpm,
+                    endpoint_limits=scheduler_config.endpoint_limits
+                )
+    return _scheduler_instance
+
+
+def reset_llm_scheduler():
+    """重置全局LLM调度器实例（配置变更后调用）"""
+    global _scheduler_instance
+    with _scheduler_lock:
+        _scheduler_instance = None
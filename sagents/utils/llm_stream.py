@@ -0,0 +1,264 @@
+"""
+LLM流式响应工具
+
+1. 流式调用中断重试时的去重处理：重试后的新流会从头开始生成，
+   校验其开头与已经向下游输出过的内容一致后跳过重复部分，使消费方看到的是一条连续的流；
+   不一致时报错，不会把两次不同的生成拼接在一起。
+2. 结构化输出的终止检测：输出结构完整后提前中止生成。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+
+from sagents.utils.exceptions import LLMStreamDivergedError
+from sagents.utils.logger import logger
+
+
+class StreamResumeDeduplicator:
+    """
+    流式重试去重器 - 校验重试流的开头与已输出内容一致后裁剪重复部分
+
+    重试会用相同的提示词重新生成，temperature > 0 时新的生成可能与已输出的内容不同，
+    此时无法拼接成一条连续的流，抛出 LLMStreamDivergedError 而不是把两次生成拼在一起。
+    尚未输出任何内容时重试不受影响。
+    """
+
+    def __init__(self):
+        # 跨尝试累计：已经输出给下游的内容
+        self._emitted_content: Dict[int, List[str]] = {}
+        self._emitted_tool_args: Dict[Tuple[int, int], List[str]] = {}
+        self._tool_call_ids: Dict[Tuple[int, int], str] = {}
+        self._tool_call_names: Dict[Tuple[int, int], str] = {}
+        # 当前尝试开始时已输出的内容（用于校验重试流的开头）
+        self._expected_content: Dict[int, str] = {}
+        self._expected_tool_args: Dict[Tuple[int, int], str] = {}
+        # 当前尝试中已经看到的内容长度
+        self._seen_content: Dict[int, int] = {}
+        self._seen_tool_args: Dict[Tuple[int, int], int] = {}
+        self.attempt = 0
+        self.discarded_chars = 0
+
+    @property
+    def has_emitted(self) -> bool:
+        """是否已经向下游输出过内容"""
+        return any(self._emitted_content.values()) or any(self._emitted_tool_args.values()) or bool(self._tool_call_ids)
+
+    def start_new_attempt(self):
+        """开始一次新的重试，重置当前尝试的计数"""
+        self.attempt += 1
+        self._expected_content = {index: ''.join(parts) for index, parts in self._emitted_content.items()}
+        self._expected_tool_args = {key: ''.join(parts) for key, parts in self._emitted_tool_args.items()}
+        self._seen_content = {}
+        self._seen_tool_args = {}
+
+    def _trim(self, text: str, seen: int, expected: str, field: str) -> str:
+        """
+        根据当前尝试已看到的长度裁剪已输出过的部分，并校验重叠部分与已输出内容一致
+
+        Raises:
+            LLMStreamDivergedError: 重试流与已输出内容不一致
+        """
+        if seen >= len(expected):
+            return text
+        skip = min(len(text), len(expected) - seen)
+        if text[:skip] != expected[seen:seen + skip]:
+            raise LLMStreamDivergedError(
+                f"流式重试第 {self.attempt} 次生成的{field}与已输出的前 {len(expected)} 个字符不一致，无法续接"
+            )
+        self.discarded_chars += skip
+        return text[skip:]
+
+    def filter(self, chunk: Any) -> Optional[Any]:
+        """
+        过滤chunk中已经输出过的内容
+
+        Args:
+            chunk: 流式chunk对象（会被原地修改）
+
+        Returns:
+            Optional[Any]: 处理后的chunk；整块都是重复内容时返回None
+
+        Raises:
+            LLMStreamDivergedError: 重试流与已输出内容不一致
+        """
+        choices = getattr(chunk, 'choices', None) or []
+        has_payload = bool(getattr(chunk, 'usage', None))
+
+        for choice in choices:
+            index = getattr(choice, 'index', 0) or 0
+            delta = getattr(choice, 'delta', None)
+            if getattr(choice, 'finish_reason', None):
+                has_payload = True
+            if delta is None:
+                continue
+
+            content = getattr(delta, 'content', None)
+            if content:
+                seen = self._seen_content.get(index, 0)
+                trimmed = self._trim(content, seen, self._expected_content.get(index, ''), '内容')
+                self._seen_content[index] = seen + len(content)
+                delta.content = trimmed or None
+                if trimmed:
+                    self._emitted_content.setdefault(index, []).append(trimmed)
+                    has_payload = True
+
+            tool_calls = getattr(delta, 'tool_calls', None)
+            if tool_calls:
+                kept = []
+                for tool_call in tool_calls:
+                    if self._filter_tool_call(index, tool_call):
+                        kept.append(tool_call)
+                delta.tool_calls = kept or None
+                if kept:
+                    has_payload = True
+
+            if getattr(delta, 'role', None) and self.attempt == 0:
+                has_payload = True
+
+        return chunk if has_payload else None
+
+    def _filter_tool_call(self, choice_index: int, tool_call: Any) -> bool:
+        """
+        过滤单个工具调用增量
+
+        重试流中的工具调用ID会变化，需要替换为首次输出的ID，
+        否则下游会把它当作一个新的工具调用。
+
+        Returns:
+            bool: 过滤后是否仍有需要输出的内容
+        """
+        key = (choice_index, getattr(tool_call, 'index', 0) or 0)
+        has_content = False
+
+        call_id = getattr(tool_call, 'id', None)
+        if call_id:
+            if key in self._tool_call_ids:
+                if call_id != self._tool_call_ids[key]:
+                    tool_call.id = self._tool_call_ids[key]
+                # 已输出过的工具调用头部（id/name）不再重复输出参数以外的内容
+            else:
+                self._tool_call_ids[key] = call_id
+                has_content = True
+
+        function = getattr(tool_call, 'function', None)
+        name = getattr(function, 'name', None) if function is not None else None
+        if name:
+            if key in self._tool_call_names and self._tool_call_names[key] != name:
+                raise LLMStreamDivergedError(
+                    f"流式重试第 {self.attempt} 次调用的工具 {name} 与已输出的 {self._tool_call_names[key]} 不一致，无法续接"
+                )
+            self._tool_call_names[key] = name
+
+        arguments = getattr(function, 'arguments', None) if function is not None else None
+        if arguments:
+            seen = self._seen_tool_args.get(key, 0)
+            trimmed = self._trim(arguments, seen, self._expected_tool_args.get(key, ''), '工具参数')
+            self._seen_tool_args[key] = seen + len(arguments)
+            function.arguments = trimmed
+            if trimmed:
+                self._emitted_tool_args.setdefault(key, []).append(trimmed)
+                has_content = True
+
+        if name and self.attempt == 0:
+            has_content = True
+
+        return has_content
+
+    def log_summary(self, agent_name: str):
+        if self.attempt:
+            logger.info(f"{agent_name}: 流式重试 {self.attempt} 次，去重丢弃 {self.discarded_chars} 个字符")
+
+
+class StructuredOutputTerminator:
+    """
+    结构化输出终止检测器
+
+    根据智能体声明的输出结构（OUTPUT_SCHEMA）判断输出是否已经完整，
+    完整后客户端即可中止流，不再为结尾多余的内容付出token和时延。
+
+    支持的结构：
+    - xml: 按顺序输出的标签，最后一个标签闭合即结束
+    - xml + repeat: 重复输出的同一标签，达到 repeat 个即结束
+    - json: 顶层JSON对象闭合即结束
+    """
+
+    def __init__(self, schema: Dict[str, Any]):
+        """
+        初始化终止检测器
+
+        Args:
+            schema: 输出结构声明，包含 format、tags、repeat 等字段
+        """
+        self.format = schema.get('format', 'xml')
+        tags = list(schema.get('tags', {}).keys())
+        self.repeat = schema.get('repeat')
+        self.terminal_tag = f"</{tags[-1]}>" if tags else None
+        self._buffer = ''
+        self._terminal_count = 0
+        # JSON扫描状态
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self.finished = False
+
+    def feed(self, text: str) -> Optional[int]:
+        """
+        追加一段输出文本
+
+        Args:
+            text: 新增文本
+
+        Returns:
+            Optional[int]: 输出在该段文本中结束时，返回结束位置（不含）；否则返回None
+        """
+        if self.finished:
+            return 0
+        if self.format == 'json':
+            return self._feed_json(text)
+        if not self.terminal_tag:
+            return None
+
+        # 保留上一段末尾可能被截断的部分标签
+        keep = len(self.terminal_tag) - 1
+        offset = len(self._buffer)
+        self._buffer += text
+        search_from = 0
+        while True:
+            pos = self._buffer.find(self.terminal_tag, search_from)
+            if pos < 0:
+                break
+            self._terminal_count += 1
+            end = pos + len(self.terminal_tag)
+            if not self.repeat or self._terminal_count >= self.repeat:
+                self.finished = True
+                return max(0, end - offset)
+            search_from = end
+        # 已匹配部分不再重复计数
+        tail_start = max(search_from, len(self._buffer) - keep)
+        self._buffer = self._buffer[tail_start:]
+        return None
+
+    def _feed_json(self, text: str) -> Optional[int]:
+        for i, char in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"' and self._started:
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+                self._started = True
+            elif char in '}]' and self._started:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.finished = True
+                    return i + 1
+        return None
@@ -1,6 +1,5 @@
 import os
 import logging
-import inspect
 import sys
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
@@ -51,13 +50,13 @@ class Logger:
     
     def _log(self, level, message):
         # Get caller frame info to include filename and line number
-        # 使用inspect.stack获取调用栈，跳过前两层（_log方法和debug/info等方法）
-        stack = inspect.stack()
-        if len(stack) >= 3:
-            caller_frame = stack[2][0]
+        # 跳过前两层（_log方法和debug/info等方法）；直接取帧对象，
+        # 不使用inspect.stack()，后者会为整个调用栈读取源码，每次调用耗时数毫秒
+        try:
+            caller_frame = sys._getframe(2)
             filename = os.path.basename(caller_frame.f_code.co_filename)
             lineno = caller_frame.f_lineno
-        else:
+        except ValueError:
             filename = 'unknown.py'
             lineno = 0
         
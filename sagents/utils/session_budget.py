@@ -0,0 +1,258 @@
+"""
+会话预算
+
+为一次工作流设置墙钟截止时间、token预算和费用预算：
+1. 剩余预算向下传递为LLM调用的 timeout / max_tokens 上限以及工具超时
+2. 每次LLM调用结束后按实际用量扣减
+3. 预算即将耗尽时，控制器据此提前进入任务总结
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from sagents.utils.logger import logger
+
+
+class SessionBudget:
+    """单个会话的时间/token/费用预算"""
+
+    def __init__(self,
+                 session_id: str,
+                 deadline: Optional[float] = None,
+                 token_budget: Optional[int] = None,
+                 cost_budget: Optional[float] = None,
+                 model_prices: Optional[Dict[str, Dict[str, float]]] = None,
+                 reserve_seconds: float = 30.0,
+                 reserve_tokens: int = 4000,
+                 reserve_cost_ratio: float = 0.1,
+                 min_llm_timeout: float = 5.0,
+                 min_max_tokens: int = 512):
+        """
+        初始化会话预算
+
+        Args:
+            session_id: 会话ID
+            deadline: 截止时间（time.time() 时间戳），为None表示不限时
+            token_budget: 总token预算（输入+输出），为None表示不限制
+            cost_budget: 费用预算，为None表示不限制
+            model_prices: 模型单价，{model: {"input": 每千token价格, "output": 每千token价格}}
+            reserve_seconds: 为任务总结预留的时间，剩余时间低于该值视为即将耗尽
+            reserve_tokens: 为任务总结预留的token数
+            reserve_cost_ratio: 剩余费用低于预算的该比例视为即将耗尽
+            min_llm_timeout: 传递给LLM调用的最小超时时间（秒）
+            min_max_tokens: 传递给LLM调用的最小max_tokens，保证总结仍能输出
+        """
+        self.session_id = session_id
+        self.deadline = deadline
+        self.token_budget = token_budget
+        self.cost_budget = cost_budget
+        self.model_prices = dict(model_prices or {})
+        self.reserve_seconds = reserve_seconds
+        self.reserve_tokens = reserve_tokens
+        self.reserve_cost_ratio = reserve_cost_ratio
+        self.min_llm_timeout = min_llm_timeout
+        self.min_max_tokens = min_max_tokens
+        self.started_at = time.time()
+        self.used_tokens = 0
+        self.used_cost = 0.0
+        self.llm_calls = 0
+        self.degraded_reason: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self) -> bool:
+        """是否设置了任一预算"""
+        return self.deadline is not None or self.token_budget is not None or self.cost_budget is not None
+
+    def remaining_time(self) -> Optional[float]:
+        """剩余时间（秒），不限时返回None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def remaining_tokens(self) -> Optional[int]:
+        """剩余token数，不限制返回None"""
+        if self.token_budget is None:
+            return None
+        return self.token_budget - self.used_tokens
+
+    def remaining_cost(self) -> Optional[float]:
+        """剩余费用，不限制返回None"""
+        if self.cost_budget is None:
+            return None
+        return self.cost_budget - self.used_cost
+
+    def consume(self, input_tokens: int, output_tokens: int, model: Optional[str] = None):
+        """
+        按一次LLM调用的实际用量扣减预算
+
+        Args:
+            input_tokens: 输入token数
+            output_tokens: 输出token数
+            model: 模型名称，用于查找单价
+        """
+        price = self.model_prices.get(model or '', {})
+        cost = (input_tokens * price.get('input', 0.0) + output_tokens * price.get('output', 0.0)) / 1000.0
+        with self._lock:
+            self.used_tokens += input_tokens + output_tokens
+            self.used_cost += cost
+            self.llm_calls += 1
+
+    def is_nearly_exhausted(self) -> Optional[str]:
+        """
+        判断预算是否即将耗尽（只剩下任务总结所需的余量）
+
+        Returns:
+            Optional[str]: 即将耗尽的预算类型与说明，否则返回None
+        """
+        remaining_time = self.remaining_time()
+        if remaining_time is not None and remaining_time <= self.reserve_seconds:
+            return f"time（剩余 {max(remaining_time, 0):.1f}s）"
+        remaining_tokens = self.remaining_tokens()
+        if remaining_tokens is not None and remaining_tokens <= self.reserve_tokens:
+            return f"tokens（剩余 {max(remaining_tokens, 0)}）"
+        remaining_cost = self.remaining_cost()
+        if remaining_cost is not None and remaining_cost <= self.cost_budget * self.reserve_cost_ratio:
+            return f"cost（剩余 {max(remaining_cost, 0):.4f}）"
+        return None
+
+    def apply_to_llm_config(self, model_config: Dict[str, Any], prompt_tokens: int = 0,
+                            min_output_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        将剩余预算传递为LLM调用的 timeout 与 max_tokens 上限（原地修改）
+
+        Args:
+            model_config: 最终的模型调用配置
+            prompt_tokens: 预估的输入token数
+            min_output_tokens: 本次调用完整输出所需的token数（如结构化输出的上限），max_tokens不会低于该值
+
+        Returns:
+            Dict[str, Any]: 修改后的配置
+        """
+        remaining_time = self.remaining_time()
+        if remaining_time is not None:
+            timeout = max(remaining_time, self.min_llm_timeout)
+            if model_config.get('timeout'):
+                timeout = min(timeout, model_config['timeout'])
+            model_config['timeout'] = timeout
+
+        remaining_tokens = self.remaining_tokens()
+        if remaining_tokens is not None:
+            cap = max(remaining_tokens - prompt_tokens, self.min_max_tokens, min_output_tokens or 0)
+            if model_config.get('max_tokens'):
+                cap = min(cap, model_config['max_tokens'])
+            model_config['max_tokens'] = cap
+        return model_config
+
+    def tool_timeout(self, default: float) -> float:
+        """
+        计算工具调用的超时时间：不超过剩余时间
+
+        Args:
+            default: 工具默认超时（秒）
+
+        Returns:
+            float: 超时时间（秒）
+        """
+        remaining_time = self.remaining_time()
+        if remaining_time is None:
+            return default
+        return max(min(default, remaining_time), 1.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取预算使用情况
+
+        Returns:
+            Dict[str, Any]: 各项预算、已用量、剩余量与降级原因
+        """
+        remaining_time = self.remaining_time()
+        return {
+            'elapsed_time': round(time.time() - self.started_at, 2),
+            'remaining_time': round(remaining_time, 2) if remaining_time is not None else None,
+            'token_budget': self.token_budget,
+            'used_tokens': self.used_tokens,
+            'cost_budget': self.cost_budget,
+            'used_cost': round(self.used_cost, 6),
+            'llm_calls': self.llm_calls,
+            'degraded_reason': self.degraded_reason
+        }
+
+
+# 会话预算注册表
+_session_budgets: Dict[str, SessionBudget] = {}
+_session_budgets_lock = threading.Lock()
+
+
+def create_session_budget(session_id: str,
+                          deadline: Optional[float] = None,
+                          token_budget: Optional[int] = None,
+                          cost_budget: Optional[float] = None) -> Optional[SessionBudget]:
+    """
+    为会话创建预算，未指定的项使用Settings中的默认值
+
+    Args:
+        session_id: 会话ID
+        deadline: 截止时间（time.time() 时间戳）
+        token_budget: 总token预算
+        cost_budget: 费用预算
+
+    Returns:
+        Optional[SessionBudget]: 会话预算，没有设置任何预算时返回None
+    """
+    from sagents.config.settings import get_settings
+    budget_config = get_settings().budget
+    if deadline is None and budget_config.default_time_budget > 0:
+        deadline = time.time() + budget_config.default_time_budget
+    if token_budget is None and budget_config.default_token_budget > 0:
+        token_budget = budget_config.default_token_budget
+    if cost_budget is None and budget_config.default_cost_budget > 0:
+        cost_budget = budget_config.default_cost_budget
+
+    budget = SessionBudget(
+        session_id,
+        deadline=deadline,
+        token_budget=token_budget,
+        cost_budget=cost_budget,
+        model_prices=budget_config.model_prices,
+        reserve_seconds=budget_config.reserve_seconds,
+        reserve_tokens=budget_config.reserve_tokens
+    )
+    if not budget.limited:
+        return None
+
+    with _session_budgets_lock:
+        _session_budgets[session_id] = budget
+    logger.info(f"SessionBudget: 会话 {session_id} 预算 deadline={deadline}, tokens={token_budget}, cost={cost_budget}")
+    return budget
+
+
+def get_session_budget(session_id: Optional[str]) -> Optional[SessionBudget]:
+    """
+    获取会话预算
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        Optional[SessionBudget]: 会话预算，未设置时返回None
+    """
+    if not session_id:
+        return None
+    with _session_budgets_lock:
+        return _session_budgets.get(session_id)
+
+
+def clear_session_budget(session_id: str):
+    """
+    清理会话预算
+
+    Args:
+        session_id: 会话ID
+    """
+    with _session_budgets_lock:
+        _session_budgets.pop(session_id, None)
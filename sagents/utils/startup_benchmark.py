@@ -0,0 +1,80 @@
+"""
+启动耗时基准
+
+在全新的解释器进程中分别测量 ``import sagents``、导入工具包与控制器、
+创建 ToolManager 以及首次生成工具schema的耗时，多次运行取中位数。
+用于评估自动扩缩容的工作进程和命令行任务的冷启动开销：
+
+    python -m sagents.utils.startup_benchmark --repeat 5
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+# 每个场景在子进程中执行的代码，最后一行输出耗时（秒）
+_SCENARIOS = {
+    'import sagents': "import sagents",
+    'import sagents.tool': "import sagents.tool",
+    'import AgentController': "from sagents.agent.agent_controller import AgentController",
+    'ToolManager()': "from sagents.tool.tool_manager import ToolManager\nToolManager()",
+    'ToolManager().get_openai_tools()': "from sagents.tool.tool_manager import ToolManager\nToolManager().get_openai_tools()",
+}
+
+_TEMPLATE = """import time
+_start = time.perf_counter()
+{code}
+print('__elapsed__', time.perf_counter() - _start)
+"""
+
+
+def _run_once(code: str, env: Dict[str, str]) -> float:
+    completed = subprocess.run(
+        [sys.executable, '-c', _TEMPLATE.format(code=code)],
+        capture_output=True, text=True, env=env, check=True
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('__elapsed__'):
+            return float(line.split()[1])
+    raise RuntimeError(f"无法解析基准输出: {completed.stdout[-200:]}")
+
+
+def run_startup_benchmark(repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    运行启动耗时基准
+
+    Args:
+        repeat: 每个场景的运行次数
+
+    Returns:
+        Dict[str, Dict[str, float]]: 各场景耗时（毫秒）的中位数、最小值和最大值
+    """
+    env = dict(os.environ)
+    # 跳过MCP服务器发现，只测量本地工具
+    env['TESTING'] = '1'
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [project_root, env.get('PYTHONPATH')]))
+
+    report = {}
+    for name, code in _SCENARIOS.items():
+        samples: List[float] = [_run_once(code, env) * 1000 for _ in range(repeat)]
+        report[name] = {
+            'median_ms': round(statistics.median(samples), 1),
+            'min_ms': round(min(samples), 1),
+            'max_ms': round(max(samples), 1)
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='测量sagents的冷启动耗时')
+    parser.add_argument('--repeat', type=int, default=5, help='每个场景的运行次数')
+    args = parser.parse_args()
+    print(json.dumps(run_startup_benchmark(args.repeat), ensure_ascii=False, indent=2))
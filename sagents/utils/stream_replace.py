@@ -0,0 +1,268 @@
+"""
+流式搜索替换
+
+按块读取文件并在单次遍历中完成搜索、计数和替换，内存占用与文件大小无关：
+- 普通字符串：在块内查找匹配，块尾保留 len(pattern)-1 个字符与下一块拼接，保证跨块的匹配不会遗漏；
+- 正则表达式：块尾保留一个匹配窗口（单个匹配的最大长度），只接受完整落在窗口之前的匹配，
+  并在块前保留固定长度的上下文，使后顾断言（lookbehind）和 \\b 等在块边界处仍然正确；
+- 替换结果写入同目录的临时文件，完成后通过 os.replace 原子替换原文件，中途失败不会损坏原文件；
+- dry_run 模式只统计匹配并返回前几处匹配的预览，不写入文件。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, Any, List, Callable, Match, Pattern
+
+# 每次读取的字符数
+CHUNK_SIZE = 1024 * 1024
+# 正则表达式单个匹配的最大长度（字符）
+DEFAULT_MATCH_WINDOW = 64 * 1024
+# 为后顾断言保留的上下文长度（字符）
+DEFAULT_LOOKBEHIND = 1024
+
+
+class _ReplaceState:
+    """流式替换过程中的输出、计数和预览"""
+
+    def __init__(self, output, preview_limit: int, context_chars: int):
+        self.output = output
+        self.count = 0
+        self.original_length = 0
+        self.new_length = 0
+        self.previews: List[Dict[str, Any]] = []
+        self.preview_limit = preview_limit
+        self.context_chars = context_chars
+        # 已处理的原文中的换行数，用于计算预览的行号
+        self.lines_before = 0
+
+    def emit(self, pieces: List[str]):
+        text = ''.join(pieces)
+        self.new_length += len(text)
+        if self.output is not None:
+            self.output.write(text)
+
+    def consume(self, text: str):
+        """原文中的一段已处理完毕"""
+        self.original_length += len(text)
+        if len(self.previews) < self.preview_limit:
+            self.lines_before += text.count('\n')
+
+    def preview(self, buffer: str, start: int, end: int, replacement: str, line_base: int):
+        before = buffer[max(0, start - self.context_chars):start]
+        self.previews.append({
+            'line': line_base + buffer.count('\n', 0, start) + 1,
+            'before': before.rsplit('\n', 1)[-1],
+            'match': buffer[start:end],
+            'replacement': replacement,
+            'after': buffer[end:end + self.context_chars].split('\n', 1)[0]
+        })
+
+
+def _compile_template(pattern: Pattern, template: str) -> Callable[[Match], str]:
+    """
+    将替换模板预编译为展开函数，避免 match.expand 每次重新解析模板
+
+    用由哨兵字符串组成的分组构造一个同结构的正则，让re自己展开一次模板，
+    再把结果拆分为字面量和分组编号，语义与 re.sub 相同。
+    """
+    if '\\' not in template:
+        return lambda match: template
+    # 模板本身可能产生哨兵字符（\x00 或八进制转义 \0）或引用整个匹配时，退回逐个展开
+    if '\x00' in template or '\\0' in template or 'g<0>' in template:
+        return lambda match: match.expand(template)
+    names = {index: name for name, index in pattern.groupindex.items()}
+    sentinels = [f"\x00{index}\x00" for index in range(1, pattern.groups + 1)]
+    synthetic = re.compile(''.join(
+        f"(?P<{names[index]}>{re.escape(sentinel)})" if index in names else f"({re.escape(sentinel)})"
+        for index, sentinel in enumerate(sentinels, start=1)
+    ))
+    parts = re.split(r'\x00(\d+)\x00', synthetic.fullmatch(''.join(sentinels)).expand(template))
+    literals = parts[0::2]
+    group_ids = [int(group_id) for group_id in parts[1::2]]
+    if not group_ids:
+        expanded = literals[0]
+        return lambda match: expanded
+    segments = list(zip(group_ids, literals[1:]))
+    head = literals[0]
+
+    def expand(match: Match) -> str:
+        pieces = [head]
+        for group_id, literal in segments:
+            pieces.append(match.group(group_id) or '')
+            pieces.append(literal)
+        return ''.join(pieces)
+    return expand
+
+
+def _replace_literal(reader, state: _ReplaceState, pattern: str, replacement: str):
+    """区分大小写的普通字符串替换：块内查找，块尾保留 len(pattern)-1 个字符"""
+    keep = len(pattern) - 1
+    buffer = ''
+    eof = False
+    while not eof:
+        chunk = reader(CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+        safe_end = len(buffer) if eof else max(0, len(buffer) - keep)
+        line_base = state.lines_before
+        pieces = []
+        pos = 0
+        while True:
+            index = buffer.find(pattern, pos)
+            if index < 0 or index >= safe_end:
+                break
+            pieces.append(buffer[pos:index])
+            pieces.append(replacement)
+            state.count += 1
+            if len(state.previews) < state.preview_limit:
+                state.preview(buffer, index, index + len(pattern), replacement, line_base)
+            pos = index + len(pattern)
+        if pos < safe_end:
+            pieces.append(buffer[pos:safe_end])
+        state.emit(pieces)
+        state.consume(buffer[:max(pos, safe_end)])
+        buffer = buffer[max(pos, safe_end):]
+
+
+def _replace_regex(reader, state: _ReplaceState, pattern: Pattern, expand: Callable[[Match], str],
+                   match_window: int, lookbehind: int):
+    """
+    正则表达式替换：只接受结束位置距离缓冲区末尾至少 match_window 的匹配，
+    剩余部分和前 lookbehind 个字符的上下文带入下一轮
+    """
+    buffer = ''
+    pos = 0  # buffer中尚未处理部分的起点，之前的字符只作为上下文
+    base = 0  # buffer[0] 在原文中的位置
+    last_empty = -1  # 上一个空匹配在原文中的位置，避免在块边界处重复替换
+    eof = False
+    while not eof:
+        chunk = reader(CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+        safe_end = len(buffer) if eof else len(buffer) - match_window
+        if safe_end <= pos and not eof:
+            continue
+        line_base = state.lines_before - buffer.count('\n', 0, pos)
+        round_start = pos
+        cut = safe_end
+        pieces = []
+        for match in pattern.finditer(buffer, pos):
+            start, end = match.span()
+            if start == end and base + start == last_empty:
+                continue
+            if not eof and (start >= safe_end or end > safe_end):
+                cut = min(cut, start)
+                break
+            if start == end:
+                last_empty = base + start
+            text = expand(match)
+            pieces.append(buffer[pos:start])
+            pieces.append(text)
+            state.count += 1
+            if len(state.previews) < state.preview_limit:
+                state.preview(buffer, start, end, text, line_base)
+            pos = end
+        if pos < cut:
+            pieces.append(buffer[pos:cut])
+            pos = cut
+        state.emit(pieces)
+        state.consume(buffer[round_start:pos])
+        if eof:
+            break
+        # 保留上下文供后顾断言使用
+        drop = max(0, pos - lookbehind)
+        buffer = buffer[drop:]
+        pos -= drop
+        base += drop
+
+
+def stream_replace_file(file_path: str,
+                        search_pattern: str,
+                        replacement: str,
+                        use_regex: bool = False,
+                        case_sensitive: bool = True,
+                        encoding: str = 'utf-8',
+                        dry_run: bool = False,
+                        preview_limit: int = 5,
+                        context_chars: int = 40,
+                        match_window: int = DEFAULT_MATCH_WINDOW,
+                        lookbehind: int = DEFAULT_LOOKBEHIND) -> Dict[str, Any]:
+    """
+    流式搜索替换文件内容
+
+    Args:
+        file_path: 文件路径
+        search_pattern: 要搜索的字符串或正则表达式
+        replacement: 替换文本；正则模式下支持 \\1、\\g<name> 等分组引用，普通字符串模式下按原文替换
+        use_regex: 是否使用正则表达式
+        case_sensitive: 是否区分大小写
+        encoding: 文件编码
+        dry_run: 为True时只统计并预览匹配，不修改文件
+        preview_limit: 返回的匹配预览数量
+        context_chars: 预览中匹配前后保留的字符数
+        match_window: 正则表达式单个匹配的最大长度（字符）
+        lookbehind: 为后顾断言保留的上下文长度（字符）
+
+    Returns:
+        Dict[str, Any]: replacements、original_length、new_length、previews 以及是否已写入（written）
+
+    Raises:
+        re.error: 正则表达式无效
+    """
+    if not search_pattern:
+        raise ValueError("搜索模式不能为空")
+    regex = None
+    expand = None
+    if use_regex:
+        regex = re.compile(search_pattern, 0 if case_sensitive else re.IGNORECASE)
+        # 提前校验替换模板中的分组引用，避免写到一半才报错
+        regex.sub(replacement, '')
+        expand = _compile_template(regex, replacement)
+    elif not case_sensitive:
+        regex = re.compile(re.escape(search_pattern), re.IGNORECASE)
+        match_window = max(1, len(search_pattern))
+        expand = lambda match: replacement
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    temp_file = None
+    if not dry_run:
+        temp_file = tempfile.NamedTemporaryFile('w', encoding=encoding, dir=directory,
+                                                prefix=f".{os.path.basename(file_path)}.", suffix='.tmp',
+                                                delete=False)
+    try:
+        with open(file_path, 'r', encoding=encoding) as source:
+            state = _ReplaceState(temp_file, preview_limit, context_chars)
+            if regex is None:
+                _replace_literal(source.read, state, search_pattern, replacement)
+            else:
+                _replace_regex(source.read, state, regex, expand, match_window, lookbehind)
+        written = False
+        if temp_file is not None:
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+            temp_file.close()
+            if state.count > 0:
+                shutil.copymode(file_path, temp_file.name)
+                os.replace(temp_file.name, file_path)
+                written = True
+            else:
+                os.remove(temp_file.name)
+    except BaseException:
+        if temp_file is not None:
+            temp_file.close()
+            if os.path.exists(temp_file.name):
+                os.remove(temp_file.name)
+        raise
+
+    return {
+        'replacements': state.count,
+        'original_length': state.original_length,
+        'new_length': state.new_length,
+        'previews': state.previews,
+        'written': written
+    }
@@ -0,0 +1,205 @@
+"""
+工具结果缓存
+
+为幂等的外部数据类工具（网页搜索、网页文本提取、赛事数据等）提供跨会话的结果缓存。
+每个工具的缓存策略在配置中声明（是否可缓存、TTL、缓存键的参数归一化规则），
+由 ToolManager.run_tool 统一执行，存储复用 LLMResponseCache 的内存LRU + 磁盘两级结构。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+from typing import Dict, Any, Optional
+
+from sagents.utils.llm_cache import LLMResponseCache
+from sagents.utils.logger import logger
+
+# 以错误提示开头的文本结果视为失败（工具把异常转成文本返回时）
+_ERROR_TEXT_PATTERN = re.compile(
+    r'^\s*(?:(?:[\[【]\s*)?(?:error|exception|failed|failure|错误|异常|失败|出错)\s*(?:[\]】]|[:：])'
+    r'|traceback \(most recent call last\))',
+    re.IGNORECASE
+)
+
+
+class ToolResultCache(LLMResponseCache):
+    """工具结果缓存 - 按工具声明的策略缓存，按条目TTL过期"""
+
+    def __init__(self,
+                 policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_entries: int = 512,
+                 default_ttl: float = 600,
+                 disk_dir: Optional[str] = None):
+        """
+        初始化工具结果缓存
+
+        Args:
+            policies: 工具缓存策略 {工具名: {"cacheable", "ttl", "ignore_args", "case_insensitive_args"}}
+            max_entries: 内存中最多保留的条目数
+            default_ttl: 策略未指定ttl时使用的存活时间（秒）
+            disk_dir: 磁盘缓存目录，为None时只使用内存缓存
+        """
+        super().__init__(max_entries=max_entries, ttl_seconds=default_ttl, disk_dir=disk_dir)
+        self.policies = dict(policies or {})
+        self.tool_stats: Dict[str, Dict[str, int]] = {}
+
+    def get_policy(self, tool_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取工具的缓存策略
+
+        Args:
+            tool_name: 工具名称
+
+        Returns:
+            Optional[Dict[str, Any]]: 工具可缓存时返回策略，否则返回None
+        """
+        policy = self.policies.get(tool_name)
+        if not policy or not policy.get('cacheable', True):
+            return None
+        return policy
+
+    @staticmethod
+    def make_tool_key(tool_name: str, arguments: Dict[str, Any], policy: Dict[str, Any]) -> str:
+        """
+        根据工具名称和归一化后的参数生成缓存键
+
+        归一化规则：去掉 ignore_args 中的参数（如timeout）和值为None的参数，
+        字符串参数去掉首尾空白并合并连续空白，case_insensitive_args 中的参数转为小写。
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            policy: 工具缓存策略
+
+        Returns:
+            str: sha256 十六进制摘要
+        """
+        ignore_args = set(policy.get('ignore_args', ['timeout']))
+        case_insensitive_args = set(policy.get('case_insensitive_args', []))
+        normalized = {}
+        for name, value in arguments.items():
+            if name in ignore_args or value is None:
+                continue
+            if isinstance(value, str):
+                value = re.sub(r'\s+', ' ', value.strip())
+                if name in case_insensitive_args:
+                    value = value.lower()
+            normalized[name] = value
+        raw = json.dumps({'tool': tool_name, 'arguments': normalized}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        """
+        查找工具结果
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+
+        Returns:
+            Optional[Any]: 命中时返回缓存的工具结果内容的副本，未命中或工具不可缓存时返回None
+        """
+        policy = self.get_policy(tool_name)
+        if policy is None:
+            return None
+        entry = self.get(self.make_tool_key(tool_name, arguments, policy))
+        self._count(tool_name, 'hits' if entry is not None else 'misses')
+        if entry is None:
+            return None
+        logger.info(f"ToolResultCache: 工具 {tool_name} 命中缓存")
+        # 返回副本，调用方修改结果不会影响缓存中的条目
+        return copy.deepcopy(entry['payload'])
+
+    def store(self, tool_name: str, arguments: Dict[str, Any], content: Any, is_error: bool = False):
+        """
+        按工具策略缓存结果内容的副本，表示失败的结果不缓存
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            content: 工具结果内容
+            is_error: 工具是否已标记本次结果为失败（如MCP结果的isError）
+        """
+        policy = self.get_policy(tool_name)
+        if policy is None or is_error or self._is_failure(content):
+            return
+        self.set(self.make_tool_key(tool_name, arguments, policy), 'tool_result', copy.deepcopy(content),
+                 ttl=policy.get('ttl'))
+        self._count(tool_name, 'stores')
+
+    @staticmethod
+    def _is_failure(content: Any) -> bool:
+        """判断结果是否表示失败：空结果、带失败标记的字典（含JSON文本）、以错误提示开头的文本"""
+        if content is None or content == '':
+            return True
+        if isinstance(content, str):
+            text = content.strip()
+            if text.startswith('{'):
+                try:
+                    content = json.loads(text)
+                except ValueError:
+                    pass
+            if isinstance(content, str):
+                return bool(_ERROR_TEXT_PATTERN.match(text[:200]))
+        if isinstance(content, dict):
+            return (content.get('success') is False or bool(content.get('error'))
+                    or bool(content.get('isError')) or content.get('status') == 'error')
+        return False
+
+    def _count(self, tool_name: str, name: str):
+        with self._lock:
+            stats = self.tool_stats.setdefault(tool_name, {'hits': 0, 'misses': 0, 'stores': 0})
+            stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 总体命中/未命中/写入/淘汰次数及各工具的命中情况
+        """
+        stats = super().get_stats()
+        with self._lock:
+            stats['tools'] = {name: dict(tool_stats) for name, tool_stats in self.tool_stats.items()}
+        return stats
+
+
+# 全局缓存实例
+_tool_cache_instance: Optional[ToolResultCache] = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_result_cache() -> Optional[ToolResultCache]:
+    """
+    获取全局工具结果缓存实例，首次调用时按配置创建
+
+    Returns:
+        Optional[ToolResultCache]: 全局缓存实例，未启用时返回None
+    """
+    global _tool_cache_instance
+    from sagents.config.settings import get_settings
+    cache_config = get_settings().cache
+    if not cache_config.enable_tool_cache:
+        return None
+    if _tool_cache_instance is None:
+        with _tool_cache_lock:
+            if _tool_cache_instance is None:
+                _tool_cache_instance = ToolResultCache(
+                    policies=cache_config.tool_cache_policies,
+                    max_entries=cache_config.tool_cache_max_entries,
+                    default_ttl=cache_config.tool_cache_default_ttl,
+                    disk_dir=cache_config.tool_cache_dir
+                )
+    return _tool_cache_instance
+
+
+def reset_tool_result_cache():
+    """重置全局工具结果缓存实例（配置变更后调用）"""
+    global _tool_cache_instance
+    with _tool_cache_lock:
+        _tool_cache_instance = None
@@ -0,0 +1,236 @@
+"""
+工具结果存储
+
+工具返回的结果超过阈值时，将完整内容写入会话工作目录，
+只把头尾预览、统计信息和结果句柄交给LLM，避免大结果随每一轮提示词重复发送；
+需要时可通过 read_tool_result 工具按偏移分页读取完整内容。
+
+作者: Eric ZZ
+版本: 1.0
+"""
+
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import uuid
+from typing import Dict, Any, Optional
+
+from sagents.utils.logger import logger
+
+# 结果文件保存在会话工作目录下的子目录中
+RESULT_DIR_NAME = '.tool_results'
+# read_tool_result 单次最多读取的字符数
+MAX_READ_CHARS = 8000
+# 每隔多少个字符记录一次字节偏移，分页读取时从最近的检查点开始解码
+CHECKPOINT_CHARS = 64 * 1024
+
+# 会话工作目录注册表
+_workspaces: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def register_tool_result_workspace(session_id: str, workspace: str):
+    """
+    登记会话的工作目录，超过阈值的工具结果写入该目录
+
+    Args:
+        session_id: 会话ID
+        workspace: 会话工作目录
+    """
+    with _lock:
+        _workspaces[session_id] = workspace
+
+
+def clear_tool_result_workspace(session_id: str):
+    """
+    清除会话的工作目录登记（已写入的结果文件保留在工作目录中）
+
+    Args:
+        session_id: 会话ID
+    """
+    with _lock:
+        _workspaces.pop(session_id, None)
+
+
+def _result_dir(session_id: str) -> str:
+    with _lock:
+        workspace = _workspaces.get(session_id)
+    if workspace:
+        return os.path.join(workspace, RESULT_DIR_NAME)
+    # 没有登记工作目录（如直接使用ToolManager）时写入临时目录
+    return os.path.join(tempfile.gettempdir(), 'sage_tool_results', _safe_name(session_id))
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', str(name or 'default'))
+
+
+def _resolve_handle(handle: str, session_id: Optional[str]) -> Optional[str]:
+    """将结果句柄解析为文件路径，句柄格式为 <session_id>/<结果名>，不属于调用方会话的句柄返回None"""
+    handle_session, _, name = str(handle).strip().partition('/')
+    if handle_session != _safe_name(session_id) or not name or _safe_name(name) != name:
+        return None
+    return os.path.join(_result_dir(session_id), f"{name}.txt")
+
+
+def _build_index(content: str) -> Dict[str, Any]:
+    """记录总字符数和每 CHECKPOINT_CHARS 个字符对应的字节偏移"""
+    checkpoints = [0]
+    position = 0
+    for start in range(0, len(content), CHECKPOINT_CHARS):
+        position += len(content[start:start + CHECKPOINT_CHARS].encode('utf-8'))
+        checkpoints.append(position)
+    return {'total_chars': len(content), 'checkpoints': checkpoints[:-1] or [0]}
+
+
+def _load_index(file_path: str) -> Dict[str, Any]:
+    """读取结果文件的索引，索引缺失时逐块扫描文件重建总字符数"""
+    try:
+        with open(f"{file_path[:-len('.txt')]}.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    total_chars = 0
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        while True:
+            chunk = f.read(CHECKPOINT_CHARS)
+            if not chunk:
+                break
+            total_chars += len(chunk)
+    return {'total_chars': total_chars, 'checkpoints': [0]}
+
+
+def spill_tool_result(session_id: str,
+                      tool_name: str,
+                      content: str,
+                      head_chars: int = 2000,
+                      tail_chars: int = 1000) -> Dict[str, Any]:
+    """
+    将完整的工具结果写入文件，返回交给LLM的预览
+
+    Args:
+        session_id: 会话ID
+        tool_name: 工具名称
+        content: 完整的结果文本
+        head_chars: 预览保留的开头字符数
+        tail_chars: 预览保留的结尾字符数
+
+    Returns:
+        Dict[str, Any]: 包含头尾预览（content）、结果句柄（result_handle）、文件路径和总字符数/行数
+    """
+    # 名称带随机后缀，会话在多轮之间重新登记工作目录时不会覆盖之前的结果
+    name = f"{_safe_name(tool_name)}_{uuid.uuid4().hex[:12]}"
+    result_dir = _result_dir(session_id)
+    os.makedirs(result_dir, exist_ok=True)
+    file_path = os.path.join(result_dir, f"{name}.txt")
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    with open(os.path.join(result_dir, f"{name}.json"), 'w', encoding='utf-8') as f:
+        json.dump(_build_index(content), f)
+
+    total_chars = len(content)
+    total_lines = content.count('\n') + 1
+    # 头尾预览不超过内容本身，且互不重叠
+    head_chars = min(max(head_chars, 0), total_chars)
+    tail_chars = min(max(tail_chars, 0), total_chars - head_chars)
+    omitted = total_chars - head_chars - tail_chars
+    tail = content[-tail_chars:] if tail_chars > 0 else ''
+    if omitted > 0:
+        preview = f"{content[:head_chars]}\n\n...（省略 {omitted} 个字符）...\n\n{tail}"
+    else:
+        preview = content
+    handle = f"{_safe_name(session_id)}/{name}"
+    logger.info(f"ToolResultStore: 工具 {tool_name} 的结果共 {total_chars} 个字符，已写入 {file_path}")
+    return {
+        'content': preview,
+        'truncated': True,
+        'result_handle': handle,
+        'file_path': file_path,
+        'total_chars': total_chars,
+        'total_lines': total_lines,
+        'hint': f"结果过长，仅展示开头 {head_chars} 和结尾 {tail_chars} 个字符。"
+                f"如需查看其余部分，请调用 read_tool_result(handle=\"{handle}\", offset=..., length=...)"
+    }
+
+
+def read_tool_result(handle: str, offset: int = 0, length: int = 4000,
+                     session_id: Optional[str] = None,
+                     max_length: int = MAX_READ_CHARS) -> Dict[str, Any]:
+    """
+    按字符偏移读取已写入文件的工具结果，只能读取调用方会话自己的结果
+
+    从偏移之前最近的检查点开始解码，只读取请求的窗口，不把整个文件读入内存
+
+    Args:
+        handle: 结果句柄
+        offset: 起始字符偏移
+        length: 读取的字符数，限制在 [1, max_length] 之间
+        session_id: 调用方的会话ID
+        max_length: 单次读取的最大字符数
+
+    Returns:
+        Dict[str, Any]: 读取的内容、偏移、总字符数以及是否还有剩余内容；句柄无效时包含error
+    """
+    file_path = _resolve_handle(handle, session_id)
+    if not file_path or not os.path.exists(file_path):
+        return {'error': f"无效的结果句柄: {handle}"}
+    index = _load_index(file_path)
+    total_chars = index['total_chars']
+    offset = min(max(int(offset), 0), total_chars)
+    length = min(max(int(length), 1), max(int(max_length), 1))
+    checkpoints = index['checkpoints']
+    checkpoint = min(offset // CHECKPOINT_CHARS, len(checkpoints) - 1)
+    with open(file_path, 'rb') as raw:
+        raw.seek(checkpoints[checkpoint])
+        with io.TextIOWrapper(raw, encoding='utf-8', newline='') as f:
+            skip = offset - checkpoint * CHECKPOINT_CHARS
+            while skip > 0:
+                skipped = len(f.read(min(skip, CHECKPOINT_CHARS)))
+                if not skipped:
+                    break
+                skip -= skipped
+            content = f.read(length)
+    end = offset + len(content)
+    return {
+        'content': content,
+        'offset': offset,
+        'end': end,
+        'total_chars': total_chars,
+        'has_more': end < total_chars
+    }
+
+
+def apply_result_size_policy(session_id: str,
+                             result: Any,
+                             threshold: int,
+                             head_chars: int = 2000,
+                             tail_chars: int = 1000) -> Any:
+    """
+    对工具结果应用结果大小策略：交给LLM的内容超过阈值时写入文件并替换为预览（原地修改）
+
+    Args:
+        session_id: 会话ID
+        result: 工具结果（ToolResult）
+        threshold: 内容字符数阈值，<=0 表示不启用
+        head_chars: 预览保留的开头字符数
+        tail_chars: 预览保留的结尾字符数
+
+    Returns:
+        ToolResult: 原结果，或content替换为预览、附加了结果句柄的结果
+    """
+    if threshold <= 0 or result.is_error or len(result.to_llm_content()) <= threshold:
+        return result
+    # 只保存content本身，避免写入转义后的JSON
+    content = result.content_text()
+    if len(content) <= threshold:
+        return result
+    try:
+        spilled = spill_tool_result(session_id, result.tool_name, content, head_chars, tail_chars)
+    except OSError as e:
+        logger.warning(f"ToolResultStore: 写入工具 {result.tool_name} 的结果失败，返回完整结果: {e}")
+        return result
+    result.replace_content(spilled.pop('content'), **spilled)
+    return result
@@ -0,0 +1,158 @@
+"""
+云端上传队列测试
+
+使用本地 http.server 模拟上传接口，验证合并写入、内容去重、截断检测和重新排队。
+运行: python -m pytest -q tests/test_cloud_upload_queue.py
+"""
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sagents.utils import cloud_upload_queue as upload_module
+from sagents.utils.cloud_upload_queue import (
+    CloudUploadQueue,
+    FileChangedDuringUpload,
+    MultipartFileBody,
+    STATE_UPLOADED,
+    STATE_UNCHANGED,
+    find_cloud_upload_status,
+    flush_cloud_upload_queues,
+)
+
+
+class _UploadHandler(BaseHTTPRequestHandler):
+    """记录收到的请求体，返回 {"data": {"url", "fileId"}}"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.bodies.append(body)
+            index = len(server.bodies)
+        payload = json.dumps({'data': {'url': f"http://cloud/{index}", 'fileId': str(index)}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def upload_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _UploadHandler)
+    server.bodies = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/upload"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def upload_queue(upload_server):
+    queue = CloudUploadQueue(upload_server[1], debounce_seconds=0.05, workers=1, timeout=5)
+    yield queue
+    queue.shutdown(timeout=5)
+
+
+def _write(path, content: bytes):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def test_upload_now_skips_unchanged_content(upload_server, upload_queue, tmp_path):
+    server, _ = upload_server
+    path = str(tmp_path / 'report.md')
+    _write(path, b'hello world')
+
+    first = upload_queue.upload_now(path)
+    second = upload_queue.upload_now(path)
+
+    assert first['status'] == STATE_UPLOADED
+    assert first['url'] == 'http://cloud/1'
+    assert second['status'] == STATE_UNCHANGED
+    assert len(server.bodies) == 1
+    assert b'hello world' in server.bodies[0]
+
+
+def test_submit_merges_writes_within_debounce(upload_server, upload_queue, tmp_path):
+    server, _ = upload_server
+    path = str(tmp_path / 'notes.txt')
+    for index in range(5):
+        _write(path, f"version {index}".encode('utf-8'))
+        upload_queue.submit(path)
+
+    status = upload_queue.wait(path, timeout=5)
+
+    assert status['status'] == STATE_UPLOADED
+    assert status['writes'] == 5
+    assert len(server.bodies) == 1
+    assert b'version 4' in server.bodies[0]
+
+
+def test_multipart_body_fails_when_file_truncated(tmp_path):
+    path = str(tmp_path / 'data.bin')
+    _write(path, b'x' * 4096)
+    body = MultipartFileBody(path)
+    try:
+        body.read(len(body._head) + 10)
+        _write(path, b'')
+        with pytest.raises(FileChangedDuringUpload):
+            body.read(len(body))
+        assert body.truncated
+    finally:
+        body.close()
+
+
+def test_changed_upload_is_requeued(upload_server, upload_queue, tmp_path, monkeypatch):
+    server, _ = upload_server
+    path = str(tmp_path / 'draft.txt')
+    _write(path, b'partial')
+    original_post = upload_queue._post
+    attempts = []
+
+    def post_once_changed(file_path):
+        attempts.append(file_path)
+        if len(attempts) == 1:
+            # 模拟上传过程中文件被截断
+            return {'error': "上传过程中文件被截断", 'changed': True}
+        return original_post(file_path)
+
+    monkeypatch.setattr(upload_queue, '_post', post_once_changed)
+    upload_queue.submit(path)
+    upload_queue.wait(path, timeout=5)
+    status = upload_queue.wait(path, timeout=5)
+
+    assert len(attempts) == 2
+    assert status['status'] == STATE_UPLOADED
+    assert len(server.bodies) == 1
+
+
+def test_flush_before_summary_exposes_cloud_url(upload_server, tmp_path, monkeypatch):
+    _, upload_url = upload_server
+    queue = CloudUploadQueue(upload_url, debounce_seconds=30, workers=1, timeout=5)
+    monkeypatch.setitem(upload_module._queues, upload_url, queue)
+    path = str(tmp_path / 'result.csv')
+    _write(path, b'a,b\n1,2\n')
+    try:
+        queue.submit(path)
+        assert find_cloud_upload_status(path)['url'] is None
+
+        assert flush_cloud_upload_queues(timeout=5)
+
+        status = find_cloud_upload_status(path)
+        assert status['status'] == STATE_UPLOADED
+        assert status['url'].startswith('http://cloud/')
+    finally:
+        queue.shutdown(timeout=5)
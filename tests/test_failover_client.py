@@ -0,0 +1,222 @@
+"""
+多端点容灾客户端测试
+
+使用本地 http.server 模拟OpenAI兼容的流式接口（可配置首token延迟和错误状态码），
+验证对冲请求的触发时机、落选请求的连接关闭、出错切换和端点冷却。
+运行: python -m pytest -q tests/test_failover_client.py
+"""
+
+import json
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sagents.config.settings import get_settings
+from sagents.utils.failover_client import FailoverChatClient, wrap_with_failover
+
+
+def _chunk(content: str, finish_reason=None) -> bytes:
+    payload = {
+        'id': 'chatcmpl-test', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'test',
+        'choices': [{'index': 0, 'delta': {'content': content} if content else {}, 'finish_reason': finish_reason}]
+    }
+    return f"data: {json.dumps(payload)}\n\n".encode('utf-8')
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    """按 server.status / server.first_chunk_delay 返回SSE流；等待首个chunk期间客户端断开时设置 server.closed_early"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        server = self.server
+        server.requests.append(time.time())
+        if server.status != 200:
+            payload = json.dumps({'error': {'message': 'boom'}}).encode('utf-8')
+            self.send_response(server.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        if not body.get('stream'):
+            payload = json.dumps({
+                'id': 'chatcmpl-test', 'object': 'chat.completion', 'created': 0, 'model': 'test',
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': server.reply},
+                             'finish_reason': 'stop'}]
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.flush()
+        if self._wait_or_disconnect(server.first_chunk_delay):
+            server.closed_early.set()
+            return
+        try:
+            for data in (_chunk(server.reply), _chunk('', 'stop'), b"data: [DONE]\n\n"):
+                self.wfile.write(data)
+                self.wfile.flush()
+        except OSError:
+            server.closed_early.set()
+
+    def _wait_or_disconnect(self, delay: float) -> bool:
+        """等待delay秒，期间客户端关闭连接时返回True"""
+        deadline = time.time() + delay
+        while time.time() < deadline:
+            readable, _, _ = select.select([self.connection], [], [], 0.02)
+            if readable:
+                try:
+                    if not self.connection.recv(1, socket.MSG_PEEK):
+                        return True
+                except OSError:
+                    return True
+        return False
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def chat_servers():
+    servers = []
+
+    def start(reply: str, first_chunk_delay: float = 0.0, status: int = 200):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _ChatHandler)
+        server.daemon_threads = True
+        server.reply = reply
+        server.first_chunk_delay = first_chunk_delay
+        server.status = status
+        server.requests = []
+        server.closed_early = threading.Event()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key='test',
+                        max_retries=0, timeout=10)
+        return server, {'name': reply, 'client': client}
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _stream_text(client: FailoverChatClient) -> str:
+    stream = client.chat.completions.create(model='test', messages=[{'role': 'user', 'content': 'hi'}], stream=True)
+    return ''.join(chunk.choices[0].delta.content or '' for chunk in stream if chunk.choices)
+
+
+def test_hedge_fires_after_ttft_percentile(chat_servers):
+    slow, slow_endpoint = chat_servers('slow', first_chunk_delay=3.0)
+    fast, fast_endpoint = chat_servers('fast')
+    client = FailoverChatClient([slow_endpoint, fast_endpoint], hedge_percentile=0.9, min_samples_for_hedge=5)
+    client.endpoints[0].ttft_samples.extend([0.05, 0.1, 0.1, 0.2, 0.3])
+
+    started = time.time()
+    text = _stream_text(client)
+
+    assert text == 'fast'
+    assert time.time() - started < 2.0
+    # 对冲请求在主请求等待超过p90（0.3s）之后才发出
+    assert fast.requests[0] - started >= 0.3
+    assert len(slow.requests) == 1
+    stats = {item['name']: item for item in client.get_endpoint_stats()}
+    assert stats['fast']['hedged_wins'] == 1
+    assert stats['slow']['cancelled'] == 1
+
+
+def test_losing_stream_connection_is_closed(chat_servers):
+    slow, slow_endpoint = chat_servers('slow', first_chunk_delay=3.0)
+    _, fast_endpoint = chat_servers('fast')
+    client = FailoverChatClient([slow_endpoint, fast_endpoint], default_hedge_delay=0.1)
+
+    assert _stream_text(client) == 'fast'
+
+    # 落选请求的连接被直接关闭，服务端在发送首个chunk之前就看到断开
+    assert slow.closed_early.wait(2.0)
+
+
+def test_no_hedge_without_samples_or_default_delay(chat_servers):
+    _, slow_endpoint = chat_servers('slow', first_chunk_delay=0.3)
+    fast, fast_endpoint = chat_servers('fast')
+    client = FailoverChatClient([slow_endpoint, fast_endpoint])
+
+    assert _stream_text(client) == 'slow'
+    assert not fast.requests
+
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_failover_on_error(chat_servers, stream):
+    broken, broken_endpoint = chat_servers('broken', status=500)
+    _, backup_endpoint = chat_servers('backup')
+    client = FailoverChatClient([broken_endpoint, backup_endpoint], failure_threshold=3)
+
+    if stream:
+        assert _stream_text(client) == 'backup'
+    else:
+        response = client.chat.completions.create(model='test', messages=[{'role': 'user', 'content': 'hi'}])
+        assert response.choices[0].message.content == 'backup'
+
+    assert len(broken.requests) == 1
+    stats = {item['name']: item for item in client.get_endpoint_stats()}
+    assert stats['broken']['total_errors'] == 1
+    assert stats['broken']['healthy']
+    # 出错的端点排到成功的端点之后，下一次请求直接发给备用端点
+    assert [ep.name for ep in client._ranked_endpoints()] == ['backup', 'broken']
+
+
+def test_failing_endpoint_cools_down(chat_servers):
+    broken, broken_endpoint = chat_servers('broken', status=500)
+    _, backup_endpoint = chat_servers('backup')
+    client = FailoverChatClient([broken_endpoint, backup_endpoint], failure_threshold=1, cooldown_seconds=60)
+    # 出错端点的历史时延极低，不冷却时它仍会排在最前
+    client.endpoints[0].ttft_samples.extend([0.0001] * 5)
+
+    assert _stream_text(client) == 'backup'
+    assert not client.endpoints[0].healthy
+
+    # 冷却期间不再向出错的端点发请求
+    broken.status = 200
+    assert _stream_text(client) == 'backup'
+    assert len(broken.requests) == 1
+
+    # 冷却结束后恢复该端点
+    client.endpoints[0].cooldown_until = 0
+    assert _stream_text(client) == 'broken'
+    assert len(broken.requests) == 2
+
+
+def test_wrap_with_failover_uses_settings(chat_servers, monkeypatch):
+    _, primary_endpoint = chat_servers('primary')
+    backup, _ = chat_servers('backup')
+    failover = get_settings().failover
+    primary = primary_endpoint['client']
+
+    monkeypatch.setattr(failover, 'endpoints', [])
+    assert wrap_with_failover(primary) is primary
+
+    monkeypatch.setattr(failover, 'endpoints', [
+        {'name': 'backup', 'base_url': f"http://127.0.0.1:{backup.server_address[1]}/v1", 'api_key': 'test'}
+    ])
+    monkeypatch.setattr(failover, 'cooldown_seconds', 12.0)
+    client = wrap_with_failover(primary)
+
+    assert isinstance(client, FailoverChatClient)
+    assert [ep.name for ep in client.endpoints] == ['primary', 'backup']
+    assert client.endpoints[0].client is primary
+    assert client.cooldown_seconds == 12.0
+    assert _stream_text(client) == 'primary'
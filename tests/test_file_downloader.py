@@ -0,0 +1,186 @@
+"""
+文件下载器测试
+
+使用本地 http.server 模拟支持 HEAD/Range/If-Range/ETag 的文件服务，
+验证分段并行下载、断点续传、复用未变化的文件、内容去重和大小限制。
+运行: python -m pytest -q tests/test_file_downloader.py
+"""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sagents.utils.exceptions import DownloadError
+from sagents.utils.file_downloader import DOWNLOAD_DIR_NAME, FileDownloader
+
+CONTENT = bytes(range(256)) * 4096  # 1MB
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """按 server.content / server.etag 提供文件，支持Range；server.cut_after 非空时只发送部分内容后断开"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _headers(self, status: int, length: int, extra=None):
+        self.send_response(status)
+        self.send_header('Content-Length', str(length))
+        self.send_header('ETag', self.server.etag)
+        if self.server.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.server.requests.append(('HEAD', None))
+        self._headers(200, len(self.server.content))
+
+    def do_GET(self):
+        content = self.server.content
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        self.server.requests.append(('GET', range_header))
+        start, end = 0, len(content) - 1
+        status = 200
+        if range_header and self.server.accept_ranges and (if_range is None or if_range == self.server.etag):
+            match = re.match(r'bytes=(\d+)-(\d*)', range_header)
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else end
+            status = 206
+        body = content[start:end + 1]
+        extra = {'Content-Range': f"bytes {start}-{end}/{len(content)}"} if status == 206 else {}
+        self._headers(status, len(body), extra)
+        cut_after = self.server.cut_after
+        if cut_after is not None:
+            # 模拟网络中断：只发送一部分内容就断开连接
+            self.server.cut_after = None
+            self.wfile.write(body[:cut_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FileHandler)
+    server.content = CONTENT
+    server.etag = '"v1"'
+    server.accept_ranges = True
+    server.cut_after = None
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/files/data.bin"
+    server.shutdown()
+    server.server_close()
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _range_requests(server):
+    return [value for method, value in server.requests if method == 'GET' and value]
+
+
+def test_parallel_range_download(file_server, tmp_path):
+    server, url = file_server
+    downloader = FileDownloader(parallel_threshold_mb=0.5, segments=4, timeout=5)
+
+    result = downloader.download(url, str(tmp_path))
+
+    assert result['segments'] == 4
+    assert result['file_path'] == str(tmp_path / 'data.bin')
+    assert _read(result['file_path']) == CONTENT
+    assert result['sha256'] == hashlib.sha256(CONTENT).hexdigest()
+    assert len(_range_requests(server)) == 4
+    assert not [name for name in os.listdir(tmp_path / DOWNLOAD_DIR_NAME) if name.endswith('.part')]
+
+
+def test_resume_after_interrupted_download(file_server, tmp_path):
+    server, url = file_server
+    downloader = FileDownloader(parallel_threshold_mb=16, timeout=5)
+    server.cut_after = 300 * 1024
+
+    with pytest.raises(Exception):
+        downloader.download(url, str(tmp_path))
+    part_files = [name for name in os.listdir(tmp_path / DOWNLOAD_DIR_NAME) if name.endswith('.part')]
+    assert len(part_files) == 1
+
+    result = downloader.download(url, str(tmp_path))
+
+    assert result['resumed']
+    assert _read(result['file_path']) == CONTENT
+    last_range = _range_requests(server)[-1]
+    assert not last_range.startswith('bytes=0-')
+
+
+def test_changed_etag_restarts_download(file_server, tmp_path):
+    server, url = file_server
+    downloader = FileDownloader(parallel_threshold_mb=16, timeout=5)
+    server.cut_after = 300 * 1024
+    with pytest.raises(Exception):
+        downloader.download(url, str(tmp_path))
+
+    server.content = CONTENT[::-1]
+    server.etag = '"v2"'
+    result = downloader.download(url, str(tmp_path))
+
+    assert not result['resumed']
+    assert _read(result['file_path']) == CONTENT[::-1]
+
+
+def test_unchanged_url_reuses_previous_file(file_server, tmp_path):
+    server, url = file_server
+    downloader = FileDownloader(timeout=5)
+    first = downloader.download(url, str(tmp_path))
+    gets_before = len([r for r in server.requests if r[0] == 'GET'])
+
+    second = downloader.download(url, str(tmp_path))
+
+    assert second['file_path'] == first['file_path']
+    assert second['deduplicated']
+    assert len([r for r in server.requests if r[0] == 'GET']) == gets_before
+
+
+def test_duplicate_content_reuses_existing_file(file_server, tmp_path):
+    _, url = file_server
+    existing = tmp_path / 'copy.bin'
+    existing.write_bytes(CONTENT)
+
+    result = FileDownloader(timeout=5).download(url, str(tmp_path))
+
+    assert result['deduplicated']
+    assert result['file_path'] == str(existing)
+    assert not (tmp_path / 'data.bin').exists()
+
+
+def test_size_limit_rejected_before_download(file_server, tmp_path):
+    server, url = file_server
+
+    with pytest.raises(DownloadError):
+        FileDownloader(max_size_mb=0.5, timeout=5).download(url, str(tmp_path))
+    assert not [r for r in server.requests if r[0] == 'GET']
+
+
+def test_stream_download_without_range_support(file_server, tmp_path):
+    server, url = file_server
+    server.accept_ranges = False
+
+    result = FileDownloader(timeout=5).download(url, str(tmp_path))
+
+    assert result['segments'] == 1
+    assert _read(result['file_path']) == CONTENT
+    assert not _range_requests(server)